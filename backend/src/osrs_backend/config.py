@@ -2,6 +2,7 @@
 
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Any
 
 
 class Settings(BaseSettings):
@@ -21,14 +22,35 @@ class Settings(BaseSettings):
     # TCP Server (ML inference)
     tcp_host: str = "127.0.0.1"
     tcp_port: int = 9999
+    # Also accept same-host clients on this Unix domain socket path, skipping the TCP stack (unset disables)
+    tcp_unix_socket_path: str | None = None
+    # Binary protocol requests larger than this are rejected before they're read
+    tcp_max_frame_bytes: int = 16 * 1024 * 1024
 
     # ML Settings
     ml_device: str = "cpu"
     ml_processor_pool_size: int = 1
+    # "thread", or "process" to run inference outside the server's GIL
     ml_processor_type: str = "thread"
+    # Extra processor options as JSON, e.g. {"model_cache_bytes": 2000000000} to bound memory used by loaded models,
+    # {"precision": "int8"} (or "bfloat16") for reduced precision inference,
+    # or {"slots_per_worker": 4, "slot_bytes": 1048576} for "process"
+    ml_processor_kwargs: dict[str, Any] = {}
+    # How requests are assigned to workers: "least-outstanding", "consistent-hash" (by model) or "random"
+    ml_router: str = "least-outstanding"
+    # Micro-batching of concurrent inference requests (max size of 1 disables batching)
+    ml_batch_max_size: int = 32
+    ml_batch_max_wait_ms: float = 2.0
+    # Requests in progress per model beyond this are rejected (0 disables the limit)
+    ml_max_queued_per_model: int = 256
+    # Max cached responses to repeated deterministic requests (0 disables the cache), and how long they're reused
+    ml_response_cache_size: int = 0
+    ml_response_cache_ttl_s: float = 2.0
 
     # Models directory (relative to repo root)
     models_dir: str = "../pvp-ml/models"
+    # Seconds between checks for added, replaced or removed models (0 disables hot reload)
+    models_poll_interval_s: float = 2.0
 
     # Wiki API (for price fetching)
     wiki_api_base_url: str = "https://prices.runescape.wiki/api/v1/osrs"
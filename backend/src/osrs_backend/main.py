@@ -5,16 +5,19 @@ in a single process using asyncio.
 """
 
 import asyncio
+import dataclasses
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from arq import create_pool
 from arq.connections import RedisSettings
 import uvicorn
 
 from osrs_backend.api.routers import router
 from osrs_backend.db.database import connect_db, disconnect_db
+from osrs_backend.tcp.metrics import PROMETHEUS_CONTENT_TYPE
 from osrs_backend.tcp.server import create_tcp_server
 from osrs_backend.utils.logging import setup_logging
 from osrs_backend.config import get_settings
@@ -59,6 +62,16 @@ async def unified_lifespan(app: FastAPI):
             pool_size=settings.ml_processor_pool_size,
             processor_type=settings.ml_processor_type,
             device=settings.ml_device,
+            batch_max_size=settings.ml_batch_max_size,
+            batch_max_wait_ms=settings.ml_batch_max_wait_ms,
+            processor_kwargs=settings.ml_processor_kwargs,
+            router_type=settings.ml_router,
+            models_poll_interval=settings.models_poll_interval_s,
+            max_queued_per_model=settings.ml_max_queued_per_model,
+            response_cache_size=settings.ml_response_cache_size,
+            response_cache_ttl_s=settings.ml_response_cache_ttl_s,
+            unix_socket_path=settings.tcp_unix_socket_path,
+            max_frame_bytes=settings.tcp_max_frame_bytes,
         )
         app.state.tcp_server = tcp_server
         logger.info(f"TCP inference server started on {settings.tcp_host}:{settings.tcp_port}")
@@ -70,6 +83,8 @@ async def unified_lifespan(app: FastAPI):
     logger.info(f"HTTP API: http://{settings.http_host}:{settings.http_port}")
     if tcp_server:
         logger.info(f"TCP Inference: {settings.tcp_host}:{settings.tcp_port}")
+        if settings.tcp_unix_socket_path:
+            logger.info(f"Unix Socket Inference: {settings.tcp_unix_socket_path}")
 
     try:
         yield
@@ -115,6 +130,39 @@ def create_unified_app() -> FastAPI:
     async def health():
         return {"status": "healthy"}
 
+    @app.get("/health/inference")
+    async def inference_health():
+        tcp_server = getattr(app.state, "tcp_server", None)
+        if tcp_server is None:
+            return {"status": "unavailable"}
+        model_cache_stats = tcp_server.get_model_cache_stats()
+        response_cache_stats = tcp_server.get_response_cache_stats()
+        return {
+            "status": "healthy",
+            "router": tcp_server.router_type,
+            "queue_depths": tcp_server.get_queue_depths(),
+            "models": {
+                model: dataclasses.asdict(route)
+                for model, route in tcp_server.get_model_routes().items()
+            },
+            "model_cache": (
+                dataclasses.asdict(model_cache_stats) if model_cache_stats else None
+            ),
+            "response_cache": (
+                dataclasses.asdict(response_cache_stats)
+                if response_cache_stats
+                else None
+            ),
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        tcp_server = getattr(app.state, "tcp_server", None)
+        return PlainTextResponse(
+            tcp_server.render_metrics() if tcp_server is not None else "",
+            media_type=PROMETHEUS_CONTENT_TYPE,
+        )
+
     return app
 
 
@@ -159,6 +207,16 @@ async def _run_tcp_only():
         pool_size=settings.ml_processor_pool_size,
         processor_type=settings.ml_processor_type,
         device=settings.ml_device,
+        batch_max_size=settings.ml_batch_max_size,
+        batch_max_wait_ms=settings.ml_batch_max_wait_ms,
+        processor_kwargs=settings.ml_processor_kwargs,
+        router_type=settings.ml_router,
+        models_poll_interval=settings.models_poll_interval_s,
+        max_queued_per_model=settings.ml_max_queued_per_model,
+        response_cache_size=settings.ml_response_cache_size,
+        response_cache_ttl_s=settings.ml_response_cache_ttl_s,
+        unix_socket_path=settings.tcp_unix_socket_path,
+        max_frame_bytes=settings.tcp_max_frame_bytes,
     )
 
     try:
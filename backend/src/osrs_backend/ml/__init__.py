@@ -1,12 +1,43 @@
 """ML inference module for OSRS PvP models."""
 
-from osrs_backend.ml.ppo import PPO, Meta, ModelExtension, PolicyParams
+from osrs_backend.ml.ppo import (
+    PPO,
+    Meta,
+    ModelExtension,
+    PolicyParams,
+    FLOAT32_PRECISION,
+    INT8_PRECISION,
+    BFLOAT16_PRECISION,
+    PRECISION_TYPES,
+)
 from osrs_backend.ml.remote_processor import (
     RemoteProcessor,
     ThreadedProcessor,
     create_remote_processor,
     THREAD_REMOTE_PROCESSOR,
+    PROCESS_REMOTE_PROCESSOR,
     REMOTE_PROCESSOR_TYPES,
+    QUEUE_WAIT_STAGE,
+    FORWARD_STAGE,
+    record_stage_timings,
+    add_stage_timing,
+    DeadlineExceededError,
+    request_deadline,
+    get_request_deadline,
+    check_deadline,
+)
+from osrs_backend.ml.model_cache import ModelCache, ModelCacheStats
+from osrs_backend.ml.model_registry import ModelRegistry, ModelRoute, ModelVersion
+from osrs_backend.ml.router import (
+    WorkerRouter,
+    RandomRouter,
+    LeastOutstandingRouter,
+    ConsistentHashRouter,
+    create_router,
+    RANDOM_ROUTER,
+    LEAST_OUTSTANDING_ROUTER,
+    CONSISTENT_HASH_ROUTER,
+    ROUTER_TYPES,
 )
 from osrs_backend.ml.contract_loader import (
     EnvironmentMeta,
@@ -25,12 +56,42 @@ __all__ = [
     "Meta",
     "ModelExtension",
     "PolicyParams",
+    "FLOAT32_PRECISION",
+    "INT8_PRECISION",
+    "BFLOAT16_PRECISION",
+    "PRECISION_TYPES",
     # Remote Processor
     "RemoteProcessor",
     "ThreadedProcessor",
     "create_remote_processor",
     "THREAD_REMOTE_PROCESSOR",
+    "PROCESS_REMOTE_PROCESSOR",
     "REMOTE_PROCESSOR_TYPES",
+    "QUEUE_WAIT_STAGE",
+    "FORWARD_STAGE",
+    "record_stage_timings",
+    "add_stage_timing",
+    "DeadlineExceededError",
+    "request_deadline",
+    "get_request_deadline",
+    "check_deadline",
+    # Model Cache
+    "ModelCache",
+    "ModelCacheStats",
+    # Model Registry
+    "ModelRegistry",
+    "ModelVersion",
+    "ModelRoute",
+    # Router
+    "WorkerRouter",
+    "RandomRouter",
+    "LeastOutstandingRouter",
+    "ConsistentHashRouter",
+    "create_router",
+    "RANDOM_ROUTER",
+    "LEAST_OUTSTANDING_ROUTER",
+    "CONSISTENT_HASH_ROUTER",
+    "ROUTER_TYPES",
     # Contract Loader
     "EnvironmentMeta",
     "ActionHead",
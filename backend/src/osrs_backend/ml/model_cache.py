@@ -0,0 +1,155 @@
+"""Memory-budgeted LRU cache of loaded models."""
+
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Lock
+
+from osrs_backend.ml.ppo import PPO
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelCacheStats:
+    """Counters for a model cache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    loaded_models: int
+    loaded_bytes: int
+
+
+@dataclass
+class _CacheEntry:
+    model: PPO
+    memory_bytes: int
+    # Number of predictions currently using the model, it can't be evicted while this is > 0
+    in_flight: int = 0
+    discarded: bool = False
+
+
+class ModelCache:
+    """Thread-safe LRU cache of loaded models, bounded by approximate memory use.
+
+    The cache is unbounded if max_bytes is None. Models with in-flight predictions
+    are never evicted, so the cache can temporarily go over budget.
+    """
+
+    def __init__(self, load_model: Callable[[str], PPO], max_bytes: int | None = None):
+        self._load_model = load_model
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._loaded_bytes = 0
+        self._lock = Lock()
+        self._model_locks: dict[str, Lock] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @contextmanager
+    def acquire(self, model_path: str) -> Iterator[PPO]:
+        """Get a model (loading it if needed), pinned in the cache while the context is open."""
+        entry = self._acquire_entry(model_path)
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.in_flight -= 1
+                if entry.discarded:
+                    self._remove_if_unused(model_path, entry)
+                self._evict()
+
+    def discard(self, model_path: str) -> None:
+        """Remove a model from the cache, once its in-flight predictions complete."""
+        with self._lock:
+            entry = self._entries.get(model_path)
+            if entry is None:
+                return
+            entry.discarded = True
+            self._remove_if_unused(model_path, entry)
+
+    def get_stats(self) -> ModelCacheStats:
+        """Get the cache counters."""
+        with self._lock:
+            return ModelCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                loaded_models=len(self._entries),
+                loaded_bytes=self._loaded_bytes,
+            )
+
+    def _acquire_entry(self, model_path: str) -> _CacheEntry:
+        with self._lock:
+            entry = self._try_acquire(model_path)
+            if entry is not None:
+                self._hits += 1
+                return entry
+            self._misses += 1
+            # This requires special handling to allow concurrently loading different models,
+            # but not concurrently loading the same model
+            if model_path not in self._model_locks:
+                self._model_locks[model_path] = Lock()
+            model_lock = self._model_locks[model_path]
+        with model_lock:
+            with self._lock:
+                # Double check model hasn't already loaded
+                entry = self._try_acquire(model_path)
+                if entry is not None:
+                    return entry
+            load_start_time = time.time()
+            logger.info(f"Loading model {model_path} into memory")
+            model = self._load_model(model_path)
+            logger.info(
+                f"Loaded model {model_path} into memory in {time.time() - load_start_time} seconds"
+            )
+            with self._lock:
+                entry = _CacheEntry(model, model.get_memory_bytes(), in_flight=1)
+                previous_entry = self._entries.pop(model_path, None)
+                if previous_entry is not None:
+                    # Replacing a discarded model that's still finishing its predictions
+                    self._loaded_bytes -= previous_entry.memory_bytes
+                self._entries[model_path] = entry
+                self._loaded_bytes += entry.memory_bytes
+                # Clean up - once model has been loaded, we don't need it again
+                self._model_locks.pop(model_path, None)
+                self._evict()
+                return entry
+
+    def _try_acquire(self, model_path: str) -> _CacheEntry | None:
+        # Must hold self._lock
+        # Discarded models are only kept for their in-flight predictions, so they're loaded again
+        entry = self._entries.get(model_path)
+        if entry is None or entry.discarded:
+            return None
+        entry.in_flight += 1
+        self._entries.move_to_end(model_path)
+        return entry
+
+    def _remove_if_unused(self, model_path: str, entry: _CacheEntry) -> None:
+        # Must hold self._lock
+        if entry.in_flight == 0 and self._entries.get(model_path) is entry:
+            del self._entries[model_path]
+            self._loaded_bytes -= entry.memory_bytes
+            logger.info(f"Unloaded model {model_path} from memory")
+
+    def _evict(self) -> None:
+        # Must hold self._lock
+        if self._max_bytes is None or self._loaded_bytes <= self._max_bytes:
+            return
+        for model_path, entry in list(self._entries.items()):
+            if self._loaded_bytes <= self._max_bytes:
+                break
+            if entry.in_flight > 0:
+                continue
+            del self._entries[model_path]
+            self._loaded_bytes -= entry.memory_bytes
+            self._evictions += 1
+            logger.info(
+                f"Evicted model {model_path} from memory ({entry.memory_bytes} bytes)"
+            )
@@ -0,0 +1,355 @@
+"""Hot-reloading registry of the models in a directory."""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+from osrs_backend.ml.remote_processor import RemoteProcessor
+
+logger = logging.getLogger(__name__)
+
+# Model files named <model>@<slot>.zip are versions of the same model, which can be loaded side by side
+VERSION_SEPARATOR = "@"
+# Optional file in the models directory choosing which versions of each model serve traffic
+ROUTES_FILE = "routes.json"
+
+
+@dataclass
+class ModelVersion:
+    """A loaded version of a model."""
+
+    name: str
+    # Version slot of the model, from its file name ("" for files without one)
+    slot: str
+    # Private snapshot of the model file, so replacing the file in the models directory can't change a loaded version
+    path: str
+    # The modification time (ns) of the model file this version was loaded from
+    version: int
+    # Number of predictions currently using this version, it can't be freed while this is > 0
+    in_flight: int = 0
+    retired: bool = False
+
+    @property
+    def key(self) -> str:
+        """Name of the model file this version was loaded from, which can be requested to pin the version."""
+        return _get_version_key(self.name, self.slot)
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """The versions of a model that serve requests for it."""
+
+    live: str
+    # Version receiving canary_fraction of requests instead of the live version, if any
+    canary: str | None = None
+    canary_fraction: float = 0.0
+    # All loaded versions, which are warm and can be routed to without a latency cliff
+    versions: tuple[str, ...] = ()
+
+
+class ModelRegistry:
+    """Serves the models in a directory, hot reloading them when .zip files change.
+
+    New versions are loaded in the background and swapped in once warm.
+    Requests already using the old version finish on it, and it's unloaded
+    from the remote processor once they have drained.
+
+    Versions of a model (<model>@<slot>.zip) stay loaded side by side, and
+    the routes file picks which one is live, and optionally a canary that
+    gets a percentage of requests, e.g. {"nh": {"live": "v1", "canary": "v2",
+    "canary_percent": 10}}. Without a route the newest version is live.
+    Routes only cut over to a version once it's warm on every worker.
+    """
+
+    def __init__(
+        self,
+        models_dir: str,
+        remote_processor: RemoteProcessor,
+        poll_interval: float = 2.0,
+    ):
+        self._models_dir = models_dir
+        self._remote_processor = remote_processor
+        # Polling is disabled with a poll interval of 0
+        self._poll_interval = poll_interval
+        # Keyed by version key, e.g. nh@v2
+        self._versions: dict[str, ModelVersion] = {}
+        # Routes from the routes file, and the routes currently in effect for each model
+        self._configured_routes: dict[str, ModelRoute] = {}
+        self._routes_file_version: int | None = None
+        self._routes: dict[str, ModelRoute] = {}
+        # Changed files are only loaded once they've stopped changing for a poll, so partial writes aren't loaded
+        self._pending_changes: dict[str, tuple[int, int]] = {}
+        self._failed_versions: dict[str, int] = {}
+        self._snapshot_dir: str | None = None
+        # Versions are file modification times, which a restored file can repeat, so snapshots are numbered
+        self._snapshot_ids = itertools.count()
+        self._watch_task: asyncio.Task[None] | None = None
+        self._background_tasks: set[asyncio.Task[None]] = set()
+
+    async def start(self) -> None:
+        """Load the models currently in the directory and start watching it."""
+        assert self._snapshot_dir is None
+        self._snapshot_dir = tempfile.mkdtemp(prefix="models-")
+        await self.refresh(wait_for_stable=False)
+        if self._poll_interval > 0:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        """Stop watching the directory and clean up snapshots."""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        if self._snapshot_dir is not None:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+            self._snapshot_dir = None
+
+    def get_model_names(self) -> list[str]:
+        """Names of the models currently being served."""
+        return list(self._routes.keys())
+
+    def get_routes(self) -> dict[str, ModelRoute]:
+        """The routes currently in effect for each model."""
+        return dict(self._routes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._routes or name in self._versions
+
+    @contextmanager
+    def acquire(self, name: str) -> Iterator[ModelVersion]:
+        """Pin the version of a model a request is routed to while the context is open.
+
+        A version key (e.g. nh@v2) can be given instead of a model name to pin a specific version.
+        """
+        route = self._routes.get(name)
+        if route is None:
+            model_version = self._versions.get(name)
+        elif route.canary is not None and random.random() < route.canary_fraction:
+            model_version = self._versions.get(_get_version_key(name, route.canary))
+        else:
+            model_version = self._versions.get(_get_version_key(name, route.live))
+        if model_version is None:
+            raise ValueError(
+                f"Unknown model: {name}. Available: {self.get_model_names()}"
+            )
+        model_version.in_flight += 1
+        try:
+            yield model_version
+        finally:
+            model_version.in_flight -= 1
+            if model_version.retired and model_version.in_flight == 0:
+                self._free_in_background(model_version)
+
+    async def refresh(self, wait_for_stable: bool = True) -> None:
+        """Load added or changed models, retire removed ones, and apply the routes file."""
+        files = self._scan()
+        for name in list(self._versions.keys()):
+            if name not in files:
+                logger.info(f"Model {name} was removed")
+                self._retire(self._versions.pop(name))
+                self._pending_changes.pop(name, None)
+
+        changed = []
+        for name, (path, version, size) in files.items():
+            current = self._versions.get(name)
+            if (
+                current is not None and current.version == version
+            ) or self._failed_versions.get(name) == version:
+                self._pending_changes.pop(name, None)
+                continue
+            if wait_for_stable and self._pending_changes.get(name) != (version, size):
+                self._pending_changes[name] = (version, size)
+                continue
+            self._pending_changes.pop(name, None)
+            changed.append((name, path, version))
+
+        if changed:
+            await asyncio.gather(
+                *[self._load(name, path, version) for name, path, version in changed]
+            )
+
+        self._read_routes_file()
+        self._update_routes()
+
+    def _scan(self) -> dict[str, tuple[str, int, int]]:
+        if not os.path.isdir(self._models_dir):
+            return {}
+        files = {}
+        for entry in os.scandir(self._models_dir):
+            if entry.is_file() and entry.name.endswith(".zip"):
+                stat = entry.stat()
+                files[os.path.splitext(entry.name)[0]] = (
+                    entry.path,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                )
+        return files
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.exception(f"Failed to refresh models in {self._models_dir}: {e}")
+
+    def _read_routes_file(self) -> None:
+        routes_path = os.path.join(self._models_dir, ROUTES_FILE)
+        try:
+            routes_file_version = os.stat(routes_path).st_mtime_ns
+        except FileNotFoundError:
+            routes_file_version = None
+        if routes_file_version == self._routes_file_version:
+            return
+        self._routes_file_version = routes_file_version
+        if routes_file_version is None:
+            self._configured_routes = {}
+            return
+        try:
+            with open(routes_path) as f:
+                self._configured_routes = _parse_routes(json.load(f))
+            logger.info(f"Loaded model routes: {self._configured_routes}")
+        except Exception as e:
+            # Keep the previous routes, so a bad edit doesn't take down traffic
+            logger.exception(f"Failed to load model routes from {routes_path}: {e}")
+
+    def _update_routes(self) -> None:
+        versions_by_model: dict[str, list[ModelVersion]] = {}
+        for model_version in self._versions.values():
+            versions_by_model.setdefault(model_version.name, []).append(model_version)
+
+        routes = {}
+        for name, model_versions in versions_by_model.items():
+            slots = tuple(
+                sorted(model_version.slot for model_version in model_versions)
+            )
+            previous_route = self._routes.get(name)
+            configured_route = self._configured_routes.get(name)
+            live = max(model_versions, key=lambda v: v.version).slot
+            if configured_route is not None:
+                if configured_route.live in slots:
+                    live = configured_route.live
+                elif previous_route is not None and previous_route.live in slots:
+                    # Keep serving the current version until the configured one is warm
+                    live = previous_route.live
+            canary = None
+            canary_fraction = 0.0
+            if (
+                configured_route is not None
+                and configured_route.canary in slots
+                and configured_route.canary != live
+            ):
+                canary = configured_route.canary
+                canary_fraction = configured_route.canary_fraction
+            routes[name] = ModelRoute(
+                live=live,
+                canary=canary,
+                canary_fraction=canary_fraction,
+                versions=slots,
+            )
+            if previous_route is not None and (
+                previous_route.live,
+                previous_route.canary,
+                previous_route.canary_fraction,
+            ) != (live, canary, canary_fraction):
+                logger.info(f"Routing model {name}: {routes[name]}")
+        # Swapped in as a whole, so requests never see a partially updated set of routes
+        self._routes = routes
+
+    async def _load(self, name: str, source_path: str, version: int) -> None:
+        assert self._snapshot_dir is not None
+        snapshot_path = os.path.join(
+            self._snapshot_dir, f"{name}-{version}-{next(self._snapshot_ids)}.zip"
+        )
+        model_name, _, slot = name.partition(VERSION_SEPARATOR)
+        model_version = ModelVersion(
+            name=model_name, slot=slot, path=snapshot_path, version=version
+        )
+        try:
+            await asyncio.to_thread(lambda: shutil.copyfile(source_path, snapshot_path))
+            # Warm up the new version on every worker it can be routed to before swapping it in
+            router = self._remote_processor.get_router()
+            await asyncio.gather(
+                *[
+                    self._remote_processor.predict(
+                        process_id=i, model_path=snapshot_path
+                    )
+                    for i in router.get_preload_workers(snapshot_path)
+                ]
+            )
+        except Exception as e:
+            logger.exception(f"Failed to load model {name} from {source_path}: {e}")
+            # Don't retry until the file changes again
+            self._failed_versions[name] = version
+            await self._free(model_version)
+            return
+
+        self._failed_versions.pop(name, None)
+        previous_version = self._versions.get(name)
+        self._versions[name] = model_version
+        if previous_version is None:
+            logger.info(f"Loaded model {name}")
+        else:
+            logger.info(f"Swapped in new version of model {name}")
+            self._retire(previous_version)
+
+    def _retire(self, model_version: ModelVersion) -> None:
+        model_version.retired = True
+        if model_version.in_flight == 0:
+            self._free_in_background(model_version)
+
+    def _free_in_background(self, model_version: ModelVersion) -> None:
+        task = asyncio.create_task(self._free(model_version))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _free(self, model_version: ModelVersion) -> None:
+        try:
+            await asyncio.gather(
+                *[
+                    self._remote_processor.unload_model(
+                        process_id=i, model_path=model_version.path
+                    )
+                    for i in range(self._remote_processor.get_pool_size())
+                ]
+            )
+        except Exception as e:
+            logger.warning(f"Failed to unload model {model_version.path}: {e}")
+        try:
+            os.remove(model_version.path)
+        except FileNotFoundError:
+            pass
+
+
+def _get_version_key(name: str, slot: str) -> str:
+    return f"{name}{VERSION_SEPARATOR}{slot}" if slot else name
+
+
+def _parse_routes(routes: dict[str, Any]) -> dict[str, ModelRoute]:
+    parsed_routes = {}
+    for name, route in routes.items():
+        canary_percent = float(route.get("canary_percent", 0))
+        if not 0 <= canary_percent <= 100:
+            raise ValueError(
+                f"Invalid canary percent for model {name}: {canary_percent}"
+            )
+        parsed_routes[name] = ModelRoute(
+            live=str(route["live"]),
+            canary=str(route["canary"]) if route.get("canary") is not None else None,
+            canary_fraction=canary_percent / 100,
+        )
+    return parsed_routes
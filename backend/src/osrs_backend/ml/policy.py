@@ -83,6 +83,7 @@ class Actor(nn.Module):
 
         self.action_head_sizes = th.tensor(action_head_sizes, dtype=th.long)
 
+        _validate_action_dependencies(action_dependencies, action_head_sizes)
         self.action_dependencies = action_dependencies
         self._float32_eps = th.finfo(th.float32).eps
 
@@ -447,3 +448,21 @@ class Policy(nn.Module):
             values = self.critic(critic_features)
 
         return actions, log_probs, entropy, values, probs
+
+
+def _validate_action_dependencies(
+    action_dependencies: ActionDependencies, action_head_sizes: list[int]
+) -> None:
+    for head_index, head_config in action_dependencies.items():
+        for action_index, action_config in head_config.items():
+            for dependencies in action_config.values():
+                for dependency_head, dependency_action in dependencies:
+                    # Only actions of previous heads have been chosen when a head's dependency mask is needed
+                    if not (
+                        0 <= dependency_head < head_index
+                        and 0 <= dependency_action < action_head_sizes[dependency_head]
+                    ):
+                        raise ValueError(
+                            f"Invalid dependency {(dependency_head, dependency_action)}"
+                            f" for action {action_index} of head {head_index}"
+                        )
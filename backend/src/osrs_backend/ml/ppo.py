@@ -2,8 +2,11 @@
 
 import abc
 import dataclasses
+import hashlib
+import inspect
 import logging
 import os
+import sys
 import threading
 from dataclasses import dataclass, field
 from typing import Any, cast
@@ -70,9 +73,25 @@ class ModelExtension(abc.ABC):
         pass
 
 
+FLOAT32_PRECISION = "float32"
+INT8_PRECISION = "int8"
+BFLOAT16_PRECISION = "bfloat16"
+
+PRECISION_TYPES = [
+    FLOAT32_PRECISION,
+    INT8_PRECISION,
+    BFLOAT16_PRECISION,
+]
+
 # th.jit.compile seems to not be threadsafe
 _jit_lock = threading.Lock()
 _JIT_EVAL_POLICY = os.getenv("TORCH_SCRIPT_INFERENCE", "true").lower() == "true"
+# Compiled policies are cached on disk, keyed by content, so loading the same checkpoint again skips compilation
+_JIT_CACHE = os.getenv("TORCH_SCRIPT_CACHE", "true").lower() == "true"
+_JIT_CACHE_DIR = os.getenv(
+    "TORCH_SCRIPT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "osrs-backend", "torchscript"),
+)
 
 
 class PPO:
@@ -86,6 +105,8 @@ class PPO:
         trainable: bool = False,
         policy_state: dict[str, Any] | None = None,
         extensions: dict[str, ModelExtension] = {},
+        eval_policy: th.jit.ScriptModule | None = None,
+        precision: str = FLOAT32_PRECISION,
     ):
         self._policy_params = policy_params
         self.device = device
@@ -100,17 +121,39 @@ class PPO:
         if policy_state is not None:
             policy.load_state_dict(policy_state)
 
+        # Reduced precision inference
+        self._precision = _get_supported_precision(precision, device)
+        policy = _convert_precision(policy, self._precision)
+
         for extension in self._extensions.values():
             extension.to(device)
             extension.eval()
+        # Approximate memory used by the model, so loaded models can be cached within a memory budget
+        self._memory_bytes = _state_bytes(policy.state_dict()) + sum(
+            _state_bytes(extension.state_dict())
+            for extension in self._extensions.values()
+        )
 
         # Optimize for inference with TorchScript
+        self._eval_policy: th.nn.Module
         if _JIT_EVAL_POLICY:
-            with _jit_lock:
-                self._eval_policy = th.jit.freeze(th.jit.script(policy))
+            if eval_policy is not None:
+                # Already compiled (loaded from the compiled policy cache)
+                self._eval_policy = eval_policy
+            else:
+                with _jit_lock:
+                    self._eval_policy = th.jit.freeze(th.jit.script(policy))
         else:
             self._eval_policy = policy
 
+    def get_precision(self) -> str:
+        """Precision the policy runs inference in."""
+        return self._precision
+
+    def get_memory_bytes(self) -> int:
+        """Approximate bytes of memory used by the model."""
+        return self._memory_bytes
+
     def predict(
         self,
         obs: th.Tensor,
@@ -152,7 +195,7 @@ class PPO:
                 obs = self.meta.running_observation_stats.normalize(obs, clip=True)
 
             actions, log_probs, entropy, values, probs = self._eval_policy(
-                obs,
+                obs.to(th.bfloat16) if self._precision == BFLOAT16_PRECISION else obs,
                 action_masks,
                 sample_deterministic=deterministic,
                 return_actions=return_actions,
@@ -162,6 +205,13 @@ class PPO:
                 return_probs=return_probs,
             )
 
+            if self._precision == BFLOAT16_PRECISION:
+                # Callers always get float32 outputs
+                log_probs = _to_float32(log_probs)
+                entropy = _to_float32(entropy)
+                values = _to_float32(values)
+                probs = _to_float32(probs)
+
             extension_results = [
                 self._extensions[extension].run_extension(obs)
                 for extension in extensions
@@ -186,7 +236,10 @@ class PPO:
 
     @staticmethod
     def load(
-        load_path: str, device: str = "cpu", trainable: bool = False
+        load_path: str,
+        device: str = "cpu",
+        trainable: bool = False,
+        precision: str = FLOAT32_PRECISION,
     ) -> "PPO":
         """Load a model from disk for inference."""
         if not os.path.exists(load_path):
@@ -194,7 +247,18 @@ class PPO:
 
         checkpoint = th.load(load_path, map_location=device, weights_only=False)
 
-        return PPO(
+        precision = _get_supported_precision(precision, device)
+        compiled_policy_path = (
+            _get_compiled_policy_path(load_path, device, precision)
+            if _JIT_EVAL_POLICY and _JIT_CACHE
+            else None
+        )
+        eval_policy = (
+            _load_compiled_policy(compiled_policy_path, device)
+            if compiled_policy_path is not None
+            else None
+        )
+        model = PPO(
             policy_params=checkpoint["policy_params"],
             meta=checkpoint["meta"],
             device=device,
@@ -206,7 +270,12 @@ class PPO:
                 )
                 for saved_extension in checkpoint.get("extensions", [])
             },
+            eval_policy=eval_policy,
+            precision=precision,
         )
+        if compiled_policy_path is not None and eval_policy is None:
+            _save_compiled_policy(model._eval_policy, compiled_policy_path)
+        return model
 
     @staticmethod
     def load_meta(load_path: str) -> Meta:
@@ -218,3 +287,118 @@ class PPO:
 
     def __str__(self) -> str:
         return f"PPO(device={self.device}, extensions={list(self._extensions.keys())})"
+
+
+def _state_bytes(state: dict[str, Any]) -> int:
+    return sum(_value_bytes(value) for value in state.values())
+
+
+def _value_bytes(value: Any) -> int:
+    if isinstance(value, th.Tensor):
+        return value.numel() * value.element_size()
+    # Quantized layers store their packed weights as tuples of tensors
+    if isinstance(value, (tuple, list)):
+        return sum(_value_bytes(item) for item in value)
+    return 0
+
+
+def _get_compiled_policy_path(load_path: str, device: str, precision: str) -> str:
+    """Cache path of a compiled policy.
+
+    Keyed by everything the compiled policy depends on: checkpoint contents,
+    policy source, torch version, device and precision.
+    """
+    with open(load_path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256")
+    digest.update(_get_policy_source_hash())
+    digest.update(th.__version__.encode())
+    digest.update(th.device(device).type.encode())
+    digest.update(precision.encode())
+    return os.path.join(_JIT_CACHE_DIR, f"{digest.hexdigest()}.pt")
+
+
+_policy_source_hash: bytes | None = None
+
+
+def _get_policy_source_hash() -> bytes:
+    global _policy_source_hash
+    if _policy_source_hash is None:
+        _policy_source_hash = hashlib.sha256(
+            (
+                inspect.getsource(sys.modules[Policy.__module__])
+                + inspect.getsource(sys.modules[default_mlp_config.__module__])
+            ).encode()
+        ).digest()
+    return _policy_source_hash
+
+
+def _load_compiled_policy(path: str, device: str) -> th.jit.ScriptModule | None:
+    """Load a cached compiled policy, if there is a usable one."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with _jit_lock:
+            return cast(th.jit.ScriptModule, th.jit.load(path, map_location=device))
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable compiled policy {path}: {e}")
+        return None
+
+
+def _save_compiled_policy(eval_policy: th.nn.Module, path: str) -> None:
+    """Cache a compiled policy (best effort).
+
+    Written to a temporary file first, so concurrent loaders never see a
+    partially written file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        th.jit.save(eval_policy, tmp_path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to cache compiled policy at {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _get_supported_precision(precision: str, device: str) -> str:
+    """Validate a precision, falling back to float32 if bfloat16 isn't supported."""
+    if precision not in PRECISION_TYPES:
+        raise ValueError(
+            f"Unknown precision: {precision}, expected one of {PRECISION_TYPES}"
+        )
+    device_type = th.device(device).type
+    if precision == INT8_PRECISION and device_type != "cpu":
+        raise ValueError(
+            f"{INT8_PRECISION} precision is only supported on cpu, not {device}"
+        )
+    if (
+        precision == BFLOAT16_PRECISION
+        and device_type == "cpu"
+        and not th.ops.mkldnn._is_mkldnn_bf16_supported()
+    ):
+        logger.warning(
+            f"{BFLOAT16_PRECISION} isn't supported by this CPU, falling back to {FLOAT32_PRECISION}"
+        )
+        return FLOAT32_PRECISION
+    return precision
+
+
+def _convert_precision(policy: Policy, precision: str) -> Policy:
+    """Convert a policy for inference in the given precision.
+
+    int8 uses dynamic quantization: linear layer weights are stored as int8,
+    and activations are quantized on the fly.
+    """
+    if precision == INT8_PRECISION:
+        return cast(
+            Policy,
+            th.ao.quantization.quantize_dynamic(policy, {th.nn.Linear}, dtype=th.qint8),
+        )
+    if precision == BFLOAT16_PRECISION:
+        return policy.to(th.bfloat16)
+    return policy
+
+
+def _to_float32(tensor: th.Tensor | None) -> th.Tensor | None:
+    return tensor.float() if tensor is not None else None
@@ -0,0 +1,458 @@
+"""Process-pool processor that exchanges tensors through shared memory.
+
+Each worker process owns a fixed number of preallocated shared-memory slots.
+A request is written into a free slot (a small pickled header followed by the
+raw tensor bytes), and only the slot index is sent over the control queue.
+The worker runs the prediction and writes its results back into the same slot
+before returning the index, so tensors are never pickled between processes.
+"""
+
+import asyncio
+import logging
+import multiprocessing.connection as mp_connection
+import pickle
+import struct
+import threading
+import time
+from typing import Any
+
+import torch as th
+import torch.multiprocessing as mp
+
+from osrs_backend.ml.model_cache import ModelCache
+from osrs_backend.ml.ppo import FLOAT32_PRECISION, PPO
+from osrs_backend.ml.remote_processor import (
+    FORWARD_STAGE,
+    QUEUE_WAIT_STAGE,
+    RemoteProcessor,
+    add_stage_timing,
+    check_deadline,
+    get_request_deadline,
+)
+
+logger = logging.getLogger(__name__)
+
+_HEADER_LENGTH = struct.Struct("<I")
+# Tensor data is aligned so typed views can be taken directly on the slot
+_TENSOR_ALIGNMENT = 8
+
+PredictionResult = tuple[
+    th.Tensor | None,
+    th.Tensor | None,
+    th.Tensor | None,
+    th.Tensor | None,
+    th.Tensor | None,
+    list[Any],
+]
+
+
+def _write_slot(
+    slot: th.Tensor, header: dict[str, Any], tensors: dict[str, th.Tensor | None]
+) -> None:
+    """Write a header and tensors into a slot."""
+    specs: dict[str, tuple[th.dtype, tuple[int, ...], int]] = {}
+    # Header size isn't known until the specs are, so tensors are laid out from the end of the slot
+    offset = slot.numel()
+    for name, tensor in tensors.items():
+        if tensor is None:
+            continue
+        nbytes = tensor.numel() * tensor.element_size()
+        offset = (offset - nbytes) // _TENSOR_ALIGNMENT * _TENSOR_ALIGNMENT
+        specs[name] = (tensor.dtype, tuple(tensor.shape), offset)
+    header_bytes = pickle.dumps({**header, "tensors": specs})
+    header_end = _HEADER_LENGTH.size + len(header_bytes)
+    if header_end > offset:
+        raise ValueError(
+            f"Request needs {header_end + slot.numel() - offset} bytes,"
+            f" larger than the {slot.numel()} byte shared memory slot"
+        )
+
+    slot[: _HEADER_LENGTH.size].copy_(
+        th.frombuffer(bytearray(_HEADER_LENGTH.pack(len(header_bytes))), dtype=th.uint8)
+    )
+    slot[_HEADER_LENGTH.size : header_end].copy_(
+        th.frombuffer(bytearray(header_bytes), dtype=th.uint8)
+    )
+    for name, (dtype, shape, tensor_offset) in specs.items():
+        tensor = tensors[name]
+        assert tensor is not None
+        _view(slot, dtype, shape, tensor_offset).copy_(tensor.detach().cpu())
+
+
+def _read_slot(slot: th.Tensor) -> tuple[dict[str, Any], dict[str, th.Tensor]]:
+    """Read a header and copies of the tensors out of a slot."""
+    (header_length,) = _HEADER_LENGTH.unpack(
+        slot[: _HEADER_LENGTH.size].numpy().tobytes()
+    )
+    header = pickle.loads(
+        slot[_HEADER_LENGTH.size : _HEADER_LENGTH.size + header_length]
+        .numpy()
+        .tobytes()
+    )
+    tensors = {
+        # Copy, since the slot is reused as soon as it's released
+        name: _view(slot, dtype, shape, offset).clone()
+        for name, (dtype, shape, offset) in header.pop("tensors").items()
+    }
+    return header, tensors
+
+
+def _view(
+    slot: th.Tensor, dtype: th.dtype, shape: tuple[int, ...], offset: int
+) -> th.Tensor:
+    nbytes = th.Size(shape).numel() * th.empty((), dtype=dtype).element_size()
+    return slot[offset : offset + nbytes].view(dtype).view(shape)
+
+
+def _worker(
+    worker_id: int,
+    device: str,
+    slots: list[th.Tensor],
+    request_queue: Any,
+    response_connection: mp_connection.Connection,
+    model_cache_bytes: int | None = None,
+    precision: str = FLOAT32_PRECISION,
+) -> None:
+    try:
+        logger.info(f"Running process worker {worker_id}")
+        model_cache = ModelCache(
+            lambda model_path: PPO.load(
+                model_path, device=device, trainable=False, precision=precision
+            ),
+            max_bytes=model_cache_bytes,
+        )
+
+        while True:
+            slot_index = request_queue.get()
+            if slot_index is None:
+                logger.info(f"Received end, terminating worker process {worker_id}")
+                break
+            slot = slots[slot_index]
+            try:
+                request, inputs = _read_slot(slot)
+                if request.get("unload"):
+                    model_cache.discard(request["model_path"])
+                    _write_slot(slot, {}, {})
+                    response_connection.send(slot_index)
+                    continue
+                # Includes loading the model on a cache miss, like the thread processor
+                forward_start_time = time.perf_counter()
+                with model_cache.acquire(request["model_path"]) as model:
+                    if "observation" not in inputs:
+                        # Preload model, don't actually predict
+                        _write_slot(slot, {"ext_results": []}, {})
+                    else:
+                        (
+                            actions,
+                            log_probs,
+                            entropy,
+                            values,
+                            probs,
+                            ext_results,
+                        ) = model.predict(
+                            inputs["observation"].to(device),
+                            inputs["action_masks"].to(device),
+                            deterministic=request["deterministic"],
+                            return_actions=request["return_actions"],
+                            return_values=request["return_values"],
+                            return_log_probs=request["return_log_probs"],
+                            return_entropy=request["return_entropy"],
+                            return_probs=request["return_probs"],
+                            extensions=request["extensions"],
+                            return_device="cpu",
+                        )
+                        _write_slot(
+                            slot,
+                            {
+                                "ext_results": ext_results,
+                                "forward_seconds": time.perf_counter()
+                                - forward_start_time,
+                            },
+                            {
+                                "actions": actions,
+                                "log_probs": log_probs,
+                                "entropy": entropy,
+                                "values": values,
+                                "probs": probs,
+                            },
+                        )
+            except Exception as e:
+                logger.exception(f"Worker {worker_id} failed to process request")
+                _write_slot(slot, {"error": f"{type(e).__name__}: {e}"}, {})
+            response_connection.send(slot_index)
+    except KeyboardInterrupt:
+        logger.info(f"Process interrupted: {worker_id}")
+    except Exception:
+        logger.exception(f"Caught error in worker: {worker_id}")
+    finally:
+        logger.info(f"Worker process completed: {worker_id}")
+
+
+class _Worker:
+    def __init__(
+        self,
+        process: mp.Process,
+        slots: list[th.Tensor],
+        request_queue: Any,
+        responses: mp_connection.Connection,
+    ):
+        self.process = process
+        self.slots = slots
+        self.request_queue = request_queue
+        # Read end of the worker's response pipe
+        self.responses = responses
+        # Set once the worker is known to have exited, new requests fail instead of waiting on it
+        self.exited = False
+        self.free_slots: asyncio.Queue[int] = asyncio.Queue()
+        for slot_index in range(len(slots)):
+            self.free_slots.put_nowait(slot_index)
+        self.pending: dict[int, asyncio.Future[None]] = {}
+
+
+class ProcessProcessor(RemoteProcessor):
+    """Process-pool based processor, so inference doesn't share the server's GIL."""
+
+    def __init__(
+        self,
+        pool_size: int,
+        device: str = "cpu",
+        slots_per_worker: int = 4,
+        slot_bytes: int = 1 << 20,
+        model_cache_bytes: int | None = None,
+        precision: str = FLOAT32_PRECISION,
+    ):
+        self._pool_size = pool_size
+        self._device = device
+        self._slots_per_worker = slots_per_worker
+        self._slot_bytes = slot_bytes
+        self._model_cache_bytes = model_cache_bytes
+        self._precision = precision
+        self._workers: list[_Worker] = []
+        self._response_thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def get_pool_size(self) -> int:
+        return self._pool_size
+
+    def get_device(self) -> str:
+        return self._device
+
+    async def initialize(self) -> None:
+        """Allocate shared memory slots and start the worker processes."""
+        assert self._loop is None
+        self._loop = asyncio.get_running_loop()
+        ctx = mp.get_context("spawn")  # Can't fork with GPU support
+        worker_response_connections = []
+        for worker_id in range(self._pool_size):
+            slots = [
+                th.zeros(self._slot_bytes, dtype=th.uint8).share_memory_()
+                for _ in range(self._slots_per_worker)
+            ]
+            request_queue = ctx.Queue()
+            # Each worker responds on its own pipe (rather than a shared queue, where a worker exiting while it
+            # holds the queue's lock would block every other worker)
+            responses, worker_responses = ctx.Pipe(duplex=False)
+            worker_response_connections.append(worker_responses)
+            process = ctx.Process(
+                target=_worker,
+                args=(
+                    worker_id,
+                    self._device,
+                    slots,
+                    request_queue,
+                    worker_responses,
+                    self._model_cache_bytes,
+                    self._precision,
+                ),
+                daemon=True,
+                name=f"Process Processor {worker_id}",
+            )
+            self._workers.append(_Worker(process, slots, request_queue, responses))
+        for worker in self._workers:
+            worker.process.start()
+        for worker_responses in worker_response_connections:
+            # Only the worker holds the write end now, so its pipe reaches EOF as soon as it exits
+            worker_responses.close()
+
+        self._response_thread = threading.Thread(
+            target=self._read_responses, name="process-processor-responses", daemon=True
+        )
+        self._response_thread.start()
+        logger.info(
+            f"Started {self._pool_size} process workers with {self._slots_per_worker}"
+            f" x {self._slot_bytes} byte shared memory slots each"
+        )
+
+    async def predict(
+        self,
+        process_id: int,
+        model_path: str,
+        observation: th.Tensor | None = None,
+        action_masks: th.Tensor | None = None,
+        deterministic: bool | th.Tensor = False,
+        return_device: str | None = None,
+        return_actions: bool = True,
+        return_log_probs: bool = False,
+        return_entropy: bool = False,
+        return_values: bool = False,
+        return_probs: bool = False,
+        extensions: list[str] = [],
+    ) -> PredictionResult:
+        if return_device is None and observation is not None:
+            return_device = str(observation.device)
+
+        response, outputs = await self._call(
+            process_id,
+            {
+                "model_path": model_path,
+                "deterministic": (
+                    deterministic.cpu()
+                    if isinstance(deterministic, th.Tensor)
+                    else deterministic
+                ),
+                "return_actions": return_actions,
+                "return_log_probs": return_log_probs,
+                "return_entropy": return_entropy,
+                "return_values": return_values,
+                "return_probs": return_probs,
+                "extensions": extensions,
+            },
+            {"observation": observation, "action_masks": action_masks},
+        )
+
+        def _output(name: str) -> th.Tensor | None:
+            tensor = outputs.get(name)
+            if tensor is not None and return_device is not None:
+                tensor = tensor.to(return_device)
+            return tensor
+
+        return (
+            _output("actions"),
+            _output("log_probs"),
+            _output("entropy"),
+            _output("values"),
+            _output("probs"),
+            response["ext_results"],
+        )
+
+    async def unload_model(self, process_id: int, model_path: str) -> None:
+        """Drop a model from a worker's cache once its in-flight predictions finish."""
+        await self._call(process_id, {"unload": True, "model_path": model_path}, {})
+
+    async def _call(
+        self,
+        process_id: int,
+        request: dict[str, Any],
+        inputs: dict[str, th.Tensor | None],
+    ) -> tuple[dict[str, Any], dict[str, th.Tensor]]:
+        """Send a request to a worker through a free slot and wait for its response."""
+        assert self._loop is not None, "Process processor is not initialized"
+        worker = self._workers[process_id]
+        self._check_alive(process_id)
+        submitted_at = time.perf_counter()
+        slot_index = await worker.free_slots.get()
+        slot = worker.slots[slot_index]
+        try:
+            # The worker may have exited while this request waited for a slot
+            self._check_alive(process_id)
+            # Requests that waited past their deadline for a slot aren't worth sending to the worker
+            check_deadline(get_request_deadline())
+            _write_slot(slot, request, inputs)
+        except Exception:
+            worker.free_slots.put_nowait(slot_index)
+            raise
+
+        completed = self._loop.create_future()
+        worker.pending[slot_index] = completed
+        worker.request_queue.put(slot_index)
+        release_slot = True
+        try:
+            await asyncio.shield(completed)
+            response, outputs = _read_slot(slot)
+        except asyncio.CancelledError:
+            if not completed.done():
+                # The worker still owns the slot, so only release it once the worker is done with it
+                release_slot = False
+                completed.add_done_callback(
+                    lambda _: worker.free_slots.put_nowait(slot_index)
+                )
+            raise
+        finally:
+            if release_slot:
+                worker.free_slots.put_nowait(slot_index)
+
+        if "error" in response:
+            raise RuntimeError(f"Worker {process_id} failed: {response['error']}")
+        if "forward_seconds" in response:
+            forward_seconds = response["forward_seconds"]
+            # Everything else is waiting for a slot and the worker, and transport to and from it
+            add_stage_timing(
+                QUEUE_WAIT_STAGE, time.perf_counter() - submitted_at - forward_seconds
+            )
+            add_stage_timing(FORWARD_STAGE, forward_seconds)
+        return response, outputs
+
+    def _check_alive(self, process_id: int) -> None:
+        worker = self._workers[process_id]
+        if worker.exited or not worker.process.is_alive():
+            raise RuntimeError(
+                f"Worker {process_id} exited with code {worker.process.exitcode}"
+            )
+
+    async def close(self) -> None:
+        if self._loop is None:
+            # Not initialized
+            return
+        logger.info("Closing process processor")
+        for worker in self._workers:
+            worker.request_queue.put(None)
+        for worker in self._workers:
+            # These will block the event loop
+            # hopefully won't take long, and this is only called at the end anyway
+            worker.process.join()
+            for future in worker.pending.values():
+                future.cancel()
+            worker.pending.clear()
+        if self._response_thread is not None:
+            # Stops once every worker's response pipe is closed
+            self._response_thread.join()
+        logger.info("Process processor closed")
+
+    def _read_responses(self) -> None:
+        # Blocking pipe reads happen on this thread, and completions are handed back to the event loop
+        assert self._loop is not None
+        connections = {
+            worker.responses: worker_id
+            for worker_id, worker in enumerate(self._workers)
+        }
+        while connections and not self._loop.is_closed():
+            for connection in mp_connection.wait(list(connections), timeout=1.0):
+                assert isinstance(connection, mp_connection.Connection)
+                worker_id = connections[connection]
+                try:
+                    slot_index = connection.recv()
+                except (EOFError, OSError):
+                    # The worker exited, fail its requests now rather than waiting for responses that won't come
+                    del connections[connection]
+                    connection.close()
+                    # Reap the worker, so its exit code is known
+                    self._workers[worker_id].process.join(timeout=1.0)
+                    self._loop.call_soon_threadsafe(self._fail_pending, worker_id)
+                    continue
+                self._loop.call_soon_threadsafe(self._complete, worker_id, slot_index)
+
+    def _complete(self, worker_id: int, slot_index: int) -> None:
+        future = self._workers[worker_id].pending.pop(slot_index, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def _fail_pending(self, worker_id: int) -> None:
+        worker = self._workers[worker_id]
+        worker.exited = True
+        exit_code = worker.process.exitcode
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(
+                    RuntimeError(f"Worker {worker_id} exited with code {exit_code}")
+                )
+        worker.pending.clear()
@@ -5,23 +5,86 @@ import logging
 import time
 import uuid
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
 from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Any
 
 import torch as th
 
-from osrs_backend.ml.ppo import PPO
+from osrs_backend.ml.model_cache import ModelCache, ModelCacheStats
+from osrs_backend.ml.ppo import FLOAT32_PRECISION, PPO
+from osrs_backend.ml.router import RANDOM_ROUTER, WorkerRouter, create_router
 
 logger = logging.getLogger(__name__)
 
 THREAD_REMOTE_PROCESSOR = "thread"
-REMOTE_PROCESSOR_TYPES = [THREAD_REMOTE_PROCESSOR]
+PROCESS_REMOTE_PROCESSOR = "process"
+REMOTE_PROCESSOR_TYPES = [THREAD_REMOTE_PROCESSOR, PROCESS_REMOTE_PROCESSOR]
+
+# Stages of a prediction that processors report timings for
+QUEUE_WAIT_STAGE = "queue_wait"
+FORWARD_STAGE = "forward"
+
+# Timings of the request currently being processed, if they're being recorded
+_stage_timings: ContextVar[dict[str, float] | None] = ContextVar(
+    "stage_timings", default=None
+)
+
+
+@contextmanager
+def record_stage_timings() -> Iterator[dict[str, float]]:
+    """Collect the time (seconds) spent in each stage by predictions made while the context is open."""
+    timings: dict[str, float] = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+def add_stage_timing(stage: str, seconds: float) -> None:
+    """Add time spent in a stage to the current request's timings, if they're being recorded."""
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class DeadlineExceededError(Exception):
+    """Raised instead of making a prediction that can't complete before its request's deadline."""
+
+
+# The time.perf_counter() time the request currently being processed must complete by, if it has a deadline
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def request_deadline(deadline: float | None) -> Iterator[None]:
+    """Skip predictions made while the context is open once they're dequeued after the deadline."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_request_deadline() -> float | None:
+    """The current request's deadline, if it has one."""
+    return _deadline.get()
+
+
+def check_deadline(deadline: float | None, expected_seconds: float = 0.0) -> None:
+    """Raise if work expected to take the given time can't complete before the deadline."""
+    if deadline is not None and time.perf_counter() + expected_seconds > deadline:
+        raise DeadlineExceededError("Deadline exceeded")
 
 
 class RemoteProcessor(ABC):
     """Abstract base class for model inference processors."""
 
+    _router: WorkerRouter | None = None
+
     @abstractmethod
     async def predict(
         self,
@@ -59,6 +122,62 @@ class RemoteProcessor(ABC):
     def get_device(self) -> str:
         pass
 
+    async def unload_model(self, process_id: int, model_path: str) -> None:
+        """Free a model that won't be used anymore, once its in-flight predictions complete.
+
+        Processors that can't unload individual models rely on their own cache expiry instead.
+        """
+
+    def get_router(self) -> WorkerRouter:
+        """Get the router used by routed_predict (random unless one was set)."""
+        if self._router is None:
+            self._router = create_router(RANDOM_ROUTER, self.get_pool_size())
+        return self._router
+
+    def set_router(self, router: WorkerRouter) -> None:
+        """Set the router used by routed_predict."""
+        self._router = router
+
+    async def routed_predict(
+        self,
+        model_path: str,
+        observation: th.Tensor | None = None,
+        action_masks: th.Tensor | None = None,
+        deterministic: bool | th.Tensor = False,
+        return_device: str | None = None,
+        return_actions: bool = True,
+        return_log_probs: bool = False,
+        return_entropy: bool = False,
+        return_values: bool = False,
+        return_probs: bool = False,
+        extensions: list[str] = [],
+    ) -> tuple[
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        list[Any],
+    ]:
+        """Same as predict, but the router picks the worker (and tracks its queue depth)."""
+        router = self.get_router()
+        process_id = router.select_worker(model_path)
+        with router.track(process_id):
+            return await self.predict(
+                process_id=process_id,
+                model_path=model_path,
+                observation=observation,
+                action_masks=action_masks,
+                deterministic=deterministic,
+                return_device=return_device,
+                return_actions=return_actions,
+                return_log_probs=return_log_probs,
+                return_entropy=return_entropy,
+                return_values=return_values,
+                return_probs=return_probs,
+                extensions=extensions,
+            )
+
     async def __aenter__(self) -> "RemoteProcessor":
         return self
 
@@ -69,16 +188,22 @@ class RemoteProcessor(ABC):
 class ThreadedProcessor(RemoteProcessor):
     """Thread-pool based processor for CPU inference."""
 
-    def __init__(self, pool_size: int, device: str = "cpu"):
+    def __init__(
+        self,
+        pool_size: int,
+        device: str = "cpu",
+        model_cache_bytes: int | None = None,
+        precision: str = FLOAT32_PRECISION,
+    ):
         self._pool_size = pool_size
         self._device = device
+        self._precision = precision
         self._executor = ThreadPoolExecutor(
             max_workers=pool_size,
             thread_name_prefix=f"ml-inference-{str(uuid.uuid4())[:8]}",
         )
-        self._model_locks: dict[str, Lock] = {}
-        self._models: dict[str, PPO] = {}
-        self._lock_lock = Lock()
+        # Loaded models are kept within the memory budget (if given) by evicting least recently used models
+        self._model_cache = ModelCache(self._load_model, max_bytes=model_cache_bytes)
 
     def get_pool_size(self) -> int:
         return self._pool_size
@@ -86,6 +211,14 @@ class ThreadedProcessor(RemoteProcessor):
     def get_device(self) -> str:
         return self._device
 
+    def get_model_cache_stats(self) -> ModelCacheStats:
+        """Get the loaded model cache counters."""
+        return self._model_cache.get_stats()
+
+    async def unload_model(self, process_id: int, model_path: str) -> None:
+        # Models are shared by all threads
+        self._model_cache.discard(model_path)
+
     async def close(self) -> None:
         self._executor.shutdown(wait=True)
 
@@ -112,9 +245,11 @@ class ThreadedProcessor(RemoteProcessor):
         list[Any],
     ]:
         loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(
+        submitted_at = time.perf_counter()
+        started_at, result = await loop.run_in_executor(
             self._executor,
-            self._worker_task,
+            self._timed_worker_task,
+            get_request_deadline(),
             model_path,
             observation,
             action_masks,
@@ -127,6 +262,17 @@ class ThreadedProcessor(RemoteProcessor):
             return_probs,
             extensions,
         )
+        add_stage_timing(QUEUE_WAIT_STAGE, started_at - submitted_at)
+        add_stage_timing(FORWARD_STAGE, time.perf_counter() - started_at)
+        return result
+
+    def _timed_worker_task(
+        self, deadline: float | None, *args: Any
+    ) -> tuple[float, Any]:
+        """Run a worker task unless it waited past its deadline, also returning when it started running."""
+        started_at = time.perf_counter()
+        check_deadline(deadline)
+        return started_at, self._worker_task(*args)
 
     def _worker_task(
         self,
@@ -149,52 +295,32 @@ class ThreadedProcessor(RemoteProcessor):
         th.Tensor | None,
         list[Any],
     ]:
-        model = self._load_model(model_path)
-        if observation is None:
-            # Preload model, don't actually predict
-            return None, None, None, None, None, []
-        else:
-            if return_device is None:
-                return_device = str(observation.device)
-            assert action_masks is not None
-            action_masks = action_masks.to(self._device)
-            return model.predict(
-                observation.to(self._device),
-                action_masks,
-                deterministic=deterministic,
-                return_actions=return_actions,
-                return_values=return_values,
-                return_log_probs=return_log_probs,
-                return_entropy=return_entropy,
-                return_probs=return_probs,
-                return_device=return_device,
-                extensions=extensions,
-            )
+        with self._model_cache.acquire(model_path) as model:
+            if observation is None:
+                # Preload model, don't actually predict
+                return None, None, None, None, None, []
+            else:
+                if return_device is None:
+                    return_device = str(observation.device)
+                assert action_masks is not None
+                action_masks = action_masks.to(self._device)
+                return model.predict(
+                    observation.to(self._device),
+                    action_masks,
+                    deterministic=deterministic,
+                    return_actions=return_actions,
+                    return_values=return_values,
+                    return_log_probs=return_log_probs,
+                    return_entropy=return_entropy,
+                    return_probs=return_probs,
+                    return_device=return_device,
+                    extensions=extensions,
+                )
 
     def _load_model(self, model_path: str) -> PPO:
-        # Thread-safe model loading with caching
-        if model_path not in self._models:
-            # Find/create model lock
-            with self._lock_lock:
-                if model_path not in self._model_locks:
-                    self._model_locks[model_path] = Lock()
-                model_lock = self._model_locks[model_path]
-            with model_lock:
-                # Double check model hasn't already loaded
-                if model_path not in self._models:
-                    load_start_time = time.time()
-                    logger.info(f"Loading model {model_path} into memory")
-                    self._models[model_path] = PPO.load(
-                        model_path, device=self._device, trainable=False
-                    )
-                    logger.info(
-                        f"Loaded model {model_path} in {time.time() - load_start_time:.2f}s"
-                    )
-            with self._lock_lock:
-                # Clean up lock after model loaded
-                if model_path in self._model_locks:
-                    del self._model_locks[model_path]
-        return self._models[model_path]
+        return PPO.load(
+            model_path, device=self._device, trainable=False, precision=self._precision
+        )
 
 
 async def create_remote_processor(
@@ -205,5 +331,13 @@ async def create_remote_processor(
 ) -> RemoteProcessor:
     """Factory function to create a remote processor."""
     if processor_type == THREAD_REMOTE_PROCESSOR:
-        return ThreadedProcessor(pool_size=pool_size, device=device)
+        return ThreadedProcessor(pool_size=pool_size, device=device, **kwargs)
+    if processor_type == PROCESS_REMOTE_PROCESSOR:
+        from osrs_backend.ml.process_remote_processor import ProcessProcessor
+
+        process_processor = ProcessProcessor(
+            pool_size=pool_size, device=device, **kwargs
+        )
+        await process_processor.initialize()
+        return process_processor
     raise ValueError(f"Unknown processor type: {processor_type}")
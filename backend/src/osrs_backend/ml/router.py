@@ -0,0 +1,105 @@
+"""Worker routing strategies for remote processors."""
+
+import bisect
+import hashlib
+import random
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+RANDOM_ROUTER = "random"
+LEAST_OUTSTANDING_ROUTER = "least-outstanding"
+CONSISTENT_HASH_ROUTER = "consistent-hash"
+
+ROUTER_TYPES = [
+    RANDOM_ROUTER,
+    LEAST_OUTSTANDING_ROUTER,
+    CONSISTENT_HASH_ROUTER,
+]
+
+
+class WorkerRouter(ABC):
+    """Picks the worker for each request, and tracks outstanding requests per worker."""
+
+    def __init__(self, pool_size: int):
+        self._queue_depths = [0] * pool_size
+
+    @abstractmethod
+    def select_worker(self, model_path: str) -> int:
+        pass
+
+    def get_preload_workers(self, model_path: str) -> list[int]:
+        """The workers a model could be routed to, and should be loaded on ahead of time."""
+        return list(range(len(self._queue_depths)))
+
+    def get_queue_depths(self) -> list[int]:
+        """Outstanding requests on each worker."""
+        return list(self._queue_depths)
+
+    @contextmanager
+    def track(self, worker_id: int) -> Iterator[None]:
+        """Count a request as outstanding on a worker while the context is open."""
+        self._queue_depths[worker_id] += 1
+        try:
+            yield
+        finally:
+            self._queue_depths[worker_id] -= 1
+
+
+class RandomRouter(WorkerRouter):
+    """Uniformly random worker assignment."""
+
+    def select_worker(self, model_path: str) -> int:
+        return random.randint(0, len(self._queue_depths) - 1)
+
+
+class LeastOutstandingRouter(WorkerRouter):
+    """Sends each request to the worker with the fewest outstanding requests."""
+
+    def select_worker(self, model_path: str) -> int:
+        min_depth = min(self._queue_depths)
+        # Break ties randomly, so idle workers share the load
+        return random.choice(
+            [i for i, depth in enumerate(self._queue_depths) if depth == min_depth]
+        )
+
+
+class ConsistentHashRouter(WorkerRouter):
+    """Always sends a model to the same worker.
+
+    Each worker only needs to load (and keep warm) a subset of the models. Virtual
+    nodes spread models evenly, and only ~1/n of models move if the pool size changes.
+    """
+
+    def __init__(self, pool_size: int, virtual_nodes: int = 64):
+        super().__init__(pool_size)
+        ring = sorted(
+            (_stable_hash(f"{worker_id}:{node}"), worker_id)
+            for worker_id in range(pool_size)
+            for node in range(virtual_nodes)
+        )
+        self._ring_hashes = [node_hash for node_hash, _ in ring]
+        self._ring_workers = [worker_id for _, worker_id in ring]
+
+    def select_worker(self, model_path: str) -> int:
+        i = bisect.bisect(self._ring_hashes, _stable_hash(model_path))
+        return self._ring_workers[i % len(self._ring_workers)]
+
+    def get_preload_workers(self, model_path: str) -> list[int]:
+        return [self.select_worker(model_path)]
+
+
+def _stable_hash(key: str) -> int:
+    # Python's hash() is randomized per process, so use a stable hash
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+def create_router(router_type: str, pool_size: int) -> WorkerRouter:
+    """Factory function to create a worker router."""
+    if router_type == RANDOM_ROUTER:
+        return RandomRouter(pool_size)
+    elif router_type == LEAST_OUTSTANDING_ROUTER:
+        return LeastOutstandingRouter(pool_size)
+    elif router_type == CONSISTENT_HASH_ROUTER:
+        return ConsistentHashRouter(pool_size)
+    raise ValueError(f"Unknown router type: {router_type}")
@@ -0,0 +1,209 @@
+"""Dynamic micro-batching for model inference.
+
+Bot clients tend to send their requests in bursts aligned to the 600ms game tick.
+Instead of running one forward pass per request, requests that arrive within a
+short window for the same model and output configuration are stacked into a
+single batch, run through the remote processor once, and split back out per request.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import torch as th
+
+from osrs_backend.ml import (
+    DeadlineExceededError,
+    RemoteProcessor,
+    add_stage_timing,
+    check_deadline,
+    get_request_deadline,
+    record_stage_timings,
+    request_deadline,
+)
+from osrs_backend.tcp.metrics import BATCH_WAIT_STAGE
+
+logger = logging.getLogger(__name__)
+
+PredictionResult = tuple[
+    th.Tensor | None,
+    th.Tensor | None,
+    th.Tensor | None,
+    th.Tensor | None,
+    th.Tensor | None,
+    list[Any],
+]
+# A row of a batch's result, when the batch started running, and the batch's stage timings
+_BatchRowResult = tuple[PredictionResult, float, dict[str, float]]
+
+
+@dataclass(frozen=True)
+class BatchKey:
+    """Requests can only share a forward pass if everything except the inputs matches."""
+
+    model_path: str
+    # Frame stack and observation size must match to stack observations
+    obs_shape: tuple[int, ...]
+    mask_size: int
+    # Deterministic sampling is configured per action head, not per row
+    deterministic: bool | tuple[bool, ...]
+    return_log_probs: bool = False
+    return_entropy: bool = False
+    return_values: bool = False
+    return_probs: bool = False
+
+
+@dataclass
+class _PendingBatch:
+    observations: list[th.Tensor] = field(default_factory=list)
+    action_masks: list[th.Tensor] = field(default_factory=list)
+    futures: list[asyncio.Future[_BatchRowResult]] = field(default_factory=list)
+    deadlines: list[float | None] = field(default_factory=list)
+    flush_handle: asyncio.TimerHandle | None = None
+
+
+class InferenceBatcher:
+    """Collects concurrent single-row requests into batched remote processor calls."""
+
+    def __init__(
+        self,
+        remote_processor: RemoteProcessor,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+    ):
+        self._remote_processor = remote_processor
+        self._max_batch_size = max_batch_size
+        self._max_wait_seconds = max_wait_ms / 1000
+        self._pending: dict[BatchKey, _PendingBatch] = {}
+        self._in_flight: set[asyncio.Task[None]] = set()
+
+    async def predict(
+        self, key: BatchKey, observation: th.Tensor, action_masks: th.Tensor
+    ) -> PredictionResult:
+        """Queue a single-row request and wait for its row of the batched result."""
+        assert observation.size(0) == 1, "Batched requests must contain a single row"
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[_BatchRowResult] = loop.create_future()
+        queued_at = time.perf_counter()
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = _PendingBatch()
+            self._pending[key] = pending
+            pending.flush_handle = loop.call_later(
+                self._max_wait_seconds, self._flush, key
+            )
+        pending.observations.append(observation)
+        pending.action_masks.append(action_masks)
+        pending.futures.append(future)
+        pending.deadlines.append(get_request_deadline())
+
+        if len(pending.futures) >= self._max_batch_size:
+            self._flush(key)
+
+        result, batch_started_at, batch_timings = await future
+        # The batch ran in its own task, so its timings are copied to this request's
+        add_stage_timing(BATCH_WAIT_STAGE, batch_started_at - queued_at)
+        for stage, seconds in batch_timings.items():
+            add_stage_timing(stage, seconds)
+        return result
+
+    async def close(self) -> None:
+        """Flush anything still waiting and wait for in-flight batches to complete."""
+        for key in list(self._pending.keys()):
+            self._flush(key)
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _flush(self, key: BatchKey) -> None:
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            # Already flushed because the batch filled up before the timer fired
+            return
+        if pending.flush_handle is not None:
+            pending.flush_handle.cancel()
+        task = asyncio.create_task(self._run_batch(key, pending))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _run_batch(self, key: BatchKey, pending: _PendingBatch) -> None:
+        batch_started_at = time.perf_counter()
+        # Rows that waited past their deadline are dropped from the batch instead of being computed
+        rows = []
+        for i, (future, deadline) in enumerate(zip(pending.futures, pending.deadlines)):
+            try:
+                check_deadline(deadline)
+            except DeadlineExceededError as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            rows.append(i)
+        if not rows:
+            return
+        # The batch is only worth running while any of its rows can still make it
+        row_deadlines = [pending.deadlines[i] for i in rows]
+        batch_deadline = (
+            None
+            if None in row_deadlines
+            else max(deadline for deadline in row_deadlines if deadline is not None)
+        )
+
+        batch_size = len(rows)
+        logger.debug(f"Running batch of {batch_size} for model {key.model_path}")
+        deterministic: bool | th.Tensor = (
+            th.tensor(key.deterministic, dtype=th.bool)
+            if isinstance(key.deterministic, tuple)
+            else key.deterministic
+        )
+        try:
+            with request_deadline(batch_deadline):
+                with record_stage_timings() as batch_timings:
+                    (
+                        actions,
+                        log_probs,
+                        entropy,
+                        values,
+                        probs,
+                        _,
+                    ) = await self._remote_processor.routed_predict(
+                        model_path=key.model_path,
+                        observation=th.cat([pending.observations[i] for i in rows]),
+                        action_masks=th.cat([pending.action_masks[i] for i in rows]),
+                        deterministic=deterministic,
+                        return_actions=True,
+                        return_log_probs=key.return_log_probs,
+                        return_entropy=key.return_entropy,
+                        return_values=key.return_values,
+                        return_probs=key.return_probs,
+                    )
+        except Exception as e:
+            for i in rows:
+                future = pending.futures[i]
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        def _row(tensor: th.Tensor | None, i: int) -> th.Tensor | None:
+            return tensor[i : i + 1] if tensor is not None else None
+
+        for row, i in enumerate(rows):
+            future = pending.futures[i]
+            if future.done():
+                # Client went away while the batch was running
+                continue
+            future.set_result(
+                (
+                    (
+                        _row(actions, row),
+                        _row(log_probs, row),
+                        _row(entropy, row),
+                        _row(values, row),
+                        _row(probs, row),
+                        [],
+                    ),
+                    batch_started_at,
+                    batch_timings,
+                )
+            )
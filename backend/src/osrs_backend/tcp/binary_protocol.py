@@ -0,0 +1,412 @@
+"""Length-prefixed binary encoding of the inference request/response schema.
+
+A client opts in by sending BINARY_PROTOCOL_MAGIC as the first byte of the connection (JSON requests always
+start with '{').
+Every message after that is a 4-byte big-endian length followed by the payload.
+
+Request payload (little-endian):
+    header: version (u8), flags (u8), frames (u16), obs size (u16), action heads (u16), model name length (u16),
+            extensions (u16)
+    session (only in BINARY_PROTOCOL_SESSION_VERSION requests): session id (u32), session flags (u8),
+            stack frames (u16 count + u16 per frame index, if flagged)
+    request id (u32, if flagged), deadline ms (f32, if flagged), model name (utf-8), action head sizes (u16 per head), per-head deterministic bits (if flagged),
+    observations (f32, frames * obs size), action mask bits (one bit per action), extensions (u16 length + utf-8 each)
+
+Response payload (little-endian):
+    header: version (u8), flags (u8), action heads (u16), value count (u16)
+    request id (u32, if flagged), actions (i32 per head), log prob (f32), entropy (f32 per head), values (f32 per value),
+    probs (u16 size per head, then f32 per action), extension results (u32 length + JSON), or an utf-8 error message
+    (flagged as expired if the request missed its deadline)
+"""
+
+import asyncio
+import json
+import struct
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+BINARY_PROTOCOL_MAGIC = b"\xb1"
+BINARY_PROTOCOL_VERSION = 1
+# Requests with a session id use this version, responses are always BINARY_PROTOCOL_VERSION
+BINARY_PROTOCOL_SESSION_VERSION = 2
+
+_LENGTH = struct.Struct("!I")
+_REQUEST_HEADER = struct.Struct("<BBHHHHH")
+_RESPONSE_HEADER = struct.Struct("<BBHH")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_F32 = struct.Struct("<f")
+
+# Request flags
+_DETERMINISTIC = 1 << 0
+_PER_HEAD_DETERMINISTIC = 1 << 1
+_RETURN_LOG_PROB = 1 << 2
+_RETURN_ENTROPY = 1 << 3
+_RETURN_VALUE = 1 << 4
+_RETURN_PROBS = 1 << 5
+_HAS_REQUEST_ID = 1 << 6
+_HAS_DEADLINE = 1 << 7
+
+# Session flags
+_RESET_SESSION = 1 << 0
+_HAS_STACK_FRAMES = 1 << 1
+
+# Response flags
+_HAS_LOG_PROB = 1 << 0
+_HAS_ENTROPY = 1 << 1
+_HAS_VALUES = 1 << 2
+_HAS_PROBS = 1 << 3
+_HAS_EXTENSION_RESULTS = 1 << 4
+_HAS_RESPONSE_REQUEST_ID = 1 << 5
+_EXPIRED = 1 << 6
+_ERROR = 1 << 7
+
+# Frames are rejected above this size before their body is read, so a client can't make the server buffer up to 4 GiB
+DEFAULT_MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+
+class FrameTooLargeError(ValueError):
+    """Raised when a frame's length prefix exceeds the maximum frame size."""
+
+
+async def read_frame(
+    reader: asyncio.StreamReader, max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES
+) -> bytes | None:
+    """Read one frame, returning None if the client disconnected cleanly."""
+    try:
+        size_bytes = await reader.readexactly(_LENGTH.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise
+        # Clean disconnect between frames
+        return None
+    (size,) = _LENGTH.unpack(size_bytes)
+    if size > max_frame_bytes:
+        raise FrameTooLargeError(
+            f"Frame of {size} bytes exceeds the maximum of {max_frame_bytes} bytes"
+        )
+    return await reader.readexactly(size)
+
+
+def frame(payload: bytes) -> bytes:
+    """Prefix a payload with its length."""
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def write_frame(writer: asyncio.StreamWriter, payload: bytes) -> None:
+    """Write one length-prefixed frame."""
+    writer.write(frame(payload))
+
+
+def encode_request(
+    model: str,
+    obs: NDArray[np.float32],
+    action_masks: list[NDArray[np.bool_]] | list[list[bool]],
+    deterministic: list[bool] | bool = False,
+    return_log_prob: bool = False,
+    return_entropy: bool = False,
+    return_value: bool = False,
+    return_probs: bool = False,
+    extensions: list[str] = [],
+    request_id: int | None = None,
+    deadline_ms: float | None = None,
+    session_id: int | None = None,
+    stack_frames: int | list[int] | None = None,
+    reset_session: bool = False,
+) -> bytes:
+    """Encode an inference request frame."""
+    obs = np.asarray(obs, dtype="<f4")
+    assert obs.ndim == 2, f"Observations must be (frames, obs), got {obs.shape}"
+    head_sizes = [len(head) for head in action_masks]
+    flags = (
+        (_RETURN_LOG_PROB if return_log_prob else 0)
+        | (_RETURN_ENTROPY if return_entropy else 0)
+        | (_RETURN_VALUE if return_value else 0)
+        | (_RETURN_PROBS if return_probs else 0)
+        | (_HAS_REQUEST_ID if request_id is not None else 0)
+        | (_HAS_DEADLINE if deadline_ms is not None else 0)
+    )
+    if isinstance(deterministic, list):
+        flags |= _PER_HEAD_DETERMINISTIC
+    elif deterministic:
+        flags |= _DETERMINISTIC
+    model_bytes = model.encode()
+    parts = [
+        _REQUEST_HEADER.pack(
+            (
+                BINARY_PROTOCOL_VERSION
+                if session_id is None
+                else BINARY_PROTOCOL_SESSION_VERSION
+            ),
+            flags,
+            obs.shape[0],
+            obs.shape[1],
+            len(head_sizes),
+            len(model_bytes),
+            len(extensions),
+        ),
+    ]
+    if session_id is not None:
+        session_flags = (_RESET_SESSION if reset_session else 0) | (
+            _HAS_STACK_FRAMES if stack_frames is not None else 0
+        )
+        parts += [_U32.pack(session_id), bytes([session_flags])]
+        if stack_frames is not None:
+            stack_frame_indices = (
+                list(range(stack_frames))
+                if isinstance(stack_frames, int)
+                else stack_frames
+            )
+            parts += [
+                _U16.pack(len(stack_frame_indices)),
+                np.asarray(stack_frame_indices, dtype="<u2").tobytes(),
+            ]
+    parts += [
+        _U32.pack(request_id) if request_id is not None else b"",
+        _F32.pack(deadline_ms) if deadline_ms is not None else b"",
+        model_bytes,
+        np.asarray(head_sizes, dtype="<u2").tobytes(),
+    ]
+    if isinstance(deterministic, list):
+        parts.append(
+            np.packbits(
+                np.asarray(deterministic, dtype=bool), bitorder="little"
+            ).tobytes()
+        )
+    parts.append(obs.tobytes())
+    flattened_masks = np.concatenate(
+        [np.asarray(head, dtype=bool) for head in action_masks]
+    )
+    parts.append(np.packbits(flattened_masks, bitorder="little").tobytes())
+    for extension in extensions:
+        extension_bytes = extension.encode()
+        parts.append(_U16.pack(len(extension_bytes)))
+        parts.append(extension_bytes)
+    return b"".join(parts)
+
+
+def decode_request(payload: bytes) -> dict[str, Any]:
+    """Decode a request frame into InferenceRequest keyword arguments."""
+    # Same (camel-case) keys as the JSON protocol, but with numpy arrays for obs/masks
+    (
+        version,
+        flags,
+        num_frames,
+        obs_size,
+        num_heads,
+        model_length,
+        num_extensions,
+    ) = _REQUEST_HEADER.unpack_from(payload)
+    if version not in (BINARY_PROTOCOL_VERSION, BINARY_PROTOCOL_SESSION_VERSION):
+        raise ValueError(f"Unsupported binary protocol version: {version}")
+    offset = _REQUEST_HEADER.size
+
+    session_id = None
+    stack_frames = None
+    session_flags = 0
+    if version == BINARY_PROTOCOL_SESSION_VERSION:
+        (session_id,) = _U32.unpack_from(payload, offset)
+        session_flags = payload[offset + _U32.size]
+        offset += _U32.size + 1
+        if session_flags & _HAS_STACK_FRAMES:
+            (num_stack_frames,) = _U16.unpack_from(payload, offset)
+            offset += _U16.size
+            stack_frames = np.frombuffer(
+                payload, dtype="<u2", count=num_stack_frames, offset=offset
+            ).tolist()
+            offset += 2 * num_stack_frames
+
+    request_id = None
+    if flags & _HAS_REQUEST_ID:
+        (request_id,) = _U32.unpack_from(payload, offset)
+        offset += _U32.size
+
+    deadline_ms = None
+    if flags & _HAS_DEADLINE:
+        (deadline_ms,) = _F32.unpack_from(payload, offset)
+        offset += _F32.size
+
+    model = payload[offset : offset + model_length].decode()
+    offset += model_length
+
+    head_sizes = np.frombuffer(payload, dtype="<u2", count=num_heads, offset=offset)
+    offset += 2 * num_heads
+
+    deterministic: list[bool] | bool = bool(flags & _DETERMINISTIC)
+    if flags & _PER_HEAD_DETERMINISTIC:
+        num_bytes = (num_heads + 7) // 8
+        deterministic_bits = np.frombuffer(
+            payload, dtype=np.uint8, count=num_bytes, offset=offset
+        )
+        deterministic = (
+            np.unpackbits(deterministic_bits, count=num_heads, bitorder="little")
+            .astype(bool)
+            .tolist()
+        )
+        offset += num_bytes
+
+    num_obs = num_frames * obs_size
+    # Copy so the tensor built from this is writable and aligned
+    obs = (
+        np.frombuffer(payload, dtype="<f4", count=num_obs, offset=offset)
+        .reshape(num_frames, obs_size)
+        .astype(np.float32)
+    )
+    offset += 4 * num_obs
+
+    num_actions = int(head_sizes.sum())
+    num_mask_bytes = (num_actions + 7) // 8
+    mask_bits = np.frombuffer(
+        payload, dtype=np.uint8, count=num_mask_bytes, offset=offset
+    )
+    flattened_masks = np.unpackbits(
+        mask_bits, count=num_actions, bitorder="little"
+    ).astype(bool)
+    action_masks = np.split(flattened_masks, np.cumsum(head_sizes)[:-1])
+    offset += num_mask_bytes
+
+    extensions = []
+    for _ in range(num_extensions):
+        (extension_length,) = _U16.unpack_from(payload, offset)
+        offset += _U16.size
+        extensions.append(payload[offset : offset + extension_length].decode())
+        offset += extension_length
+
+    if offset != len(payload):
+        raise ValueError(
+            f"Invalid request frame: read {offset} of {len(payload)} bytes"
+        )
+
+    return {
+        "model": model,
+        "actionMasks": action_masks,
+        "obs": obs,
+        "deterministic": deterministic,
+        "returnLogProb": bool(flags & _RETURN_LOG_PROB),
+        "returnEntropy": bool(flags & _RETURN_ENTROPY),
+        "returnValue": bool(flags & _RETURN_VALUE),
+        "returnProbs": bool(flags & _RETURN_PROBS),
+        "extensions": extensions,
+        "requestId": request_id,
+        "deadlineMs": deadline_ms,
+        "sessionId": session_id,
+        "stackFrames": stack_frames,
+        "resetSession": bool(session_flags & _RESET_SESSION),
+    }
+
+
+def encode_response(
+    action: list[int],
+    log_prob: float | None = None,
+    entropy: list[float] | None = None,
+    values: float | list[float] | None = None,
+    probs: list[list[float]] | None = None,
+    extension_results: list[Any] = [],
+    request_id: int | None = None,
+) -> bytes:
+    """Encode an inference response frame."""
+    flags = 0
+    parts: list[bytes] = []
+    if request_id is not None:
+        flags |= _HAS_RESPONSE_REQUEST_ID
+        parts.append(_U32.pack(request_id))
+    parts.append(np.asarray(action, dtype="<i4").tobytes())
+    if log_prob is not None:
+        flags |= _HAS_LOG_PROB
+        parts.append(np.asarray([log_prob], dtype="<f4").tobytes())
+    if entropy is not None:
+        flags |= _HAS_ENTROPY
+        parts.append(np.asarray(entropy, dtype="<f4").tobytes())
+    value_array = np.asarray([] if values is None else values, dtype="<f4").ravel()
+    if values is not None:
+        flags |= _HAS_VALUES
+        parts.append(value_array.tobytes())
+    if probs is not None:
+        flags |= _HAS_PROBS
+        parts.append(np.asarray([len(head) for head in probs], dtype="<u2").tobytes())
+        parts.append(
+            np.concatenate([np.asarray(head, dtype="<f4") for head in probs]).tobytes()
+        )
+    if extension_results:
+        flags |= _HAS_EXTENSION_RESULTS
+        # Extension results can be anything, so these stay JSON
+        extension_bytes = json.dumps(extension_results).encode()
+        parts.append(_U32.pack(len(extension_bytes)))
+        parts.append(extension_bytes)
+    header = _RESPONSE_HEADER.pack(
+        BINARY_PROTOCOL_VERSION, flags, len(action), len(value_array)
+    )
+    return header + b"".join(parts)
+
+
+def encode_error(
+    message: str, request_id: int | None = None, expired: bool = False
+) -> bytes:
+    """Encode an error response frame."""
+    flags = _ERROR | (_EXPIRED if expired else 0)
+    if request_id is None:
+        return (
+            _RESPONSE_HEADER.pack(BINARY_PROTOCOL_VERSION, flags, 0, 0)
+            + message.encode()
+        )
+    return (
+        _RESPONSE_HEADER.pack(
+            BINARY_PROTOCOL_VERSION, flags | _HAS_RESPONSE_REQUEST_ID, 0, 0
+        )
+        + _U32.pack(request_id)
+        + message.encode()
+    )
+
+
+def decode_response(payload: bytes) -> dict[str, Any]:
+    """Decode a response frame into InferenceResponse keyword arguments."""
+    version, flags, num_heads, num_values = _RESPONSE_HEADER.unpack_from(payload)
+    if version != BINARY_PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported binary protocol version: {version}")
+    offset = _RESPONSE_HEADER.size
+    request_id = None
+    if flags & _HAS_RESPONSE_REQUEST_ID:
+        (request_id,) = _U32.unpack_from(payload, offset)
+        offset += _U32.size
+    if flags & _ERROR:
+        return {
+            "error": payload[offset:].decode(),
+            "expired": bool(flags & _EXPIRED),
+            "requestId": request_id,
+        }
+
+    def _read(dtype: str, count: int) -> NDArray[Any]:
+        nonlocal offset
+        array = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array
+
+    response: dict[str, Any] = {
+        "action": _read("<i4", num_heads).tolist(),
+        "logProb": None,
+        "entropy": None,
+        "values": None,
+        "probs": None,
+        "extensionResults": [],
+        "requestId": request_id,
+    }
+    if flags & _HAS_LOG_PROB:
+        response["logProb"] = _read("<f4", 1).item()
+    if flags & _HAS_ENTROPY:
+        response["entropy"] = _read("<f4", num_heads).tolist()
+    if flags & _HAS_VALUES:
+        values = _read("<f4", num_values).tolist()
+        # Single row predictions return a scalar value, matching the JSON protocol
+        response["values"] = values[0] if num_values == 1 else values
+    if flags & _HAS_PROBS:
+        head_sizes = _read("<u2", num_heads).tolist()
+        response["probs"] = [_read("<f4", size).tolist() for size in head_sizes]
+    if flags & _HAS_EXTENSION_RESULTS:
+        (extension_length,) = _U32.unpack_from(payload, offset)
+        offset += _U32.size
+        response["extensionResults"] = json.loads(
+            payload[offset : offset + extension_length]
+        )
+    return response
@@ -0,0 +1,224 @@
+"""Per-stage latency histograms and counters for inference serving.
+
+Metrics are rendered in the Prometheus text exposition format, and served by
+the FastAPI app's /metrics route.
+"""
+
+import bisect
+from dataclasses import dataclass, field
+
+from osrs_backend.ml import FORWARD_STAGE, QUEUE_WAIT_STAGE
+
+DECODE_STAGE = "decode"
+TENSOR_BUILD_STAGE = "tensor_build"
+BATCH_WAIT_STAGE = "batch_wait"
+ENCODE_STAGE = "encode"
+
+# In the order a request passes through them
+STAGES = [
+    DECODE_STAGE,
+    TENSOR_BUILD_STAGE,
+    BATCH_WAIT_STAGE,
+    QUEUE_WAIT_STAGE,
+    FORWARD_STAGE,
+    ENCODE_STAGE,
+]
+
+# Requests that fail before their model is known are counted under this model label
+UNKNOWN_MODEL = "unknown"
+
+# Why a request was shed instead of computed
+EXPIRED_SHED_REASON = "expired"
+QUEUE_FULL_SHED_REASON = "queue_full"
+
+# Seconds, fine grained at the low end since most stages take well under a millisecond
+LATENCY_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Histogram with fixed bucket upper bounds."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket, plus the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@dataclass
+class _ModelMetrics:
+    requests: int = 0
+    errors: int = 0
+    shed: dict[str, int] = field(default_factory=dict)
+    request_seconds: Histogram = field(default_factory=Histogram)
+    stage_seconds: dict[str, Histogram] = field(default_factory=dict)
+
+
+class InferenceMetrics:
+    """Per-model (and model version) request counts, error counts and latency histograms.
+
+    Only updated from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self) -> None:
+        # Keyed by model and version slot ("" for unversioned models)
+        self._models: dict[tuple[str, str], _ModelMetrics] = {}
+
+    def observe_request(
+        self,
+        model: str,
+        request_seconds: float,
+        stage_seconds: dict[str, float],
+        error: bool = False,
+        shed_reason: str | None = None,
+        version: str = "",
+    ) -> None:
+        """Record a processed request, and how long it spent in each stage."""
+        metrics = self._get_model_metrics(model, version)
+        metrics.requests += 1
+        if error:
+            metrics.errors += 1
+        if shed_reason is not None:
+            metrics.shed[shed_reason] = metrics.shed.get(shed_reason, 0) + 1
+        metrics.request_seconds.observe(request_seconds)
+        for stage, seconds in stage_seconds.items():
+            histogram = metrics.stage_seconds.get(stage)
+            if histogram is None:
+                histogram = metrics.stage_seconds[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_error(self, model: str = UNKNOWN_MODEL) -> None:
+        """Record a request that failed before it could be processed."""
+        metrics = self._get_model_metrics(model, "")
+        metrics.requests += 1
+        metrics.errors += 1
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format."""
+        lines = [
+            "# HELP osrs_inference_requests_total Inference requests received.",
+            "# TYPE osrs_inference_requests_total counter",
+        ]
+        for (model, version), metrics in self._models.items():
+            lines.append(
+                f"osrs_inference_requests_total{_model_labels(model, version)} {metrics.requests}"
+            )
+        lines += [
+            "# HELP osrs_inference_errors_total Inference requests that failed.",
+            "# TYPE osrs_inference_errors_total counter",
+        ]
+        for (model, version), metrics in self._models.items():
+            lines.append(
+                f"osrs_inference_errors_total{_model_labels(model, version)} {metrics.errors}"
+            )
+        lines += [
+            "# HELP osrs_inference_shed_total Inference requests rejected without being computed.",
+            "# TYPE osrs_inference_shed_total counter",
+        ]
+        for (model, version), metrics in self._models.items():
+            for reason, count in metrics.shed.items():
+                lines.append(
+                    f"osrs_inference_shed_total{_model_labels(model, version, reason=reason)} {count}"
+                )
+        lines += [
+            "# HELP osrs_inference_request_seconds Time from receiving a request to its response being ready.",
+            "# TYPE osrs_inference_request_seconds histogram",
+        ]
+        for (model, version), metrics in self._models.items():
+            lines += _render_histogram(
+                "osrs_inference_request_seconds",
+                metrics.request_seconds,
+                **_model_label_values(model, version),
+            )
+        lines += [
+            "# HELP osrs_inference_stage_seconds Time spent in each stage of processing a request.",
+            "# TYPE osrs_inference_stage_seconds histogram",
+        ]
+        for (model, version), metrics in self._models.items():
+            for stage in STAGES:
+                histogram = metrics.stage_seconds.get(stage)
+                if histogram is not None:
+                    lines += _render_histogram(
+                        "osrs_inference_stage_seconds",
+                        histogram,
+                        **_model_label_values(model, version),
+                        stage=stage,
+                    )
+        return "\n".join(lines) + "\n"
+
+    def _get_model_metrics(self, model: str, version: str) -> _ModelMetrics:
+        metrics = self._models.get((model, version))
+        if metrics is None:
+            metrics = self._models[(model, version)] = _ModelMetrics()
+        return metrics
+
+
+def render_gauge(
+    name: str, help_text: str, samples: list[tuple[dict[str, str], float]]
+) -> str:
+    """Render a gauge in the Prometheus text format."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{_labels(**labels)} {value}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+def _render_histogram(name: str, histogram: Histogram, **labels: str) -> list[str]:
+    lines = []
+    cumulative_count = 0
+    for bucket, count in zip(histogram.buckets, histogram.counts):
+        cumulative_count += count
+        lines.append(
+            f"{name}_bucket{_labels(**labels, le=repr(bucket))} {cumulative_count}"
+        )
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+
+def _model_label_values(model: str, version: str) -> dict[str, str]:
+    # Unversioned models have no version label, so their series are unchanged
+    return {"model": model, "version": version} if version else {"model": model}
+
+
+def _model_labels(model: str, version: str, **labels: str) -> str:
+    return _labels(**_model_label_values(model, version), **labels)
+
+
+def _labels(**labels: str) -> str:
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+        + "}"
+    )
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -3,6 +3,9 @@
 from dataclasses import dataclass, field
 from typing import Any
 
+import numpy as np
+from numpy.typing import NDArray
+
 
 @dataclass(frozen=True)
 class InferenceRequest:
@@ -11,9 +14,11 @@ class InferenceRequest:
     # The model name to use (can be a plugin name instead).
     model: str
     # The action masks (a list of actions for each action head).
-    actionMasks: list[list[bool]]
+    # Binary protocol requests are decoded into an array per action head instead.
+    actionMasks: list[list[bool]] | list[NDArray[np.bool_]]
     # The observations for the current state (a list of each frame - outer list length > 1 if frame stacking).
-    obs: list[list[float | int | bool]]
+    # Binary protocol requests are decoded into a (frames, obs) array instead.
+    obs: list[list[float | int | bool]] | NDArray[np.float32]
     # Whether to sample deterministically. Can be a list to configure on each action head individually.
     deterministic: list[bool] | bool = False
     # This will return the log probability for taking the current action in the response.
@@ -26,6 +31,20 @@ class InferenceRequest:
     returnProbs: bool = False
     # A list of model extensions to run. Results will be included in the response in the order here.
     extensions: list[str] = field(default_factory=list)
+    # An optional id for pipelining. Requests with an id are processed concurrently with other requests on the same
+    # connection, and their responses are written as soon as they complete (possibly out of order), tagged with the id.
+    requestId: int | None = None
+    # An optional time budget, in milliseconds from when the server receives the request. Requests that can't be
+    # completed within it get an error response with "expired" set instead of being computed.
+    deadlineMs: float | None = None
+    # An optional session id, so frame-stacked models can be sent only the newest frame each tick (obs is then a single
+    # frame). The server keeps each session's frame history for the connection, and stacks it the same way PvpEnv does.
+    sessionId: int | None = None
+    # The frame stack of a session, as in PvpEnv: a number of frames, or frame indices where 0 is the newest frame.
+    # Only used when the session is opened or reset, defaults to a single frame.
+    stackFrames: int | list[int] | None = None
+    # Clears the session's frame history before adding this frame, e.g. when a new fight begins.
+    resetSession: bool = False
 
 
 @dataclass(frozen=True)
@@ -44,3 +63,5 @@ class InferenceResponse:
     probs: list[list[float]] | None
     # The results of each model extension specified in the request, in the order the extensions were specified.
     extensionResults: list[Any]
+    # The id of the request this responds to, if requestId was set in the request.
+    requestId: int | None = None
@@ -0,0 +1,113 @@
+"""Cache of responses to repeated deterministic inference requests.
+
+Bots that are idle between fights, or stuck in the same state, send identical
+deterministic requests every tick. Their responses only depend on the model version
+and the request's inputs, so they can be served without running the model again.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+
+import torch as th
+
+from osrs_backend.tcp.protocol import InferenceRequest, InferenceResponse
+
+
+@dataclass(frozen=True)
+class ResponseCacheStats:
+    """Response cache counters."""
+
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    entries: int
+
+
+def is_cacheable(request: InferenceRequest) -> bool:
+    """Only requests sampled deterministically on every action head always get the same response."""
+    if isinstance(request.deterministic, list):
+        return all(request.deterministic)
+    return request.deterministic
+
+
+class ResponseCache:
+    """LRU cache of deterministic responses, bounded by entry count and age.
+
+    Keys include the path of the model version that computed the response, and every
+    loaded version has its own path, so a hot-swapped model never serves responses from
+    the version it replaced. Those are left to age out.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        # Responses (without a request id) and when they were cached, least recently used first
+        self._entries: OrderedDict[
+            Hashable, tuple[InferenceResponse, float]
+        ] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def make_key(
+        model_path: str,
+        request: InferenceRequest,
+        observations: th.Tensor,
+        action_masks: th.Tensor,
+    ) -> Hashable:
+        """Key a request by model version, inputs and requested outputs."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(observations.numpy().tobytes())
+        digest.update(action_masks.numpy().tobytes())
+        return (
+            model_path,
+            tuple(observations.shape),
+            # Probabilities are split per action head in the response
+            tuple(len(action_head) for action_head in request.actionMasks),
+            digest.digest(),
+            request.returnLogProb,
+            request.returnEntropy,
+            request.returnValue,
+            request.returnProbs,
+            tuple(request.extensions),
+        )
+
+    def get(self, key: Hashable) -> InferenceResponse | None:
+        """The cached response for a key, if there's one that hasn't expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        response, cached_at = entry
+        if time.monotonic() - cached_at > self._ttl_seconds:
+            del self._entries[key]
+            self._expirations += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return response
+
+    def put(self, key: Hashable, response: InferenceResponse) -> None:
+        """Cache a response, evicting the least recently used if the cache is full."""
+        self._entries[key] = (response, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get_stats(self) -> ResponseCacheStats:
+        """Cache counters."""
+        return ResponseCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            expirations=self._expirations,
+            entries=len(self._entries),
+        )
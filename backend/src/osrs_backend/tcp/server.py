@@ -10,20 +10,71 @@ import itertools
 import json
 import logging
 import os
-import random
 import time
 from asyncio import StreamReader, StreamWriter
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any
 
+import numpy as np
 import torch as th
 
+from osrs_backend.tcp.batcher import BatchKey, InferenceBatcher
+from osrs_backend.tcp.binary_protocol import (
+    BINARY_PROTOCOL_MAGIC,
+    DEFAULT_MAX_FRAME_BYTES,
+    FrameTooLargeError,
+    decode_request,
+    encode_error,
+    encode_response,
+    frame,
+    read_frame,
+)
+from osrs_backend.tcp.metrics import (
+    DECODE_STAGE,
+    ENCODE_STAGE,
+    EXPIRED_SHED_REASON,
+    QUEUE_FULL_SHED_REASON,
+    TENSOR_BUILD_STAGE,
+    UNKNOWN_MODEL,
+    InferenceMetrics,
+    render_gauge,
+)
 from osrs_backend.tcp.protocol import InferenceRequest, InferenceResponse
+from osrs_backend.tcp.response_cache import (
+    is_cacheable,
+    ResponseCache,
+    ResponseCacheStats,
+)
+from osrs_backend.tcp.sessions import FrameStackSessions
 from osrs_backend.config import get_settings
-from osrs_backend.ml import create_remote_processor, THREAD_REMOTE_PROCESSOR
+from osrs_backend.ml import (
+    add_stage_timing,
+    check_deadline,
+    create_remote_processor,
+    create_router,
+    DeadlineExceededError,
+    FORWARD_STAGE,
+    get_request_deadline,
+    LEAST_OUTSTANDING_ROUTER,
+    ModelCacheStats,
+    ModelRegistry,
+    ModelRoute,
+    ModelVersion,
+    record_stage_timings,
+    request_deadline,
+    ThreadedProcessor,
+    THREAD_REMOTE_PROCESSOR,
+)
 
 logger = logging.getLogger(__name__)
 
 
+class ModelQueueFullError(Exception):
+    """Raised when a model already has as many requests queued as it's allowed."""
+
+
 class TCPInferenceServer:
     """TCP server for ML model inference."""
 
@@ -35,27 +86,54 @@ class TCPInferenceServer:
         pool_size: int = 1,
         processor_type: str = THREAD_REMOTE_PROCESSOR,
         device: str = "cpu",
+        batch_max_size: int = 32,
+        batch_max_wait_ms: float = 2.0,
+        processor_kwargs: dict[str, Any] | None = None,
+        router_type: str = LEAST_OUTSTANDING_ROUTER,
+        models_poll_interval: float = 2.0,
+        max_queued_per_model: int = 256,
+        response_cache_size: int = 0,
+        response_cache_ttl_s: float = 2.0,
+        unix_socket_path: str | None = None,
+        max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
     ):
         self.host = host
         self.port = port
+        # Same-host clients can connect over this Unix domain socket instead of TCP, if given
+        self.unix_socket_path = unix_socket_path
+        # Binary protocol frames larger than this are rejected before they're read, and the connection is closed
+        self.max_frame_bytes = max_frame_bytes
         self.pool_size = pool_size
         self.processor_type = processor_type
         self.device = device
+        self.processor_kwargs = processor_kwargs or {}
+        self.router_type = router_type
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait_ms = batch_max_wait_ms
         self.server = None
+        self.unix_server = None
         self.remote_processor = None
+        self.batcher: InferenceBatcher | None = None
+        self.model_registry: ModelRegistry | None = None
+        self.models_poll_interval = models_poll_interval
+        self.metrics = InferenceMetrics()
+        # Requests beyond this many in progress for a model are shed (0 disables the limit)
+        self.max_queued_per_model = max_queued_per_model
+        self._queued_requests: dict[str, int] = {}
+        # Requests with less time left before their deadline than a model's fastest forward pass are shed
+        # before they're queued, since they can't complete in time
+        self._min_forward_seconds: dict[str, float] = {}
+        # Responses to repeated deterministic requests are reused (a size of 0 disables caching)
+        self.response_cache = (
+            ResponseCache(response_cache_size, response_cache_ttl_s)
+            if response_cache_size > 0
+            else None
+        )
 
-        # Load models
         settings = get_settings()
-        models_path = Path(models_dir or settings.models_dir)
-        if models_path.exists():
-            self.models = {
-                os.path.splitext(filename)[0]: str(models_path / filename)
-                for filename in os.listdir(models_path)
-                if filename.endswith(".zip")
-            }
-        else:
-            logger.warning(f"Models directory not found: {models_path}")
-            self.models = {}
+        self.models_path = Path(models_dir or settings.models_dir)
+        if not self.models_path.exists():
+            logger.warning(f"Models directory not found: {self.models_path}")
 
     async def start(self) -> None:
         """Start the TCP server."""
@@ -63,33 +141,95 @@ class TCPInferenceServer:
             pool_size=self.pool_size,
             processor_type=self.processor_type,
             device=self.device,
+            **self.processor_kwargs,
+        )
+        self.remote_processor.set_router(
+            create_router(self.router_type, self.remote_processor.get_pool_size())
         )
 
-        # Preload models
-        if self.models:
-            await self._preload_models()
+        # Batching is disabled with a max batch size of 1
+        if self.batch_max_size > 1:
+            self.batcher = InferenceBatcher(
+                self.remote_processor,
+                max_batch_size=self.batch_max_size,
+                max_wait_ms=self.batch_max_wait_ms,
+            )
+
+        # Preload models, and hot reload them when the models directory changes
+        self.model_registry = ModelRegistry(
+            str(self.models_path),
+            self.remote_processor,
+            poll_interval=self.models_poll_interval,
+        )
+        await self.model_registry.start()
 
         self.server = await asyncio.start_server(
             self._handle_client, self.host, self.port
         )
         logger.info(f"TCP inference server started on {self.host}:{self.port}")
-        logger.info(f"Available models: {list(self.models.keys())}")
+        if self.unix_socket_path:
+            self.unix_server = await asyncio.start_unix_server(
+                self._handle_client, self.unix_socket_path
+            )
+            logger.info(f"Inference server listening on {self.unix_socket_path}")
+        logger.info(f"Available models: {self.model_registry.get_model_names()}")
 
-    async def _preload_models(self) -> None:
-        """Preload all models into workers."""
+    def get_queue_depths(self) -> list[int]:
+        """Outstanding requests on each worker."""
         if not self.remote_processor:
-            return
-
-        logger.info(
-            f"Preloading {len(self.models)} models on {self.remote_processor.get_pool_size()} workers"
+            return []
+        return self.remote_processor.get_router().get_queue_depths()
+
+    def get_model_cache_stats(self) -> ModelCacheStats | None:
+        """Loaded model cache counters, if the processor caches models in this process."""
+        if isinstance(self.remote_processor, ThreadedProcessor):
+            return self.remote_processor.get_model_cache_stats()
+        return None
+
+    def get_model_routes(self) -> dict[str, ModelRoute]:
+        """The versions of each model serving requests."""
+        if self.model_registry is None:
+            return {}
+        return self.model_registry.get_routes()
+
+    def get_response_cache_stats(self) -> ResponseCacheStats | None:
+        """Response cache counters, if response caching is enabled."""
+        if self.response_cache is None:
+            return None
+        return self.response_cache.get_stats()
+
+    def render_metrics(self) -> str:
+        """Request metrics, worker queue depths and model cache counters in the Prometheus text format."""
+        rendered = self.metrics.render()
+        rendered += render_gauge(
+            "osrs_inference_worker_queue_depth",
+            "Outstanding requests on each worker.",
+            [
+                ({"worker": str(worker)}, depth)
+                for worker, depth in enumerate(self.get_queue_depths())
+            ],
+        )
+        rendered += render_gauge(
+            "osrs_inference_model_queue_depth",
+            "Requests in progress for each model.",
+            [
+                ({"model": model}, queued)
+                for model, queued in self._queued_requests.items()
+            ],
         )
-        preload_tasks = [
-            self.remote_processor.predict(process_id=i, model_path=model)
-            for i in range(self.remote_processor.get_pool_size())
-            for model in self.models.values()
-        ]
-        await asyncio.gather(*preload_tasks)
-        logger.info("Models preloaded successfully")
+        for prefix, description, stats in [
+            ("osrs_model_cache", "Loaded model cache", self.get_model_cache_stats()),
+            ("osrs_response_cache", "Response cache", self.get_response_cache_stats()),
+        ]:
+            if stats is None:
+                continue
+            for stat, value in dataclasses.asdict(stats).items():
+                rendered += render_gauge(
+                    f"{prefix}_{stat}",
+                    f"{description} {stat.replace('_', ' ')}.",
+                    [({}, value)],
+                )
+        return rendered
 
     async def stop(self) -> None:
         """Stop the TCP server."""
@@ -98,6 +238,19 @@ class TCPInferenceServer:
             await self.server.wait_closed()
             logger.info("TCP inference server stopped")
 
+        if self.unix_server:
+            self.unix_server.close()
+            await self.unix_server.wait_closed()
+            # The socket file isn't removed when the server closes
+            if self.unix_socket_path and os.path.exists(self.unix_socket_path):
+                os.unlink(self.unix_socket_path)
+
+        if self.batcher:
+            await self.batcher.close()
+
+        if self.model_registry:
+            await self.model_registry.close()
+
         if self.remote_processor:
             await self.remote_processor.close()
 
@@ -105,37 +258,168 @@ class TCPInferenceServer:
         self, reader: StreamReader, writer: StreamWriter
     ) -> None:
         """Handle a connected client."""
-        client_ip, client_port, *_ = writer.get_extra_info("peername")
-        client_id = f"{client_ip}:{client_port}"
+        client_id = self._get_client_id(writer)
         logger.info(f"[{client_id}] Client connected")
 
-        try:
-            while True:
-                request_line = await reader.readline()
-                if not request_line:
-                    break
+        # Requests with a request id are processed concurrently, so responses can complete out of order
+        write_lock = asyncio.Lock()
+        pipelined_requests: set[asyncio.Task[None]] = set()
+        # Frame history of the connection's sessions, requests are stacked in the order they're received
+        sessions = FrameStackSessions()
+
+        async def respond(response_payload: bytes) -> None:
+            async with write_lock:
+                writer.write(response_payload)
+                await writer.drain()
+
+        async def process_and_respond(
+            request: InferenceRequest,
+            use_binary_protocol: bool,
+            received_at: float,
+            decode_seconds: float,
+        ) -> None:
+            error = False
+            shed_reason = None
+            model_version = None
+            deadline = (
+                received_at + request.deadlineMs / 1000
+                if request.deadlineMs is not None
+                else None
+            )
+            with record_stage_timings() as stage_timings, request_deadline(deadline):
+                add_stage_timing(DECODE_STAGE, decode_seconds)
+                try:
+                    # The model version is pinned until the prediction completes, so a hot reload can't unload it
+                    # mid-request
+                    assert self.model_registry is not None
+                    with self.model_registry.acquire(
+                        request.model
+                    ) as model_version, self._admit(model_version.name):
+                        response = await self._process_request(
+                            request, model_version, client_id
+                        )
+                    encode_start_time = time.perf_counter()
+                    response_payload = self._encode_response(
+                        response, use_binary_protocol
+                    )
+                    add_stage_timing(
+                        ENCODE_STAGE, time.perf_counter() - encode_start_time
+                    )
+                except DeadlineExceededError as e:
+                    logger.debug(f"[{client_id}] Request expired: {e}")
+                    shed_reason = EXPIRED_SHED_REASON
+                    response_payload = self._encode_error(
+                        str(e), request.requestId, use_binary_protocol, expired=True
+                    )
+                except ModelQueueFullError as e:
+                    logger.debug(f"[{client_id}] Request shed: {e}")
+                    shed_reason = QUEUE_FULL_SHED_REASON
+                    response_payload = self._encode_error(
+                        str(e), request.requestId, use_binary_protocol
+                    )
+                except Exception as e:
+                    logger.error(f"[{client_id}] Error processing request: {e}")
+                    error = True
+                    response_payload = self._encode_error(
+                        str(e), request.requestId, use_binary_protocol
+                    )
+            # Requests for a pinned version are counted under their model, so versions can be compared
+            model_label = (
+                model_version.name if model_version is not None else UNKNOWN_MODEL
+            )
+            self.metrics.observe_request(
+                model_label,
+                time.perf_counter() - received_at,
+                stage_timings,
+                error=error,
+                shed_reason=shed_reason,
+                version=model_version.slot if model_version is not None else "",
+            )
+            if FORWARD_STAGE in stage_timings:
+                self._min_forward_seconds[model_label] = min(
+                    stage_timings[FORWARD_STAGE],
+                    self._min_forward_seconds.get(model_label, float("inf")),
+                )
+            await respond(response_payload)
 
-                logger.debug(f"[{client_id}] Received request: {request_line!r}")
+        try:
+            # The protocol is chosen per connection by the first byte sent
+            first_byte = await reader.read(1)
+            use_binary_protocol = first_byte == BINARY_PROTOCOL_MAGIC
+            if use_binary_protocol:
+                logger.info(f"[{client_id}] Using binary protocol")
+            request_prefix = b"" if use_binary_protocol else first_byte
 
+            while True:
+                if use_binary_protocol:
+                    try:
+                        request_frame = await read_frame(reader, self.max_frame_bytes)
+                    except FrameTooLargeError as e:
+                        # The oversized body is never read, so the connection can't continue past it
+                        logger.warning(f"[{client_id}] Rejecting request: {e}")
+                        self.metrics.observe_error()
+                        await respond(self._encode_error(str(e), None, True))
+                        break
+                    if request_frame is None:
+                        break
+                else:
+                    request_line = request_prefix + await reader.readline()
+                    request_prefix = b""
+                    if not request_line:
+                        break
+                    logger.debug(f"[{client_id}] Received request: {request_line!r}")
+
+                received_at = time.perf_counter()
                 try:
-                    request_json = json.loads(request_line)
-                    request = InferenceRequest(**request_json)
-                    response = await self._process_request(request, client_id)
-                    response_json = dataclasses.asdict(response)
-                    response_line = (json.dumps(response_json) + "\n").encode()
-                    writer.write(response_line)
-                    await writer.drain()
+                    if use_binary_protocol:
+                        request = InferenceRequest(**decode_request(request_frame))
+                    else:
+                        request = InferenceRequest(**json.loads(request_line))
                 except Exception as e:
-                    logger.error(f"[{client_id}] Error processing request: {e}")
-                    error_response = {"error": str(e)}
-                    writer.write((json.dumps(error_response) + "\n").encode())
-                    await writer.drain()
+                    logger.error(f"[{client_id}] Error parsing request: {e}")
+                    self.metrics.observe_error()
+                    await respond(self._encode_error(str(e), None, use_binary_protocol))
+                    continue
+                if request.sessionId is not None:
+                    try:
+                        request = self._stack_session_frames(request, sessions)
+                    except Exception as e:
+                        logger.error(
+                            f"[{client_id}] Error stacking session frames: {e}"
+                        )
+                        self.metrics.observe_error()
+                        await respond(
+                            self._encode_error(
+                                str(e), request.requestId, use_binary_protocol
+                            )
+                        )
+                        continue
+                decode_seconds = time.perf_counter() - received_at
+
+                if request.requestId is None:
+                    await process_and_respond(
+                        request, use_binary_protocol, received_at, decode_seconds
+                    )
+                else:
+                    task = asyncio.create_task(
+                        process_and_respond(
+                            request, use_binary_protocol, received_at, decode_seconds
+                        )
+                    )
+                    pipelined_requests.add(task)
+                    task.add_done_callback(pipelined_requests.discard)
+
+            # The client may half-close after sending, so finish what it already asked for
+            if pipelined_requests:
+                await asyncio.gather(*pipelined_requests)
 
         except OSError as e:
             logger.warning(f"[{client_id}] Connection error: {e}")
         except Exception as e:
             logger.exception(f"[{client_id}] Unexpected error: {e}")
         finally:
+            for task in pipelined_requests:
+                task.cancel()
             writer.close()
             try:
                 await writer.wait_closed()
@@ -143,24 +427,110 @@ class TCPInferenceServer:
                 pass
             logger.info(f"[{client_id}] Client disconnected")
 
+    @staticmethod
+    def _get_client_id(writer: StreamWriter) -> str:
+        """Client address for logs, Unix domain socket clients have no address so are told apart by socket."""
+        peername = writer.get_extra_info("peername")
+        if isinstance(peername, tuple):
+            client_ip, client_port, *_ = peername
+            return f"{client_ip}:{client_port}"
+        return f"unix:{writer.get_extra_info('socket').fileno()}"
+
+    @staticmethod
+    def _stack_session_frames(
+        request: InferenceRequest, sessions: FrameStackSessions
+    ) -> InferenceRequest:
+        """Replace a session request's newest frame with the session's frame stack."""
+        assert request.sessionId is not None
+        stacked_obs = sessions.stack(
+            request.sessionId,
+            request.model,
+            np.asarray(request.obs, dtype=np.float32),
+            stack_frames=request.stackFrames,
+            reset=request.resetSession,
+        )
+        return dataclasses.replace(request, obs=stacked_obs)
+
+    @staticmethod
+    def _encode_response(
+        response: InferenceResponse, use_binary_protocol: bool
+    ) -> bytes:
+        """Encode a response for the connection's protocol."""
+        if use_binary_protocol:
+            return frame(
+                encode_response(
+                    action=response.action,
+                    log_prob=response.logProb,
+                    entropy=response.entropy,
+                    values=response.values,
+                    probs=response.probs,
+                    extension_results=response.extensionResults,
+                    request_id=response.requestId,
+                )
+            )
+        return (json.dumps(dataclasses.asdict(response)) + "\n").encode()
+
+    @staticmethod
+    def _encode_error(
+        message: str,
+        request_id: int | None,
+        use_binary_protocol: bool,
+        expired: bool = False,
+    ) -> bytes:
+        """Encode an error response for the connection's protocol."""
+        if use_binary_protocol:
+            return frame(encode_error(message, request_id, expired=expired))
+        error_response: dict[str, Any] = {"error": message}
+        if expired:
+            error_response["expired"] = True
+        if request_id is not None:
+            error_response["requestId"] = request_id
+        return (json.dumps(error_response) + "\n").encode()
+
+    @contextmanager
+    def _admit(self, model_name: str) -> Iterator[None]:
+        """Hold a place in a model's queue, shedding the request if the queue is full or it can't make its deadline."""
+        queued = self._queued_requests.get(model_name, 0)
+        if self.max_queued_per_model > 0 and queued >= self.max_queued_per_model:
+            raise ModelQueueFullError(
+                f"Too many queued requests for model: {model_name}"
+            )
+        check_deadline(
+            get_request_deadline(),
+            expected_seconds=self._min_forward_seconds.get(model_name, 0.0),
+        )
+        self._queued_requests[model_name] = queued + 1
+        try:
+            yield
+        finally:
+            self._queued_requests[model_name] -= 1
+            if self._queued_requests[model_name] == 0:
+                del self._queued_requests[model_name]
+
     async def _process_request(
-        self, request: InferenceRequest, client_id: str
+        self, request: InferenceRequest, model_version: ModelVersion, client_id: str
     ) -> InferenceResponse:
-        """Process an inference request."""
-        model_name = request.model
-
-        if model_name not in self.models:
-            raise ValueError(f"Unknown model: {model_name}. Available: {list(self.models.keys())}")
-
-        logger.info(f"[{client_id}] Generating prediction using model: {model_name}")
-        start_time = time.time()
+        """Process an inference request with the model version it was routed to."""
+        logger.debug(
+            f"[{client_id}] Generating prediction using model: {model_version.key}"
+        )
+        start_time = time.perf_counter()
 
         # Flatten action masks
         raw_sliced_action_masks = request.actionMasks
-        raw_action_masks = list(itertools.chain.from_iterable(raw_sliced_action_masks))
-
-        observations = th.tensor([request.obs], dtype=th.float32, device="cpu")
-        action_masks = th.tensor([raw_action_masks], dtype=th.bool, device="cpu")
+        if isinstance(request.obs, np.ndarray):
+            # Binary protocol requests are already decoded into arrays. Session requests' observations are too, but their
+            # masks may be JSON lists of 0/1, so they're converted to bool like the list branch below
+            observations = th.from_numpy(request.obs).unsqueeze(0)
+            action_masks = th.from_numpy(
+                np.asarray(np.concatenate(raw_sliced_action_masks), dtype=bool)
+            ).unsqueeze(0)
+        else:
+            raw_action_masks = list(
+                itertools.chain.from_iterable(raw_sliced_action_masks)
+            )
+            observations = th.tensor([request.obs], dtype=th.float32, device="cpu")
+            action_masks = th.tensor([raw_action_masks], dtype=th.bool, device="cpu")
 
         sample_deterministic: bool | th.Tensor
         if isinstance(request.deterministic, list):
@@ -169,34 +539,64 @@ class TCPInferenceServer:
             )
         else:
             sample_deterministic = request.deterministic
+        add_stage_timing(TENSOR_BUILD_STAGE, time.perf_counter() - start_time)
 
-        random_pool_worker = random.randint(
-            0, self.remote_processor.get_pool_size() - 1
-        )
-
-        model_path = self.models[model_name]
-        (
-            action,
-            log_probs,
-            entropy,
-            values,
-            flattened_probs,
-            ext_results,
-        ) = await self.remote_processor.predict(
-            observation=observations,
-            deterministic=sample_deterministic,
-            action_masks=action_masks,
-            process_id=random_pool_worker,
-            model_path=model_path,
-            return_actions=True,
-            return_log_probs=request.returnLogProb,
-            return_entropy=request.returnEntropy,
-            return_values=request.returnValue,
-            return_probs=request.returnProbs,
-            extensions=request.extensions,
-        )
+        model_path = model_version.path
+        cache_key = None
+        if self.response_cache is not None and is_cacheable(request):
+            cache_key = ResponseCache.make_key(
+                model_path, request, observations, action_masks
+            )
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                return dataclasses.replace(cached_response, requestId=request.requestId)
+        if self.batcher is not None and not request.extensions:
+            # Extension results can't be split per row, so only plain predictions are batched
+            batch_key = BatchKey(
+                model_path=model_path,
+                obs_shape=tuple(observations.shape[1:]),
+                mask_size=action_masks.size(1),
+                deterministic=(
+                    tuple(request.deterministic)
+                    if isinstance(request.deterministic, list)
+                    else request.deterministic
+                ),
+                return_log_probs=request.returnLogProb,
+                return_entropy=request.returnEntropy,
+                return_values=request.returnValue,
+                return_probs=request.returnProbs,
+            )
+            (
+                action,
+                log_probs,
+                entropy,
+                values,
+                flattened_probs,
+                ext_results,
+            ) = await self.batcher.predict(batch_key, observations, action_masks)
+        else:
+            (
+                action,
+                log_probs,
+                entropy,
+                values,
+                flattened_probs,
+                ext_results,
+            ) = await self.remote_processor.routed_predict(
+                observation=observations,
+                deterministic=sample_deterministic,
+                action_masks=action_masks,
+                model_path=model_path,
+                return_actions=True,
+                return_log_probs=request.returnLogProb,
+                return_entropy=request.returnEntropy,
+                return_values=request.returnValue,
+                return_probs=request.returnProbs,
+                extensions=request.extensions,
+            )
         assert action is not None
 
+        response_start_time = time.perf_counter()
         # Convert flattened probs to action head sizes
         probs = None
         if request.returnProbs and flattened_probs is not None:
@@ -216,10 +616,17 @@ class TCPInferenceServer:
             values=values.tolist()[0] if values is not None else None,
             probs=probs,
             extensionResults=ext_results,
+            requestId=request.requestId,
         )
+        if cache_key is not None:
+            assert self.response_cache is not None
+            self.response_cache.put(
+                cache_key, dataclasses.replace(response, requestId=None)
+            )
+        add_stage_timing(ENCODE_STAGE, time.perf_counter() - response_start_time)
 
-        time_elapsed = time.time() - start_time
-        logger.info(
+        time_elapsed = time.perf_counter() - start_time
+        logger.debug(
             f"[{client_id}] Generated response in {time_elapsed:.4f} seconds: {response.action}"
         )
 
@@ -233,6 +640,16 @@ async def create_tcp_server(
     pool_size: int = 1,
     processor_type: str = THREAD_REMOTE_PROCESSOR,
     device: str = "cpu",
+    batch_max_size: int = 32,
+    batch_max_wait_ms: float = 2.0,
+    processor_kwargs: dict[str, Any] | None = None,
+    router_type: str = LEAST_OUTSTANDING_ROUTER,
+    models_poll_interval: float = 2.0,
+    max_queued_per_model: int = 256,
+    response_cache_size: int = 0,
+    response_cache_ttl_s: float = 2.0,
+    unix_socket_path: str | None = None,
+    max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
 ) -> TCPInferenceServer:
     """Create and start a TCP inference server."""
     server = TCPInferenceServer(
@@ -242,6 +659,16 @@ async def create_tcp_server(
         pool_size=pool_size,
         processor_type=processor_type,
         device=device,
+        batch_max_size=batch_max_size,
+        batch_max_wait_ms=batch_max_wait_ms,
+        processor_kwargs=processor_kwargs,
+        router_type=router_type,
+        models_poll_interval=models_poll_interval,
+        max_queued_per_model=max_queued_per_model,
+        response_cache_size=response_cache_size,
+        response_cache_ttl_s=response_cache_ttl_s,
+        unix_socket_path=unix_socket_path,
+        max_frame_bytes=max_frame_bytes,
     )
     await server.start()
     return server
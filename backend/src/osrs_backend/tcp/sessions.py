@@ -0,0 +1,123 @@
+"""Server-side frame stacking for session requests.
+
+Frame-stacked models take the most recent frames of a fight as their observation, but
+each tick only adds one new frame. Clients that open a session send just that newest
+frame, and the server rebuilds the stack from a ring buffer of the session's history,
+matching how PvpEnv stacks its observations.
+"""
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Sessions live as long as their connection, this bounds how many one connection can hold
+MAX_SESSIONS_PER_CONNECTION = 1024
+
+
+def get_stack_frame_indices(stack_frames: int | list[int]) -> list[int]:
+    """Frame indices to stack (0 is the newest frame), from a frame count or explicit indices like PvpEnv."""
+    if isinstance(stack_frames, int):
+        stack_frames = list(range(stack_frames))
+    if not stack_frames or any(frame < 0 for frame in stack_frames):
+        raise ValueError(f"Invalid stack frames: {stack_frames}")
+    return sorted(stack_frames)
+
+
+class FrameStackSession:
+    """Ring buffer of a session's most recent frames."""
+
+    def __init__(self, model: str, stack_frames: list[int], frame_size: int):
+        self.model = model
+        self.stack_frames = stack_frames
+        self._stack_frame_indices = np.asarray(stack_frames)
+        # Enough history to reach the oldest stacked frame
+        self._frames = np.zeros((stack_frames[-1] + 1, frame_size), dtype=np.float32)
+        self._newest = -1
+
+    @property
+    def frame_size(self) -> int:
+        return self._frames.shape[1]
+
+    def reset(self) -> None:
+        """Forget the frame history, frames before the next one are stacked as zeros."""
+        self._frames.fill(0)
+        self._newest = -1
+
+    def push(self, frame: NDArray[np.float32]) -> NDArray[np.float32]:
+        """Add the newest frame, returning the (frames, obs) stack with the newest frame first."""
+        self._newest = (self._newest + 1) % len(self._frames)
+        self._frames[self._newest] = frame
+        # Fancy indexing copies, so the stack isn't changed by later frames
+        return self._frames[
+            (self._newest - self._stack_frame_indices) % len(self._frames)
+        ]
+
+
+class FrameStackSessions:
+    """The frame stack sessions of a connection, keyed by the client's session id."""
+
+    def __init__(self) -> None:
+        self._sessions: dict[int, FrameStackSession] = {}
+
+    def stack(
+        self,
+        session_id: int,
+        model: str,
+        frame: NDArray[np.float32],
+        stack_frames: int | list[int] | None = None,
+        reset: bool = False,
+    ) -> NDArray[np.float32]:
+        """Add a session's newest frame and return its frame stack, opening the session if it's new."""
+        if frame.ndim != 2 or frame.shape[0] != 1:
+            raise ValueError(
+                f"Session requests must contain a single frame, got {frame.shape[0]}"
+                if frame.ndim == 2
+                else f"Invalid session observation shape: {frame.shape}"
+            )
+        session = self._sessions.get(session_id)
+        if session is None or reset:
+            session = self._open(
+                session_id, model, frame.shape[1], stack_frames, session
+            )
+        elif session.model != model:
+            raise ValueError(
+                f"Session {session_id} is bound to model {session.model}, reset it to change models"
+            )
+        elif session.frame_size != frame.shape[1]:
+            raise ValueError(
+                f"Expected frames of size {session.frame_size} for session {session_id}, got {frame.shape[1]}"
+            )
+        return session.push(frame[0])
+
+    def _open(
+        self,
+        session_id: int,
+        model: str,
+        frame_size: int,
+        stack_frames: int | list[int] | None,
+        previous_session: FrameStackSession | None,
+    ) -> FrameStackSession:
+        if stack_frames is not None:
+            indices = get_stack_frame_indices(stack_frames)
+        elif previous_session is not None:
+            # Reset sessions keep their frame stack unless a new one is given
+            indices = previous_session.stack_frames
+        else:
+            indices = get_stack_frame_indices(1)
+        if (
+            previous_session is not None
+            and previous_session.model == model
+            and previous_session.stack_frames == indices
+            and previous_session.frame_size == frame_size
+        ):
+            previous_session.reset()
+            return previous_session
+        if (
+            previous_session is None
+            and len(self._sessions) >= MAX_SESSIONS_PER_CONNECTION
+        ):
+            raise ValueError(
+                f"Too many sessions on this connection (max {MAX_SESSIONS_PER_CONNECTION})"
+            )
+        session = FrameStackSession(model, indices, frame_size)
+        self._sessions[session_id] = session
+        return session
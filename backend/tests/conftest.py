@@ -0,0 +1,43 @@
+import dataclasses
+from pathlib import Path
+
+import pytest
+import torch as th
+
+from osrs_backend.ml import ppo
+from osrs_backend.ml.policy import Policy
+from osrs_backend.ml.ppo import Meta, PolicyParams
+from osrs_backend.ml.running_mean_std import TensorRunningMeanStd
+
+OBS_SIZE = 8
+ACTION_HEAD_SIZES = [3, 2]
+
+
+@pytest.fixture(autouse=True)
+def torchscript_cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep compiled policies out of the user's cache, including in worker processes."""
+    cache_dir = str(tmp_path / "torchscript")
+    monkeypatch.setenv("TORCH_SCRIPT_CACHE_DIR", cache_dir)
+    monkeypatch.setattr(ppo, "_JIT_CACHE_DIR", cache_dir)
+
+
+def save_model(path: Path, custom_data: dict | None = None) -> None:
+    """Save a small untrained model in the checkpoint format PPO.load reads."""
+    policy_params = PolicyParams(
+        max_sequence_length=1,
+        actor_input_size=OBS_SIZE,
+        critic_input_size=OBS_SIZE,
+        action_head_sizes=ACTION_HEAD_SIZES,
+    )
+    th.save(
+        {
+            "policy_params": policy_params,
+            "meta": Meta(
+                running_observation_stats=TensorRunningMeanStd(shape=(OBS_SIZE,)),
+                normalized_observations=False,
+                custom_data=custom_data or {},
+            ),
+            "policy": Policy(**dataclasses.asdict(policy_params)).state_dict(),
+        },
+        path,
+    )
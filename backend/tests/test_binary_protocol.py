@@ -0,0 +1,27 @@
+import asyncio
+import struct
+
+import pytest
+
+from osrs_backend.tcp.binary_protocol import (
+    FrameTooLargeError,
+    frame,
+    read_frame,
+)
+
+
+async def test_read_frame_round_trip() -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(frame(b"first") + frame(b""))
+    reader.feed_eof()
+    assert await read_frame(reader) == b"first"
+    assert await read_frame(reader) == b""
+    assert await read_frame(reader) is None
+
+
+async def test_oversized_frame_is_rejected_before_its_body_is_read() -> None:
+    reader = asyncio.StreamReader()
+    # Only the length prefix is sent, so reading the body would wait forever
+    reader.feed_data(struct.pack("!I", 0xFFFFFFFF))
+    with pytest.raises(FrameTooLargeError):
+        await asyncio.wait_for(read_frame(reader, max_frame_bytes=1024), timeout=1)
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import signal
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+import torch as th
+
+from osrs_backend.ml.process_remote_processor import (
+    ProcessProcessor,
+    _read_slot,
+    _write_slot,
+)
+
+from .conftest import ACTION_HEAD_SIZES, OBS_SIZE, save_model
+
+
+def test_slot_round_trip() -> None:
+    slot = th.zeros(4096, dtype=th.uint8)
+    tensors = {
+        "observation": th.rand(2, 1, 5),
+        "action_masks": th.tensor([[True, False, True]]),
+        "actions": th.tensor([3, -1], dtype=th.int64),
+        "values": None,
+    }
+    _write_slot(slot, {"model_path": "model.pt", "deterministic": True}, tensors)
+    header, read_tensors = _read_slot(slot)
+    assert header == {"model_path": "model.pt", "deterministic": True}
+    assert read_tensors.keys() == {"observation", "action_masks", "actions"}
+    for name, tensor in read_tensors.items():
+        assert tensor.dtype == tensors[name].dtype
+        assert th.equal(tensor, tensors[name])
+    # Read tensors are copies, so the slot can be reused
+    slot.zero_()
+    assert th.equal(read_tensors["actions"], tensors["actions"])
+
+
+def test_slot_too_small_for_request() -> None:
+    slot = th.zeros(256, dtype=th.uint8)
+    with pytest.raises(ValueError, match="larger than the 256 byte shared memory slot"):
+        _write_slot(slot, {}, {"observation": th.rand(100)})
+
+
+@pytest.fixture
+async def processor(tmp_path: Path) -> AsyncIterator[tuple[ProcessProcessor, str]]:
+    model_path = str(tmp_path / "model.pt")
+    save_model(Path(model_path))
+    processor = ProcessProcessor(pool_size=2, slots_per_worker=2)
+    await processor.initialize()
+    yield processor, model_path
+    await processor.close()
+
+
+async def _predict(
+    processor: ProcessProcessor, process_id: int, model_path: str
+) -> None:
+    actions, *_ = await processor.predict(
+        process_id,
+        model_path,
+        th.rand(2, 1, OBS_SIZE),
+        th.ones(2, sum(ACTION_HEAD_SIZES), dtype=th.bool),
+        deterministic=True,
+    )
+    assert actions is not None and actions.shape == (2, len(ACTION_HEAD_SIZES))
+
+
+async def test_predict(processor: tuple[ProcessProcessor, str]) -> None:
+    process_processor, model_path = processor
+    await _predict(process_processor, 0, model_path)
+    await _predict(process_processor, 1, model_path)
+
+
+async def test_requests_to_killed_worker_fail_under_traffic(
+    processor: tuple[ProcessProcessor, str],
+) -> None:
+    process_processor, model_path = processor
+    await _predict(process_processor, 0, model_path)
+    await _predict(process_processor, 1, model_path)
+    stop_traffic = asyncio.Event()
+
+    async def traffic() -> int:
+        # Responses from the other worker keep arriving while this one dies
+        completed = 0
+        while not stop_traffic.is_set():
+            await _predict(process_processor, 1, model_path)
+            completed += 1
+        return completed
+
+    traffic_task = asyncio.create_task(traffic())
+    # More requests than the worker has slots, so some are pending and some wait for a slot
+    requests = [
+        asyncio.create_task(_predict(process_processor, 0, model_path))
+        for _ in range(8)
+    ]
+    await asyncio.sleep(0)
+    pid = process_processor._workers[0].process.pid
+    assert pid is not None
+    os.kill(pid, signal.SIGKILL)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*requests, return_exceptions=True), timeout=10
+    )
+    assert any(isinstance(result, RuntimeError) for result in results)
+    # New requests to the dead worker fail immediately
+    with pytest.raises(RuntimeError, match="Worker 0 exited"):
+        await asyncio.wait_for(_predict(process_processor, 0, model_path), timeout=1)
+
+    # The other worker keeps serving
+    await asyncio.wait_for(_predict(process_processor, 1, model_path), timeout=5)
+    stop_traffic.set()
+    assert await asyncio.wait_for(traffic_task, timeout=5) > 0
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import struct
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch as th
+
+from osrs_backend.tcp.batcher import BatchKey, PredictionResult
+from osrs_backend.tcp.binary_protocol import (
+    BINARY_PROTOCOL_MAGIC,
+    decode_response,
+    encode_request,
+    read_frame,
+    write_frame,
+)
+from osrs_backend.tcp.server import TCPInferenceServer
+
+from .conftest import OBS_SIZE, save_model
+
+
+@pytest.fixture
+async def server(tmp_path: Path) -> AsyncIterator[TCPInferenceServer]:
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+    save_model(models_dir / "Test.zip")
+    server = TCPInferenceServer(
+        port=0, models_dir=str(models_dir), models_poll_interval=0
+    )
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+async def small_frame_server(tmp_path: Path) -> AsyncIterator[TCPInferenceServer]:
+    server = TCPInferenceServer(
+        port=0, models_dir=str(tmp_path), models_poll_interval=0, max_frame_bytes=1024
+    )
+    await server.start()
+    yield server
+    await server.stop()
+
+
+@pytest.fixture
+async def unix_socket_server(tmp_path: Path) -> AsyncIterator[TCPInferenceServer]:
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+    save_model(models_dir / "Test.zip")
+    server = TCPInferenceServer(
+        port=0,
+        models_dir=str(models_dir),
+        models_poll_interval=0,
+        unix_socket_path=str(tmp_path / "inference.sock"),
+    )
+    await server.start()
+    yield server
+    await server.stop()
+
+
+def _get_port(server: TCPInferenceServer) -> int:
+    assert server.server is not None
+    return server.server.sockets[0].getsockname()[1]
+
+
+async def test_oversized_frame_is_rejected(
+    small_frame_server: TCPInferenceServer,
+) -> None:
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", _get_port(small_frame_server)
+    )
+    writer.write(BINARY_PROTOCOL_MAGIC + struct.pack("!I", 1025))
+    await writer.drain()
+    response = await asyncio.wait_for(read_frame(reader), timeout=5)
+    assert response is not None
+    assert "exceeds the maximum of 1024 bytes" in decode_response(response)["error"]
+    # The server closes the connection instead of reading the body
+    assert await asyncio.wait_for(reader.read(), timeout=5) == b""
+    writer.close()
+
+
+async def test_json_session_request_with_integer_masks(
+    server: TCPInferenceServer, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    assert server.batcher is not None
+    mask_dtypes = []
+    batcher_predict = server.batcher.predict
+
+    async def record_mask_dtype(
+        key: BatchKey, observation: th.Tensor, action_masks: th.Tensor
+    ) -> PredictionResult:
+        mask_dtypes.append(action_masks.dtype)
+        return await batcher_predict(key, observation, action_masks)
+
+    monkeypatch.setattr(server.batcher, "predict", record_mask_dtype)
+    reader, writer = await asyncio.open_connection("127.0.0.1", _get_port(server))
+    request = {
+        "model": "Test",
+        "obs": [[0.5] * OBS_SIZE],
+        # JSON clients may send 0/1 instead of false/true
+        "actionMasks": [[1, 0, 1], [0, 1]],
+        "returnProbs": True,
+        "sessionId": 1,
+    }
+    for _ in range(2):
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        response = json.loads(await asyncio.wait_for(reader.readline(), timeout=10))
+        assert "error" not in response, response
+        assert response["action"][0] in (0, 2)
+        assert response["action"][1] == 1
+        assert response["probs"][0][1] == 0
+        assert response["probs"][1][0] == 0
+    assert mask_dtypes == [th.bool, th.bool]
+    writer.close()
+
+
+async def test_requests_over_unix_socket(
+    unix_socket_server: TCPInferenceServer,
+) -> None:
+    assert unix_socket_server.unix_socket_path is not None
+    reader, writer = await asyncio.open_unix_connection(
+        unix_socket_server.unix_socket_path
+    )
+    request = {
+        "model": "Test",
+        "obs": [[0.5] * OBS_SIZE],
+        "actionMasks": [[True] * 3, [True] * 2],
+        "requestId": 1,
+    }
+    writer.write((json.dumps(request) + "\n").encode())
+    await writer.drain()
+    response = json.loads(await asyncio.wait_for(reader.readline(), timeout=10))
+    assert "error" not in response, response
+    assert response["requestId"] == 1
+    assert len(response["action"]) == 2
+    writer.close()
+
+    reader, writer = await asyncio.open_unix_connection(
+        unix_socket_server.unix_socket_path
+    )
+    writer.write(BINARY_PROTOCOL_MAGIC)
+    write_frame(
+        writer,
+        encode_request(
+            model="Test",
+            obs=np.full((1, OBS_SIZE), 0.5, dtype=np.float32),
+            action_masks=[[True] * 3, [True] * 2],
+            request_id=2,
+        ),
+    )
+    await writer.drain()
+    frame = await asyncio.wait_for(read_frame(reader), timeout=10)
+    assert frame is not None
+    response = decode_response(frame)
+    assert "error" not in response, response
+    assert response["requestId"] == 2
+    assert len(response["action"]) == 2
+    writer.close()
+
+
+async def test_unix_socket_is_removed_on_stop(tmp_path: Path) -> None:
+    unix_socket_path = str(tmp_path / "inference.sock")
+    server = TCPInferenceServer(
+        port=0,
+        models_dir=str(tmp_path),
+        models_poll_interval=0,
+        unix_socket_path=unix_socket_path,
+    )
+    await server.start()
+    assert os.path.exists(unix_socket_path)
+    await server.stop()
+    assert not os.path.exists(unix_socket_path)
@@ -1,5 +1,6 @@
 """
 This script will serve all models in the 'models' directory via a JSON + TCP socket-based API.
+Clients can alternatively use the length-prefixed binary protocol (see pvp_ml.util.binary_protocol).
 """
 import argparse
 import asyncio
@@ -8,34 +9,52 @@ import itertools
 import json
 import logging
 import os
-import random
 import sys
 import time
 from asyncio import StreamReader, StreamWriter
 from dataclasses import dataclass, field
 from typing import Any
 
+import numpy as np
 import torch as th
+from numpy.typing import NDArray
 
+from pvp_ml.ppo.ppo import PPO
 from pvp_ml.scripted.script_plugin_registry import (
     get_scripted_plugin,
     is_scripted_plugin,
 )
 from pvp_ml.util.args_helper import replace_dash_with_underscore
+from pvp_ml.util.binary_protocol import (
+    BINARY_PROTOCOL_MAGIC,
+    DEFAULT_MAX_FRAME_BYTES,
+    FrameTooLargeError,
+    decode_request,
+    encode_error,
+    encode_response,
+    frame,
+    read_frame,
+)
+from pvp_ml.util.contract_loader import load_environment_contract
 from pvp_ml.util.files import models_dir
+from pvp_ml.util.model_registry import ModelRegistry
 from pvp_ml.util.remote_processor.remote_processor import (
     REMOTE_PROCESSOR_TYPES,
     THREAD_REMOTE_PROCESSOR,
     RemoteProcessor,
     create_remote_processor,
 )
+from pvp_ml.util.remote_processor.router import (
+    LEAST_OUTSTANDING_ROUTER,
+    ROUTER_TYPES,
+    create_router,
+)
+from pvp_ml.util.remote_processor.worker_threads import (
+    synthesize_batch,
+    tune_intra_op_threads,
+)
 
 logger = logging.getLogger(__name__)
-models = {
-    os.path.splitext(filename)[0]: os.path.join(models_dir, filename)
-    for filename in os.listdir(models_dir)
-    if filename.endswith(".zip")
-}
 
 # Note: inputs/outputs are intentionally in camel-case here
 
@@ -45,9 +64,11 @@ class Request:
     # The model name to use (can be a plugin name instead).
     model: str
     # The action masks (a list of actions for each action head).
-    actionMasks: list[list[bool]]
+    # Binary protocol requests are decoded into an array per action head instead.
+    actionMasks: list[list[bool]] | list[NDArray[np.bool_]]
     # The observations for the current state (a list of each frame - outer list length > 1 if frame stacking).
-    obs: list[list[float | int | bool]]
+    # Binary protocol requests are decoded into a (frames, obs) array instead.
+    obs: list[list[float | int | bool]] | NDArray[np.float32]
     # Whether to sample deterministically. Can be a list to configure on each action head individually.
     deterministic: list[bool] | bool = False
     # This will return the log probability for taking the current action in the response.
@@ -61,6 +82,9 @@ class Request:
     returnProbs: bool = False
     # A list of model extensions to run. Results will be included in the response in the order here.
     extensions: list[str] = field(default_factory=list)
+    # An optional id for pipelining. Requests with an id are processed concurrently with other requests on the same
+    # connection, and their responses are written as soon as they complete (possibly out of order), tagged with the id.
+    requestId: int | None = None
 
 
 @dataclass(frozen=True)
@@ -77,148 +101,112 @@ class Response:
     probs: list[list[float]] | None
     # The results of each model extension specified in the request, in the order the extensions were specified.
     extensionResults: list[Any]
+    # The id of the request this responds to, if requestId was set in the request.
+    requestId: int | None = None
+
+
+def _get_client_id(writer: StreamWriter) -> str:
+    peername = writer.get_extra_info("peername")
+    if isinstance(peername, tuple):
+        client_ip, client_port, *_ = peername
+        return f"{client_ip}:{client_port}"
+    # Unix domain socket clients have no address, tell them apart by socket
+    return f"unix:{writer.get_extra_info('socket').fileno()}"
 
 
 async def handle_client(
-    reader: StreamReader, writer: StreamWriter, remote_processor: RemoteProcessor
+    reader: StreamReader,
+    writer: StreamWriter,
+    remote_processor: RemoteProcessor,
+    model_registry: ModelRegistry,
+    max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
 ) -> None:
-    client_ip, client_port, *_ = writer.get_extra_info("peername")
-    client_id = f"{client_ip}:{client_port}"
+    client_id = _get_client_id(writer)
     logger.info(f"[{client_id}] Client connected")
-    try:
-        while True:
-            request_line = await reader.readline()
-            if not request_line:
-                break
-            logger.debug(f"[{client_id}] Received request: {request_line!r}")
-
-            request_json = json.loads(request_line)
-            request = Request(**request_json)
-
-            model_name = request.model
-            is_plugin = is_scripted_plugin(model_name)
-            if model_name not in models and not is_plugin:
-                raise ValueError(f"Unknown model: {model_name}")
 
-            logger.info(
-                f"[{client_id}] Generating prediction using model: {model_name}"
+    # Requests with a request id are processed concurrently, so responses can complete out of order
+    write_lock = asyncio.Lock()
+    pipelined_requests: set[asyncio.Task[None]] = set()
+
+    async def predict_and_respond(request: Request, use_binary_protocol: bool) -> None:
+        response = await predict(request, client_id, remote_processor, model_registry)
+        if use_binary_protocol:
+            response_bytes = frame(
+                encode_response(
+                    action=response.action,
+                    log_prob=response.logProb,
+                    entropy=response.entropy,
+                    values=response.values,
+                    probs=response.probs,
+                    extension_results=response.extensionResults,
+                    request_id=response.requestId,
+                )
             )
-            start_time = time.time()
+        else:
+            response_bytes = (json.dumps(dataclasses.asdict(response)) + "\n").encode()
+            logger.debug(f"[{client_id}] Returned response: {response_bytes!r}")
+        async with write_lock:
+            writer.write(response_bytes)
+            await writer.drain()
 
-            # Flatten action masks, since we internally treat them as a single list
-            raw_sliced_action_masks = request.actionMasks
-            raw_action_masks = list(
-                itertools.chain.from_iterable(raw_sliced_action_masks)
+    def on_pipelined_request_done(task: asyncio.Task[None]) -> None:
+        pipelined_requests.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # Same as a failure on a sequential request: drop the connection
+            logger.error(
+                f"[{client_id}] Caught exception in pipelined request: {task.exception()}"
             )
+            writer.close()
 
-            observations = th.tensor([request.obs], dtype=th.float32, device="cpu")
-            action_masks = th.tensor([raw_action_masks], dtype=th.bool, device="cpu")
-
-            return_log_prob = request.returnLogProb
-            return_entropy = request.returnEntropy
-            return_value = request.returnValue
-            return_probs = request.returnProbs
-            extensions = request.extensions
-            deterministic = request.deterministic
-
-            if not is_plugin:
-                sample_deterministic: bool | th.Tensor
-                if isinstance(deterministic, list):
-                    sample_deterministic = th.tensor(
-                        deterministic, dtype=th.bool, device="cpu"
-                    )
-                else:
-                    sample_deterministic = deterministic
-
-                random_pool_worker = random.randint(
-                    0, remote_processor.get_pool_size() - 1
-                )
-
-                model_path = models[model_name]
-                (
-                    action,
-                    log_probs,
-                    entropy,
-                    values,
-                    flattened_probs,
-                    ext_results,
-                ) = await remote_processor.predict(
-                    observation=observations,
-                    deterministic=sample_deterministic,
-                    action_masks=action_masks,
-                    process_id=random_pool_worker,
-                    model_path=model_path,
-                    return_actions=True,
-                    return_log_probs=return_log_prob,
-                    return_entropy=return_entropy,
-                    return_values=return_value,
-                    return_probs=return_probs,
-                    extensions=extensions,
-                )
-                assert action is not None
-                # Convert flattened probs to action head sizes
-                if return_probs:
-                    assert flattened_probs is not None
-                    action_head_sizes = [
-                        len(action_head) for action_head in raw_sliced_action_masks
-                    ]
-                    cumulative_sizes = [0] + list(
-                        itertools.accumulate(action_head_sizes)
-                    )
-                    probs = [
-                        flattened_probs[
-                            0, cumulative_sizes[i] : cumulative_sizes[i + 1]
-                        ].tolist()
-                        for i in range(len(action_head_sizes))
-                    ]
-                else:
-                    probs = None
-
+    try:
+        # The protocol is chosen per connection by the first byte sent
+        first_byte = await reader.read(1)
+        use_binary_protocol = first_byte == BINARY_PROTOCOL_MAGIC
+        if use_binary_protocol:
+            logger.info(f"[{client_id}] Using binary protocol")
+        request_prefix = b"" if use_binary_protocol else first_byte
+        while True:
+            if use_binary_protocol:
+                try:
+                    request_frame = await read_frame(reader, max_frame_bytes)
+                except FrameTooLargeError as e:
+                    # The oversized body is never read, so the connection can't continue past it
+                    logger.warning(f"[{client_id}] Rejecting request: {e}")
+                    async with write_lock:
+                        writer.write(frame(encode_error(str(e))))
+                        await writer.drain()
+                    break
+                if request_frame is None:
+                    break
+                request = Request(**decode_request(request_frame))
             else:
-                if (
-                    return_log_prob
-                    or return_entropy
-                    or return_value
-                    or return_probs
-                    or extensions
-                ):
-                    raise ValueError(
-                        "Plugins do not support returning additional information"
-                    )
-                # If it's a plugin, just go ahead and evaluate it on this thread - it's quick to process
-                plugin = get_scripted_plugin(model_name)
-                action = plugin.predict(observations, action_masks)
-                log_probs = None
-                entropy = None
-                values = None
-                probs = None
-                ext_results = []
-
-            response = Response(
-                action=action.tolist()[0],
-                logProb=log_probs.tolist()[0] if log_probs is not None else None,
-                entropy=entropy.tolist()[0] if entropy is not None else None,
-                values=values.tolist()[0] if values is not None else None,
-                probs=probs,
-                extensionResults=ext_results,
-            )
-            response_json = dataclasses.asdict(response)
-
-            time_elapsed = time.time() - start_time
-            logger.info(
-                f"[{client_id}] Generated response in {time_elapsed:.4f} seconds: {response.action}"
-            )
+                request_line = request_prefix + await reader.readline()
+                request_prefix = b""
+                if not request_line:
+                    break
+                logger.debug(f"[{client_id}] Received request: {request_line!r}")
+                request = Request(**json.loads(request_line))
+
+            if request.requestId is None:
+                await predict_and_respond(request, use_binary_protocol)
+            else:
+                task = asyncio.create_task(
+                    predict_and_respond(request, use_binary_protocol)
+                )
+                pipelined_requests.add(task)
+                task.add_done_callback(on_pipelined_request_done)
 
-            response_line = (json.dumps(response_json) + "\n").encode()
-            writer.write(response_line)
-            await writer.drain()
-            logger.debug(f"[{client_id}] Returned response: {response_line!r}")
+        # The client may half-close after sending, so finish what it already asked for
+        if pipelined_requests:
+            await asyncio.gather(*pipelined_requests, return_exceptions=True)
 
     except OSError as e:
         logger.warning(f"[{client_id}] Caught exception in client handler: {e}")
     except Exception as e:
         logger.exception(f"[{client_id}] Caught exception in client handler: {e}")
     finally:
+        for task in pipelined_requests:
+            task.cancel()
         writer.close()
         try:
             await writer.wait_closed()
@@ -229,20 +217,118 @@ async def handle_client(
         logger.info(f"[{client_id}] Disconnected client")
 
 
-async def preload_models(remote_processor: RemoteProcessor) -> None:
-    # Load each model in each worker
-    logger.info(
-        f"Preloading {len(models)} models on {remote_processor.get_pool_size()} workers"
+async def predict(
+    request: Request,
+    client_id: str,
+    remote_processor: RemoteProcessor,
+    model_registry: ModelRegistry,
+) -> Response:
+    model_name = request.model
+    is_plugin = is_scripted_plugin(model_name)
+    if model_name not in model_registry and not is_plugin:
+        raise ValueError(f"Unknown model: {model_name}")
+
+    logger.info(f"[{client_id}] Generating prediction using model: {model_name}")
+    start_time = time.time()
+
+    # Flatten action masks, since we internally treat them as a single list
+    raw_sliced_action_masks = request.actionMasks
+    if isinstance(request.obs, np.ndarray):
+        # Binary protocol requests are already decoded into arrays
+        observations = th.from_numpy(request.obs).unsqueeze(0)
+        action_masks = th.from_numpy(np.concatenate(raw_sliced_action_masks)).unsqueeze(
+            0
+        )
+    else:
+        raw_action_masks = list(itertools.chain.from_iterable(raw_sliced_action_masks))
+        observations = th.tensor([request.obs], dtype=th.float32, device="cpu")
+        action_masks = th.tensor([raw_action_masks], dtype=th.bool, device="cpu")
+
+    return_log_prob = request.returnLogProb
+    return_entropy = request.returnEntropy
+    return_value = request.returnValue
+    return_probs = request.returnProbs
+    extensions = request.extensions
+    deterministic = request.deterministic
+
+    if not is_plugin:
+        sample_deterministic: bool | th.Tensor
+        if isinstance(deterministic, list):
+            sample_deterministic = th.tensor(deterministic, dtype=th.bool, device="cpu")
+        else:
+            sample_deterministic = deterministic
+
+        # Pin the current model version, so a hot reload can't unload it mid-prediction
+        with model_registry.acquire(model_name) as model_version:
+            (
+                action,
+                log_probs,
+                entropy,
+                values,
+                flattened_probs,
+                ext_results,
+            ) = await remote_processor.routed_predict(
+                observation=observations,
+                deterministic=sample_deterministic,
+                action_masks=action_masks,
+                model_path=model_version.path,
+                return_actions=True,
+                return_log_probs=return_log_prob,
+                return_entropy=return_entropy,
+                return_values=return_value,
+                return_probs=return_probs,
+                extensions=extensions,
+            )
+        assert action is not None
+        # Convert flattened probs to action head sizes
+        if return_probs:
+            assert flattened_probs is not None
+            action_head_sizes = [
+                len(action_head) for action_head in raw_sliced_action_masks
+            ]
+            cumulative_sizes = [0] + list(itertools.accumulate(action_head_sizes))
+            probs = [
+                flattened_probs[
+                    0, cumulative_sizes[i] : cumulative_sizes[i + 1]
+                ].tolist()
+                for i in range(len(action_head_sizes))
+            ]
+        else:
+            probs = None
+
+    else:
+        if (
+            return_log_prob
+            or return_entropy
+            or return_value
+            or return_probs
+            or extensions
+        ):
+            raise ValueError("Plugins do not support returning additional information")
+        # If it's a plugin, just go ahead and evaluate it on this thread - it's quick to process
+        plugin = get_scripted_plugin(model_name)
+        action = plugin.predict(observations, action_masks)
+        log_probs = None
+        entropy = None
+        values = None
+        probs = None
+        ext_results = []
+
+    response = Response(
+        action=action.tolist()[0],
+        logProb=log_probs.tolist()[0] if log_probs is not None else None,
+        entropy=entropy.tolist()[0] if entropy is not None else None,
+        values=values.tolist()[0] if values is not None else None,
+        probs=probs,
+        extensionResults=ext_results,
+        requestId=request.requestId,
     )
-    preload_model_tasks = [
-        remote_processor.predict(process_id=i, model_path=model)
-        for i in range(remote_processor.get_pool_size())
-        for model in models.values()
-    ]
-    await asyncio.gather(*preload_model_tasks)
+
+    time_elapsed = time.time() - start_time
     logger.info(
-        f"Preloaded {len(models)} models on {remote_processor.get_pool_size()} workers"
+        f"[{client_id}] Generated response in {time_elapsed:.4f} seconds: {response.action}"
     )
+    return response
 
 
 async def run_api(
@@ -252,6 +338,13 @@ async def run_api(
     remote_processor_type: str,
     remote_processor_kwargs: dict[str, Any],
     device: str,
+    router_type: str = LEAST_OUTSTANDING_ROUTER,
+    models_poll_interval: float = 2.0,
+    unix_socket_path: str | None = None,
+    max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
+    tune_threads: bool = False,
+    tune_threads_batch_size: int = 1,
+    tune_threads_frames: int = 1,
 ) -> None:
     logger.info(f"Starting agent server on {host}:{port}")
     async with await create_remote_processor(
@@ -260,25 +353,93 @@ async def run_api(
         processor_type=remote_processor_type,
         remote_processor_additional_params=remote_processor_kwargs,
     ) as remote_processor:
-        await preload_models(remote_processor)
+        remote_processor.set_router(
+            create_router(router_type, remote_processor.get_pool_size())
+        )
+        # Preload models, and hot reload them when the models directory changes
+        model_registry = ModelRegistry(
+            models_dir, remote_processor, poll_interval=models_poll_interval
+        )
+        await model_registry.start()
+        if tune_threads:
+            await _tune_threads(
+                remote_processor,
+                model_registry,
+                batch_size=tune_threads_batch_size,
+                frames=tune_threads_frames,
+            )
 
         async def _handle_client_wrapper(
             reader: StreamReader, writer: StreamWriter
         ) -> None:
-            await handle_client(reader, writer, remote_processor)
+            await handle_client(
+                reader, writer, remote_processor, model_registry, max_frame_bytes
+            )
 
-        server = await asyncio.start_server(_handle_client_wrapper, host, port)
-        addr = server.sockets[0].getsockname()
-        logger.info(f"Serving agents on {addr}: {list(models.keys())}")
+        try:
+            server = await asyncio.start_server(_handle_client_wrapper, host, port)
+            addr = server.sockets[0].getsockname()
+            logger.info(f"Serving agents on {addr}: {model_registry.get_model_names()}")
 
-        async with server:
-            await server.serve_forever()
+            async with server:
+                if unix_socket_path is None:
+                    await server.serve_forever()
+                else:
+                    # Same-host agents can skip the TCP stack
+                    unix_server = await asyncio.start_unix_server(
+                        _handle_client_wrapper, unix_socket_path
+                    )
+                    logger.info(f"Serving agents on {unix_socket_path}")
+                    async with unix_server:
+                        await asyncio.gather(
+                            server.serve_forever(), unix_server.serve_forever()
+                        )
+        finally:
+            await model_registry.close()
+            if unix_socket_path is not None and os.path.exists(unix_socket_path):
+                # The socket file isn't removed when the server closes
+                os.unlink(unix_socket_path)
+
+
+async def _tune_threads(
+    remote_processor: RemoteProcessor,
+    model_registry: ModelRegistry,
+    batch_size: int,
+    frames: int,
+) -> None:
+    # Benchmarks intra-op thread counts on a batch shaped by the first model's environment contract
+    model_names = sorted(model_registry.get_model_names())
+    if not model_names:
+        logger.warning("No models to tune intra-op threads with")
+        return
+    with model_registry.acquire(model_names[0]) as model_version:
+        meta = await asyncio.to_thread(PPO.load_meta, model_version.path)
+        environment = load_environment_contract(
+            meta.custom_data["env_kwargs"]["env_name"]
+        )
+        observation, action_masks = synthesize_batch(environment, batch_size, frames)
+        logger.info(f"Tuning intra-op threads with model {model_names[0]}")
+        await tune_intra_op_threads(
+            remote_processor, model_version.path, observation, action_masks
+        )
 
 
 def main(argv: list[str]) -> None:
     parser = argparse.ArgumentParser(description="Agent serving script")
     parser.add_argument("--host", type=str, help="Host", default="127.0.0.1")
     parser.add_argument("--port", type=int, help="Port", default=9999)
+    parser.add_argument(
+        "--unix-socket-path",
+        type=str,
+        help="Also serve agents on this Unix domain socket path, for clients on the same host",
+        default=None,
+    )
+    parser.add_argument(
+        "--max-frame-bytes",
+        type=int,
+        help="Binary protocol requests larger than this are rejected before they're read",
+        default=DEFAULT_MAX_FRAME_BYTES,
+    )
     parser.add_argument(
         "--remote-processor-pool-size",
         type=int,
@@ -304,6 +465,36 @@ def main(argv: list[str]) -> None:
         help="Processor device",
         default="cpu",
     )
+    parser.add_argument(
+        "--router",
+        type=str,
+        help="How requests are assigned to remote processor workers",
+        choices=ROUTER_TYPES,
+        default=LEAST_OUTSTANDING_ROUTER,
+    )
+    parser.add_argument(
+        "--models-poll-interval",
+        type=float,
+        help="Seconds between checks for added, replaced or removed models (0 disables hot reload)",
+        default=2.0,
+    )
+    parser.add_argument(
+        "--tune-threads",
+        action="store_true",
+        help="Benchmark intra-op thread counts per worker on startup, and use the fastest",
+    )
+    parser.add_argument(
+        "--tune-threads-batch-size",
+        type=int,
+        help="Batch size of the predictions benchmarked by --tune-threads",
+        default=1,
+    )
+    parser.add_argument(
+        "--tune-threads-frames",
+        type=int,
+        help="Frames per observation in the predictions benchmarked by --tune-threads",
+        default=1,
+    )
 
     args = parser.parse_args(argv)
 
@@ -318,6 +509,13 @@ def main(argv: list[str]) -> None:
             remote_processor_type=args.remote_processor_type,
             remote_processor_kwargs=remote_processor_kwargs,
             device=args.device,
+            router_type=args.router,
+            models_poll_interval=args.models_poll_interval,
+            unix_socket_path=args.unix_socket_path,
+            max_frame_bytes=args.max_frame_bytes,
+            tune_threads=args.tune_threads,
+            tune_threads_batch_size=args.tune_threads_batch_size,
+            tune_threads_frames=args.tune_threads_frames,
         )
     )
 
@@ -0,0 +1,615 @@
+"""
+This script benchmarks inference serving capacity, by driving concurrent clients with synthetic requests against an
+inference server (pvp_ml.api, or the backend's TCPInferenceServer, which serves the same protocol).
+
+Requests are synthesized from an environment contract, so any model trained on that environment can be benchmarked.
+Clients either send as fast as responses come back (closed loop), or at a fixed target rate (open loop), where latency
+is measured from when each request was scheduled to be sent, so a slow server can't hide queueing by slowing clients.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import random
+import sys
+import time
+from asyncio import StreamReader, StreamWriter
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from pvp_ml.util.args_helper import replace_dash_with_underscore
+from pvp_ml.util.binary_protocol import (
+    BINARY_PROTOCOL_MAGIC,
+    decode_response,
+    encode_request,
+    frame,
+    read_frame,
+)
+from pvp_ml.util.contract_loader import EnvironmentMeta, load_environment_contract
+from pvp_ml.util.remote_processor.remote_processor import (
+    REMOTE_PROCESSOR_TYPES,
+    THREAD_REMOTE_PROCESSOR,
+)
+from pvp_ml.util.socket_helper import is_port_taken_async
+
+logger = logging.getLogger(__name__)
+
+# Distinct synthetic requests each client cycles through
+_REQUESTS_PER_CLIENT = 64
+
+
+@dataclass
+class BenchmarkConfig:
+    model: str
+    env: str = "NhEnv"
+    frames: int = 1
+    clients: int = 16
+    # Total requests per second across all clients (0 sends as fast as responses are received)
+    rate: float = 0.0
+    duration: float = 10.0
+    warmup: float = 2.0
+    binary_protocol: bool = False
+    deterministic: bool = False
+    host: str = "127.0.0.1"
+    port: int = 9999
+    unix_socket_path: str | None = None
+    # Seconds to wait for outstanding responses at the end, after which they're counted as errors
+    drain_timeout: float = 10.0
+    seed: int = 0
+
+
+@dataclass
+class BenchmarkResult:
+    label: str
+    clients: int
+    rate: float
+    duration: float
+    requests: int
+    errors: int
+    error_rate: float
+    throughput: float
+    latency_ms: dict[str, float]
+    server: dict[str, Any] = field(default_factory=dict)
+
+
+class _Stats:
+    def __init__(self, record_from: float):
+        # Only requests scheduled after the warmup are recorded
+        self.record_from = record_from
+        self.latencies: list[float] = []
+        self.errors = 0
+
+    def record(self, scheduled_at: float, latency: float | None) -> None:
+        if scheduled_at < self.record_from:
+            return
+        if latency is None:
+            self.errors += 1
+        else:
+            self.latencies.append(latency)
+
+
+def synthesize_requests(
+    environment: EnvironmentMeta, count: int, frames: int, rng: np.random.Generator
+) -> list[tuple[list[list[float]], list[list[bool]]]]:
+    # Random observations, and random action masks with at least one action available in each head
+    observation_space = environment.get_observation_space()
+    observation_space.seed(int(rng.integers(2**31)))
+    requests = []
+    for _ in range(count):
+        obs = [observation_space.sample().tolist() for _ in range(frames)]
+        action_masks = []
+        for action_head in environment.actions:
+            head_mask = rng.random(len(action_head.actions)) < 0.7
+            head_mask[rng.integers(len(head_mask))] = True
+            action_masks.append(head_mask.tolist())
+        requests.append((obs, action_masks))
+    return requests
+
+
+def _create_encoder(
+    config: BenchmarkConfig, obs: list[list[float]], action_masks: list[list[bool]]
+) -> Callable[[int], bytes]:
+    if config.binary_protocol:
+        obs_array = np.asarray(obs, dtype=np.float32)
+        return lambda request_id: frame(
+            encode_request(
+                model=config.model,
+                obs=obs_array,
+                action_masks=action_masks,
+                deterministic=config.deterministic,
+                request_id=request_id,
+            )
+        )
+    # Serialized once, the request id is spliced in for each request
+    request_json = json.dumps(
+        {
+            "model": config.model,
+            "actionMasks": action_masks,
+            "obs": obs,
+            "deterministic": config.deterministic,
+        }
+    ).encode()
+    return (
+        lambda request_id: b'{"requestId": %d, ' % request_id + request_json[1:] + b"\n"
+    )
+
+
+async def _read_responses(
+    reader: StreamReader,
+    binary_protocol: bool,
+    pending: dict[int, float],
+    stats: _Stats,
+    response_received: asyncio.Event,
+) -> None:
+    try:
+        while True:
+            if binary_protocol:
+                response_frame = await read_frame(reader)
+                if response_frame is None:
+                    raise ConnectionError("Server closed the connection")
+                response = decode_response(response_frame)
+            else:
+                response_line = await reader.readline()
+                if not response_line:
+                    raise ConnectionError("Server closed the connection")
+                response = json.loads(response_line)
+            received_at = time.perf_counter()
+            scheduled_at = pending.pop(response["requestId"])
+            stats.record(
+                scheduled_at,
+                None if "error" in response else received_at - scheduled_at,
+            )
+            response_received.set()
+    finally:
+        # Wake the client if the connection is lost
+        response_received.set()
+
+
+async def _connect(config: BenchmarkConfig) -> tuple[StreamReader, StreamWriter]:
+    if config.unix_socket_path is not None:
+        reader, writer = await asyncio.open_unix_connection(config.unix_socket_path)
+    else:
+        reader, writer = await asyncio.open_connection(config.host, config.port)
+    if config.binary_protocol:
+        writer.write(BINARY_PROTOCOL_MAGIC)
+    return reader, writer
+
+
+async def _run_client(
+    config: BenchmarkConfig,
+    encoders: list[Callable[[int], bytes]],
+    start_time: float,
+    stats: _Stats,
+) -> None:
+    end_time = start_time + config.warmup + config.duration
+    # Each client sends an equal share of the rate, starting at a random offset so clients don't send in lockstep
+    interval = config.clients / config.rate if config.rate > 0 else 0.0
+    next_send_at = start_time + random.random() * interval
+    request_id = 0
+    # Request id -> time latency is measured from
+    pending: dict[int, float] = {}
+    response_received = asyncio.Event()
+
+    while time.perf_counter() < end_time:
+        try:
+            reader, writer = await _connect(config)
+        except OSError as e:
+            logger.warning(f"Failed to connect: {e}")
+            stats.record(time.perf_counter(), None)
+            await asyncio.sleep(0.1)
+            continue
+
+        reader_task = asyncio.create_task(
+            _read_responses(
+                reader, config.binary_protocol, pending, stats, response_received
+            )
+        )
+        try:
+            while time.perf_counter() < end_time and not reader_task.done():
+                if interval > 0:
+                    await asyncio.sleep(max(0.0, next_send_at - time.perf_counter()))
+                    scheduled_at = next_send_at
+                    next_send_at += interval
+                else:
+                    scheduled_at = time.perf_counter()
+                request_id += 1
+                pending[request_id] = scheduled_at
+                response_received.clear()
+                writer.write(encoders[request_id % len(encoders)](request_id))
+                await writer.drain()
+                if interval == 0:
+                    # Closed loop, the next request is sent once this one's response is received
+                    await response_received.wait()
+            # Wait for outstanding responses
+            drain_until = time.perf_counter() + config.drain_timeout
+            while (
+                pending and not reader_task.done() and time.perf_counter() < drain_until
+            ):
+                await asyncio.sleep(0.01)
+        except OSError as e:
+            logger.warning(f"Connection failed: {e}")
+        finally:
+            reader_task.cancel()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        # Requests without a response failed (the API drops the connection on errors)
+        for scheduled_at in pending.values():
+            stats.record(scheduled_at, None)
+        pending.clear()
+
+
+async def run_benchmark(
+    config: BenchmarkConfig, label: str = "", server: dict[str, Any] = {}
+) -> BenchmarkResult:
+    rng = np.random.default_rng(config.seed)
+    random.seed(config.seed)
+    environment = load_environment_contract(config.env)
+    start_time = time.perf_counter()
+    stats = _Stats(record_from=start_time + config.warmup)
+    clients = []
+    for _ in range(config.clients):
+        encoders = [
+            _create_encoder(config, obs, action_masks)
+            for obs, action_masks in synthesize_requests(
+                environment, _REQUESTS_PER_CLIENT, config.frames, rng
+            )
+        ]
+        clients.append(_run_client(config, encoders, start_time, stats))
+    logger.info(
+        f"Benchmarking {config.model} with {config.clients} clients"
+        f" at {f'{config.rate} requests/s' if config.rate > 0 else 'max rate'} for {config.duration}s"
+    )
+    await asyncio.gather(*clients)
+
+    latencies_ms = np.asarray(stats.latencies) * 1000
+    requests = len(stats.latencies) + stats.errors
+    return BenchmarkResult(
+        label=label,
+        clients=config.clients,
+        rate=config.rate,
+        duration=config.duration,
+        requests=requests,
+        errors=stats.errors,
+        error_rate=stats.errors / requests if requests else 0.0,
+        throughput=len(stats.latencies) / config.duration,
+        latency_ms={
+            name: float(np.percentile(latencies_ms, percentile))
+            if len(latencies_ms)
+            else 0.0
+            for name, percentile in [
+                ("p50", 50),
+                ("p95", 95),
+                ("p99", 99),
+                ("max", 100),
+            ]
+        },
+        server=server,
+    )
+
+
+@asynccontextmanager
+async def serve_api(
+    config: BenchmarkConfig,
+    remote_processor_type: str,
+    remote_processor_pool_size: int,
+    device: str = "cpu",
+    remote_processor_kwargs: dict[str, Any] = {},
+    startup_timeout: float = 120.0,
+) -> AsyncIterator[None]:
+    # Runs the API in its own process, so it doesn't compete with the clients for this process' GIL
+    if await is_port_taken_async(config.port, config.host):
+        raise RuntimeError(f"Port already in use: {config.host}:{config.port}")
+    args = [
+        "--host",
+        config.host,
+        "--port",
+        str(config.port),
+        "--remote-processor-type",
+        remote_processor_type,
+        "--remote-processor-pool-size",
+        str(remote_processor_pool_size),
+        "--remote-processor-kwargs",
+        json.dumps(remote_processor_kwargs),
+        "--device",
+        device,
+    ]
+    if config.unix_socket_path is not None:
+        args += ["--unix-socket-path", config.unix_socket_path]
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "pvp_ml.api",
+        *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        started_at = time.perf_counter()
+        while not await is_port_taken_async(config.port, config.host):
+            if process.returncode is not None:
+                raise RuntimeError(f"API exited with code {process.returncode}")
+            if time.perf_counter() - started_at > startup_timeout:
+                raise RuntimeError("API failed to start")
+            await asyncio.sleep(0.5)
+        yield
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await process.wait()
+
+
+def compare_results(
+    results: list[BenchmarkResult],
+    baseline: list[BenchmarkResult],
+    max_regression: float = 0.1,
+) -> list[str]:
+    """
+    Compares results to a baseline with the same labels, returning a description of each regression: throughput or
+    p50/p99 latency worse by more than the max regression (as a fraction), or a higher error rate.
+    """
+    baseline_by_label = {result.label: result for result in baseline}
+    regressions = []
+    for result in results:
+        baseline_result = baseline_by_label.get(result.label)
+        if baseline_result is None:
+            logger.info(f"[{result.label}] No baseline to compare against")
+            continue
+        if (result.clients, result.rate) != (
+            baseline_result.clients,
+            baseline_result.rate,
+        ):
+            logger.warning(
+                f"[{result.label}] Baseline used {baseline_result.clients} clients at rate {baseline_result.rate},"
+                f" but this used {result.clients} clients at rate {result.rate}"
+            )
+        # Positive changes are improvements
+        changes = {
+            "throughput": _relative_change(
+                result.throughput, baseline_result.throughput
+            ),
+            **{
+                f"{percentile} latency": -_relative_change(
+                    result.latency_ms[percentile],
+                    baseline_result.latency_ms[percentile],
+                )
+                for percentile in ["p50", "p99"]
+            },
+        }
+        logger.info(
+            f"[{result.label}] Compared to baseline: "
+            + ", ".join(f"{name} {change:+.1%}" for name, change in changes.items())
+        )
+        regressions += [
+            f"[{result.label}] {name} regressed {-change:.1%}"
+            for name, change in changes.items()
+            if change < -max_regression
+        ]
+        if result.error_rate > baseline_result.error_rate:
+            regressions.append(
+                f"[{result.label}] error rate increased from {baseline_result.error_rate:.2%} to {result.error_rate:.2%}"
+            )
+    return regressions
+
+
+def _relative_change(value: float, baseline_value: float) -> float:
+    if baseline_value == 0:
+        return 0.0
+    return (value - baseline_value) / baseline_value
+
+
+def save_results(file_path: str, results: list[BenchmarkResult]) -> None:
+    with open(file_path, "w") as f:
+        json.dump([dataclasses.asdict(result) for result in results], f, indent=2)
+
+
+def load_results(file_path: str) -> list[BenchmarkResult]:
+    with open(file_path) as f:
+        return [BenchmarkResult(**result) for result in json.load(f)]
+
+
+def _log_result(result: BenchmarkResult) -> None:
+    latency = result.latency_ms
+    logger.info(
+        f"[{result.label}] {result.throughput:.1f} requests/s, latency p50 {latency['p50']:.2f}ms"
+        f" p95 {latency['p95']:.2f}ms p99 {latency['p99']:.2f}ms max {latency['max']:.2f}ms,"
+        f" errors {result.errors}/{result.requests} ({result.error_rate:.2%})"
+    )
+
+
+async def _run_benchmarks(
+    config: BenchmarkConfig,
+    remote_processor_types: list[str],
+    remote_processor_pool_sizes: list[int],
+    serve: bool,
+    label: str | None,
+    device: str,
+    remote_processor_kwargs: dict[str, Any],
+) -> list[BenchmarkResult]:
+    if not serve:
+        result = await run_benchmark(
+            config,
+            label=label or config.unix_socket_path or f"{config.host}:{config.port}",
+        )
+        _log_result(result)
+        return [result]
+    results = []
+    for remote_processor_type in remote_processor_types:
+        for pool_size in remote_processor_pool_sizes:
+            run_label = f"{remote_processor_type}-{pool_size}"
+            if label:
+                run_label = f"{label}-{run_label}"
+            logger.info(f"[{run_label}] Starting API")
+            async with serve_api(
+                config,
+                remote_processor_type,
+                pool_size,
+                device=device,
+                remote_processor_kwargs=remote_processor_kwargs,
+            ):
+                result = await run_benchmark(
+                    config,
+                    label=run_label,
+                    server={
+                        "remote_processor_type": remote_processor_type,
+                        "remote_processor_pool_size": pool_size,
+                        "device": device,
+                    },
+                )
+            _log_result(result)
+            results.append(result)
+    return results
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description="Inference serving benchmark")
+    parser.add_argument(
+        "--model", type=str, help="Model to request (on the server)", required=True
+    )
+    parser.add_argument(
+        "--env",
+        type=str,
+        help="Environment contract to synthesize requests from",
+        default="NhEnv",
+    )
+    parser.add_argument(
+        "--frames", type=int, help="Frames per request observation", default=1
+    )
+    parser.add_argument("--clients", type=int, help="Concurrent clients", default=16)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="Target requests per second across all clients (0 sends each client's next request as soon as its last response is received)",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--duration", type=float, help="Seconds to measure for", default=10.0
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        help="Seconds to send requests for before measuring",
+        default=2.0,
+    )
+    parser.add_argument(
+        "--binary-protocol", action="store_true", help="Use the binary protocol"
+    )
+    parser.add_argument(
+        "--deterministic", action="store_true", help="Request deterministic actions"
+    )
+    parser.add_argument("--host", type=str, help="Server host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Server port", default=9999)
+    parser.add_argument(
+        "--unix-socket-path",
+        type=str,
+        help="Connect over this Unix domain socket instead of TCP",
+        default=None,
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Start the API for each remote processor type and pool size, instead of benchmarking a running server",
+    )
+    parser.add_argument(
+        "--remote-processor-types",
+        type=str,
+        nargs="+",
+        choices=REMOTE_PROCESSOR_TYPES,
+        help="Remote processor types to benchmark (with --serve)",
+        default=[THREAD_REMOTE_PROCESSOR],
+    )
+    parser.add_argument(
+        "--remote-processor-pool-sizes",
+        type=int,
+        nargs="+",
+        help="Remote processor pool sizes to benchmark (with --serve)",
+        default=[1],
+    )
+    parser.add_argument(
+        "--remote-processor-kwargs",
+        type=json.loads,
+        help="Remote processor kwargs (with --serve)",
+        default={},
+    )
+    parser.add_argument(
+        "--device", type=str, help="Processor device (with --serve)", default="cpu"
+    )
+    parser.add_argument(
+        "--label",
+        type=str,
+        help="Label for the results, used to match them to the baseline",
+        default=None,
+    )
+    parser.add_argument(
+        "--output", type=str, help="Save results to this JSON file", default=None
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        help="Compare results to a JSON file saved by a previous run, exiting with an error on regressions",
+        default=None,
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        help="Fraction throughput or latency can be worse than the baseline before it's a regression",
+        default=0.1,
+    )
+    parser.add_argument("--seed", type=int, help="Request seed", default=0)
+
+    args = parser.parse_args(argv)
+
+    config = BenchmarkConfig(
+        model=args.model,
+        env=args.env,
+        frames=args.frames,
+        clients=args.clients,
+        rate=args.rate,
+        duration=args.duration,
+        warmup=args.warmup,
+        binary_protocol=args.binary_protocol,
+        deterministic=args.deterministic,
+        host=args.host,
+        port=args.port,
+        unix_socket_path=args.unix_socket_path,
+        seed=args.seed,
+    )
+    results = asyncio.run(
+        _run_benchmarks(
+            config,
+            remote_processor_types=args.remote_processor_types,
+            remote_processor_pool_sizes=args.remote_processor_pool_sizes,
+            serve=args.serve,
+            label=args.label,
+            device=args.device,
+            remote_processor_kwargs=replace_dash_with_underscore(
+                args.remote_processor_kwargs
+            ),
+        )
+    )
+    if args.output:
+        save_results(args.output, results)
+        logger.info(f"Saved results to {args.output}")
+    if args.baseline:
+        regressions = compare_results(
+            results, load_results(args.baseline), args.max_regression
+        )
+        for regression in regressions:
+            logger.error(regression)
+        if regressions:
+            sys.exit(1)
+
+
+def main_entry_point() -> None:
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main_entry_point()
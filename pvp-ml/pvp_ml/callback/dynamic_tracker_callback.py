@@ -13,16 +13,6 @@ from pvp_ml.ppo.buffer import Buffer
 logger = logging.getLogger(__name__)
 
 
-def _get_nested_value(dct: dict[str, Any], keys: list[str]) -> Any | None:
-    current = dct
-    for key in keys:
-        if key in current:
-            current = current[key]
-        else:
-            return None
-    return current
-
-
 class Accumulator(ABC):
     @abc.abstractmethod
     def accumulate(self, values: list[Any]) -> float | int | None:
@@ -166,24 +156,18 @@ class DynamicTrackerCallback(Callback):
         ), "Summary writer is required to track metrics"
         assert self._ppo is not None
 
-        infos = buffer.infos.flatten()
+        infos = buffer.infos
         start_time = time.time()
 
         tracked_metrics = 0
 
         metrics = self.__create_metrics()
         logger.info(
-            f"Checking {len(metrics)} metrics to process over {len(infos)} step infos"
+            f"Checking {len(metrics)} metrics to process over {infos.size} step infos"
         )
 
         for metric in metrics:
-            extracted_fields = [
-                extracted_field
-                for extracted_field in [
-                    _get_nested_value(info, metric.field_path) for info in infos
-                ]
-                if extracted_field is not None
-            ]
+            extracted_fields = infos.get_values(tuple(metric.field_path)).tolist()
             if not extracted_fields:
                 continue
             value = metric.accumulator.accumulate(extracted_fields)
@@ -195,7 +179,7 @@ class DynamicTrackerCallback(Callback):
 
         tracking_length = time.time() - start_time
         logger.info(
-            f"Processed metrics in {tracking_length} seconds: {len(infos)} steps,"
+            f"Processed metrics in {tracking_length} seconds: {infos.size} steps,"
             f" {len(metrics)} total metrics, {tracked_metrics} metrics tracked"
         )
 
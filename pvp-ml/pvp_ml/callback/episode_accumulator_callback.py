@@ -1,7 +1,3 @@
-from collections import defaultdict
-from collections.abc import Callable
-from typing import Any
-
 import numpy as np
 
 from pvp_ml.callback.callback import Callback
@@ -12,51 +8,62 @@ from pvp_ml.ppo.buffer import Buffer
 # It knows an episode ends when an info has a 'episode' key, and it injects the aggregations into info['episode']
 class EpisodeAccumulatorCallback(Callback):
     def on_rollout_end(self, buffer: Buffer) -> None:
-        for env in buffer.infos:
-            current_values: dict[str, Any] = defaultdict(list)
+        infos = buffer.infos
+        buffer_size, _ = infos.shape
+        episode_ends = infos.has(("episode",))
+        if not np.any(episode_ends):
+            return
+
+        # Each env's steps are laid out contiguously, and split into segments after each episode end
+        flat_episode_ends = episode_ends.T.flatten()
+        segment_starts = np.roll(flat_episode_ends, 1)
+        segment_starts[::buffer_size] = True
+        segment_ids = np.cumsum(segment_starts) - 1
+        num_segments = segment_ids[-1] + 1
+        # Steps after an env's last episode end in the rollout have no episode to add them to
+        end_indices = np.flatnonzero(flat_episode_ends)
+        end_segments = segment_ids[end_indices]
+        end_steps = end_indices % buffer_size
+        end_envs = end_indices // buffer_size
 
-            for step in env:
-                # Track values for every numeric value
-                current_values = self._accumulate_dict(step, current_values)
-                # Inject the values into the episode key
-                if "episode" in step:
-                    step["episode"]["sum"] = self._create_stat_dict(
-                        current_values, np.sum
-                    )
-                    step["episode"]["mean"] = self._create_stat_dict(
-                        current_values, np.mean
-                    )
-                    step["episode"]["min"] = self._create_stat_dict(
-                        current_values, np.min
-                    )
-                    step["episode"]["max"] = self._create_stat_dict(
-                        current_values, np.max
-                    )
-                    step["episode"]["std"] = self._create_stat_dict(
-                        current_values, np.std
-                    )
-                    current_values = defaultdict(list)
+        for path in infos.keys():
+            values, present = infos.get(path)
+            if path[0] == "episode" or values.dtype == object:
+                continue
+            flat_present = present.T.flatten()
+            steps_segments = segment_ids[flat_present]
+            step_values = values.T.flatten()[flat_present].astype(np.float64)
 
-    def _accumulate_dict(
-        self, target_dict: dict[str, Any], current_values: dict[str, Any]
-    ) -> dict[str, Any]:
-        for key, value in target_dict.items():
-            if isinstance(value, (int, float)):
-                current_values[key].append(value)
-            if isinstance(value, dict):
-                current_values[key] = self._accumulate_dict(
-                    value, current_values.get(key, defaultdict(list))
+            counts = np.bincount(steps_segments, minlength=num_segments)
+            sums = np.bincount(
+                steps_segments, weights=step_values, minlength=num_segments
+            )
+            means = sums / np.maximum(counts, 1)
+            stds = np.sqrt(
+                np.bincount(
+                    steps_segments,
+                    weights=(step_values - means[steps_segments]) ** 2,
+                    minlength=num_segments,
                 )
-        return current_values
+                / np.maximum(counts, 1)
+            )
+            mins = np.full(num_segments, np.inf)
+            np.minimum.at(mins, steps_segments, step_values)
+            maxs = np.full(num_segments, -np.inf)
+            np.maximum.at(maxs, steps_segments, step_values)
 
-    def _create_stat_dict(
-        self, input_dict: dict[str, Any], accumulator_func: Callable[[list[Any]], Any]
-    ) -> dict[str, Any]:
-        stat_dict = {}
-        for key, values in input_dict.items():
-            if isinstance(values, list):
-                if values:
-                    stat_dict[key] = accumulator_func(values)
-            elif isinstance(values, dict):
-                stat_dict[key] = self._create_stat_dict(values, accumulator_func)
-        return stat_dict
+            # Only episodes where the value was present get stats for it
+            has_values = counts[end_segments] > 0
+            for stat, stat_values in [
+                ("sum", sums),
+                ("mean", means),
+                ("min", mins),
+                ("max", maxs),
+                ("std", stds),
+            ]:
+                infos.set_values(
+                    ("episode", stat, *path),
+                    end_steps[has_values],
+                    end_envs[has_values],
+                    stat_values[end_segments][has_values],
+                )
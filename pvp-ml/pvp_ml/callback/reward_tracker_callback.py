@@ -10,13 +10,12 @@ class RewardTrackerCallback(Callback):
         assert self._ppo is not None
         counts: dict[str, int] = {}
         sums: dict[str, float] = {}
-        for env_infos in buffer.infos:
-            for step_info in env_infos:
-                if "rewards" not in step_info:
-                    continue
-                for key, value in step_info["rewards"].items():
-                    counts[key] = counts.get(key, 0) + 1
-                    sums[key] = sums.get(key, 0) + value
+        for path in buffer.infos.keys():
+            if len(path) != 2 or path[0] != "rewards":
+                continue
+            values = buffer.infos.get_values(path)
+            counts[path[1]] = len(values)
+            sums[path[1]] = float(values.sum())
         overall_total = 0.0
         for key in counts.keys():
             count = counts[key]
@@ -286,6 +286,11 @@ class PvpEnv(AsyncIoEnv[NDArray[np.float32], NDArray[np.int32]]):
     def env_id(self) -> str:
         return self._env_id
 
+    @property
+    def stack_frames(self) -> list[int]:
+        # How many steps back each stacked frame is, the most recent frame first
+        return self._stack_frames
+
     async def step_async(
         self, action: NDArray[np.int32]
     ) -> tuple[NDArray[np.float32], float, bool, bool, dict[str, Any]]:
@@ -7,6 +7,7 @@ import torch as th
 from gymnasium import spaces
 from numpy.typing import NDArray
 
+from pvp_ml.ppo.info_store import InfoStore
 from pvp_ml.util.running_mean_std import TensorRunningMeanStd
 
 if TYPE_CHECKING:
@@ -33,13 +34,28 @@ class Buffer:
         action_space: spaces.MultiDiscrete,
         gae_lambda: float = 0.95,
         gamma: float = 0.99,
+        stack_frames: list[int] | None = None,
     ):
         self.buffer_size = buffer_size
         self.n_envs = n_envs
         self.observation_space = observation_space
         self.action_space = action_space
+        # If the env's stack frames are given, only the most recent frame of each step's observation is stored,
+        # and stacked observations are rebuilt from the frames of previous steps when they're needed
+        self.stack_frames = stack_frames
+        if self.stack_frames is not None:
+            assert self.stack_frames[0] == 0, "Most recent frame must be stacked"
+            assert len(self.stack_frames) == self.observation_space.shape[0]
         self.observations = np.zeros(
-            (self.buffer_size, self.n_envs, *self.observation_space.shape),
+            (
+                self.buffer_size,
+                self.n_envs,
+                *(
+                    self.observation_space.shape[1:]
+                    if self.stack_frames is not None
+                    else self.observation_space.shape
+                ),
+            ),
             dtype=np.float32,
         )
         self.actions = np.zeros(
@@ -55,12 +71,13 @@ class Buffer:
         self.episode_starts = np.zeros((self.buffer_size, self.n_envs), dtype=bool)
         self.advantages = np.zeros((self.buffer_size, self.n_envs), dtype=np.float32)
         self.returns = np.zeros((self.buffer_size, self.n_envs), dtype=np.float32)
-        self.infos = np.array(
-            [[{} for _ in range(self.n_envs)] for _ in range(self.buffer_size)]
-        )
+        self.infos = InfoStore(self.buffer_size, self.n_envs)
         self.truncates = np.zeros((self.buffer_size, self.n_envs), dtype=bool)
         self.episode_rewards: list[list[float]] = [[] for _ in range(self.n_envs)]
         self.episode_lengths: list[list[int]] = [[] for _ in range(self.n_envs)]
+        # Episodes still in progress when the rollout ended, which aren't continued since envs reset each rollout
+        self.partial_episode_rewards = np.zeros((self.n_envs,), dtype=np.float64)
+        self.partial_episode_lengths = np.zeros((self.n_envs,), dtype=np.int64)
         self.last_step_obs = np.zeros(
             (n_envs, *self.observation_space.shape), dtype=np.float32
         )
@@ -113,9 +130,16 @@ class Buffer:
 
         positions = self.positions[remaining_env_indices]
 
-        self.observations[positions, remaining_env_indices] = obs[
-            remaining_input_indices
-        ]
+        if self.stack_frames is not None:
+            # Frames from before the rollout can't be rebuilt, so every env has to start an episode with it
+            assert np.all(episode_start[remaining_input_indices][positions == 0])
+            self.observations[positions, remaining_env_indices] = obs[
+                remaining_input_indices, 0
+            ]
+        else:
+            self.observations[positions, remaining_env_indices] = obs[
+                remaining_input_indices
+            ]
         self.rewards[positions, remaining_env_indices] = reward[remaining_input_indices]
         self.episode_starts[positions, remaining_env_indices] = episode_start[
             remaining_input_indices
@@ -123,7 +147,9 @@ class Buffer:
         self.truncates[positions, remaining_env_indices] = truncate[
             remaining_input_indices
         ]
-        self.infos[positions, remaining_env_indices] = infos[remaining_input_indices]
+        self.infos.record(
+            positions, remaining_env_indices, infos[remaining_input_indices]
+        )
 
         self.positions[remaining_env_indices] += 1
 
@@ -132,12 +158,75 @@ class Buffer:
         self.last_step_obs[final_step_indexes] = next_obs[final_step_inputs]
         self.last_step_dones[final_step_indexes] = done[final_step_inputs]
 
+    def get_observations(
+        self, indices: NDArray[np.int64] | None = None
+    ) -> NDArray[np.float32]:
+        # Stacked observations of the samples at the given (step * n_envs + env) indices, or of every sample
+        n_samples = self.buffer_size * self.n_envs
+        if indices is None:
+            indices = np.arange(n_samples)
+        if self.stack_frames is None:
+            return self.observations.reshape(n_samples, *self.observation_space.shape)[
+                indices
+            ]
+        return self._gather_frames(self._get_frame_indices()[indices])
+
+    def iter_observations(self, chunk_size: int) -> Iterator[NDArray[np.float32]]:
+        # Stacked observations of every sample in order, a chunk of samples at a time,
+        # so all the stacked observations don't have to be held in memory at once
+        n_samples = self.buffer_size * self.n_envs
+        frame_indices = (
+            self._get_frame_indices() if self.stack_frames is not None else None
+        )
+        reshaped_observations = self.observations.reshape(
+            n_samples, *self.observations.shape[2:]
+        )
+        for start_idx in range(0, n_samples, chunk_size):
+            chunk = slice(start_idx, start_idx + chunk_size)
+            yield (
+                reshaped_observations[chunk]
+                if frame_indices is None
+                else self._gather_frames(frame_indices[chunk])
+            )
+
+    def get_latest_frames(self) -> NDArray[np.float32]:
+        # The most recent frame of each step's observation, as (steps, envs, obs)
+        if self.stack_frames is None:
+            return self.observations[:, :, 0]
+        return self.observations
+
+    def _get_frame_indices(self) -> NDArray[np.int64]:
+        # For each sample, the sample index of each of its stacked frames, or -1 for frames before its episode started
+        # (which the env stacks as zeros). Envs reset each rollout, so no episode started before the first step.
+        steps = np.arange(self.buffer_size)[:, np.newaxis]
+        episode_start_steps = np.maximum.accumulate(
+            np.where(self.episode_starts, steps, 0), axis=0
+        )
+        frame_steps = steps[..., np.newaxis] - np.array(self.stack_frames)
+        frame_indices = (
+            frame_steps * self.n_envs + np.arange(self.n_envs)[:, np.newaxis]
+        )
+        return np.where(
+            frame_steps >= episode_start_steps[..., np.newaxis], frame_indices, -1
+        ).reshape(self.buffer_size * self.n_envs, -1)
+
+    def _gather_frames(self, frame_indices: NDArray[np.int64]) -> NDArray[np.float32]:
+        observations = self.observations.reshape(self.buffer_size * self.n_envs, -1)[
+            np.maximum(frame_indices, 0)
+        ]
+        observations[frame_indices < 0] = 0
+        return observations
+
     def generate_batches(self, batch_size: int, device: str) -> Iterator[BufferSamples]:
         n_samples = self.buffer_size * self.n_envs
         idxs = np.random.permutation(n_samples)
 
+        # Stacked observations are gathered a batch at a time when only latest frames are stored
+        frame_indices = (
+            self._get_frame_indices() if self.stack_frames is not None else None
+        )
         reshaped_observations = self.observations.reshape(
-            n_samples, *self.observation_space.shape
+            n_samples, *self.observations.shape[2:]
         )
         reshaped_actions = self.actions.reshape(n_samples, -1)
         reshaped_action_masks = self.action_masks.reshape(n_samples, -1)
@@ -153,7 +242,11 @@ class Buffer:
 
             samples = BufferSamples(
                 observations=th.as_tensor(
-                    reshaped_observations[batch_indices],
+                    (
+                        reshaped_observations[batch_indices]
+                        if frame_indices is None
+                        else self._gather_frames(frame_indices[batch_indices])
+                    ),
                     dtype=th.float32,
                     device=device,
                 ),
@@ -193,27 +286,26 @@ class Buffer:
         self._calculate_episode_reward_and_length()
 
     def _bootstrap_truncates(self, ppo: "PPO") -> None:
-        for i in range(0, self.buffer_size):
-            if np.any(self.truncates[i]):
-                terminal_obs = np.stack(
-                    [
-                        info["terminal_observation"]
-                        for info in self.infos[i, self.truncates[i]]
-                    ]
-                )
-                _, _, _, terminal_values, *_ = ppo.predict(
-                    th.as_tensor(terminal_obs, device=ppo.device),
-                    th.ones(len(terminal_obs), sum(self.action_space.nvec)),
-                    deterministic=False,
-                    return_log_probs=False,
-                    return_values=True,
-                    return_actions=False,
-                    return_entropy=False,
-                )
-                assert terminal_values is not None
-                self.rewards[i][self.truncates[i]] += (
-                    self.gamma * terminal_values.cpu().numpy().flatten()
-                )
+        # Values of every truncated episode's terminal observation are predicted in one batch
+        truncated_steps, truncated_envs = np.nonzero(self.truncates)
+        if len(truncated_steps) == 0:
+            return
+        terminal_observations, _ = self.infos.get(("terminal_observation",))
+        terminal_obs = np.stack(terminal_observations[truncated_steps, truncated_envs])
+        _, _, _, terminal_values, *_ = ppo.predict(
+            th.as_tensor(terminal_obs, device=ppo.device),
+            th.ones(len(terminal_obs), sum(self.action_space.nvec)),
+            deterministic=False,
+            return_log_probs=False,
+            return_values=True,
+            return_actions=False,
+            return_entropy=False,
+        )
+        assert terminal_values is not None
+        # Each step and env is truncated at most once, so there are no repeated indices to accumulate
+        self.rewards[truncated_steps, truncated_envs] += (
+            self.gamma * terminal_values.cpu().numpy().flatten()
+        )
 
     def _compute_returns_and_advantage(
         self, ppo: "PPO", reward_normalizer: TensorRunningMeanStd | None
@@ -234,62 +326,67 @@ class Buffer:
         if reward_normalizer is not None:
             self._normalize_rewards(last_values, reward_normalizer)
 
-        last_gae_lam = 0
-        for step in reversed(range(self.buffer_size)):
-            if step == self.buffer_size - 1:
-                next_non_terminal = 1.0 - self.last_step_dones
-                next_values = last_values
-            else:
-                next_non_terminal = 1.0 - self.episode_starts[step + 1]
-                next_values = self.values[step + 1]
-            delta = (
-                self.rewards[step]
-                + self.gamma * next_values * next_non_terminal
-                - self.values[step]
-            )
-            last_gae_lam = (
-                delta + self.gamma * self.gae_lambda * next_non_terminal * last_gae_lam
-            )
-            self.advantages[step] = last_gae_lam
+        # GAE(lambda) over the whole rollout, with TD errors computed for every step at once
+        next_non_terminal = self._get_next_non_terminal()
+        next_values = np.concatenate([self.values[1:], last_values[np.newaxis]])
+        deltas = (
+            self.rewards + self.gamma * next_values * next_non_terminal - self.values
+        )
+        self.advantages[:] = _reverse_discounted_scan(
+            deltas, self.gamma * self.gae_lambda * next_non_terminal, initial=0.0
+        )
 
         self.returns = self.advantages + self.values
 
+    def _get_next_non_terminal(self) -> NDArray[np.float64]:
+        # Whether the episode continues after each step, so the next step's value can be bootstrapped
+        return 1.0 - np.concatenate(
+            [self.episode_starts[1:], self.last_step_dones[np.newaxis]]
+        )
+
     def _calculate_episode_reward_and_length(self) -> None:
-        current_rewards, current_lengths = np.zeros(self.n_envs), np.zeros(self.n_envs)
-
-        for t in range(self.buffer_size):
-            for i, episode_start in enumerate(self.episode_starts[t]):
-                if episode_start:
-                    if current_lengths[i] > 0:
-                        self.episode_rewards[i].append(current_rewards[i].item())
-                        self.episode_lengths[i].append(current_lengths[i].item())
-                    current_rewards[i] = 0
-                    current_lengths[i] = 0
-
-            current_rewards += self.rewards[t]
-            current_lengths += 1
-
-        # Check last step (if episode ended last step of the rollout)
-        for i, done in enumerate(self.last_step_dones):
-            if done and current_lengths[i] > 0:
-                self.episode_rewards[i].append(current_rewards[i].item())
-                self.episode_lengths[i].append(current_lengths[i].item())
+        # Each env's steps are laid out contiguously, and split into episodes at each episode start
+        episode_starts = self.episode_starts.T.flatten()
+        # Steps before an env's first episode start are counted as an episode too
+        episode_starts[:: self.buffer_size] = True
+        segment_starts = np.flatnonzero(episode_starts)
+        segment_envs = segment_starts // self.buffer_size
+        segment_rewards = np.add.reduceat(
+            self.rewards.T.flatten().astype(np.float64), segment_starts
+        )
+        segment_lengths = np.diff(segment_starts, append=len(episode_starts))
+
+        # Each env's last segment runs to the end of the rollout, and is only complete if it was done on the last step
+        is_last_segment = np.append(segment_envs[1:] != segment_envs[:-1], True)
+        is_partial = is_last_segment & ~self.last_step_dones[segment_envs]
+        self.partial_episode_rewards[segment_envs[is_partial]] = segment_rewards[
+            is_partial
+        ]
+        self.partial_episode_lengths[segment_envs[is_partial]] = segment_lengths[
+            is_partial
+        ]
+
+        complete_envs = segment_envs[~is_partial]
+        split_indices = np.cumsum(np.bincount(complete_envs, minlength=self.n_envs))
+        for i, (rewards, lengths) in enumerate(
+            zip(
+                np.split(segment_rewards[~is_partial], split_indices[:-1]),
+                np.split(segment_lengths[~is_partial], split_indices[:-1]),
+            )
+        ):
+            self.episode_rewards[i].extend(rewards.tolist())
+            self.episode_lengths[i].extend(lengths.tolist())
 
     def _normalize_rewards(
         self, last_values: NDArray[np.float32], reward_normalizer: TensorRunningMeanStd
     ) -> None:
         # Normalize rewards based on standard deviation of historical cumulative episodic rewards
-        cumulative_rewards = np.zeros((self.buffer_size, self.n_envs), dtype=np.float32)
-        for step in reversed(range(self.buffer_size)):
-            if step == self.buffer_size - 1:
-                next_non_terminal = 1.0 - self.last_step_dones
-                next_rewards = last_values
-            else:
-                next_non_terminal = 1.0 - self.episode_starts[step + 1]
-                next_rewards = cumulative_rewards[step + 1]
-            cumulative_rewards[step] = (
-                self.rewards[step] + self.gamma * next_non_terminal * next_rewards
-            )
+        cumulative_rewards = _reverse_discounted_scan(
+            self.rewards,
+            self.gamma * self._get_next_non_terminal(),
+            initial=last_values,
+            dtype=np.float32,
+        )
 
         # Adapt the rewards to a tensor, so we can use existing logic for it
         reward_normalizer.to(
@@ -310,8 +407,9 @@ class Buffer:
         self.rewards[:] = normalized_rewards  # Update in-place
 
     def _compute_novelty_reward(self, ppo: "PPO", novelty_reward_scale: float) -> None:
+        # Only the latest frame of each step is scored, so there's no need to stack frames
         scaled_observations = ppo.meta.running_observation_stats.normalize(
-            th.as_tensor(self.observations, device=ppo.device),
+            th.as_tensor(self.get_latest_frames(), device=ppo.device),
             clip=True,
         )
         if "env_meta" in ppo.meta.custom_data:
@@ -324,15 +422,30 @@ class Buffer:
 
         # Subtract by 1, so we don't reward observations within 1 standard deviation since they aren't novel
         env_step_novelty_rewards = (
-            (scaled_observations.abs() - 1).clamp(min=0).sum(dim=-1)
+            (scaled_observations.abs() - 1).clamp(min=0).sum(dim=-1).cpu().numpy()
         )
-        # Take first value of last dimension to get latest frame (if frame stacking)
-        env_step_novelty_rewards = env_step_novelty_rewards[..., 0].cpu().numpy()
 
         self.rewards += env_step_novelty_rewards * novelty_reward_scale
         self.novelty += env_step_novelty_rewards
 
 
+def _reverse_discounted_scan(
+    values: NDArray[np.floating],
+    discounts: NDArray[np.floating],
+    initial: float | NDArray[np.floating],
+    dtype: type[np.floating] = np.float64,
+) -> NDArray[np.floating]:
+    # out[t] = values[t] + discounts[t] * out[t + 1], where out[T] = initial
+    # Each step depends on the next, so only this recurrence runs per step, everything else is computed up front.
+    # The carry is kept at the output dtype, so results match an equivalent per-step loop exactly.
+    out = np.empty(values.shape, dtype=dtype)
+    carry = initial
+    for step in reversed(range(len(values))):
+        out[step] = values[step] + discounts[step] * carry
+        carry = out[step]
+    return out
+
+
 def merge_buffers(buffers: list[Buffer]) -> Buffer:
     assert buffers, "No buffers to merge"
 
@@ -341,6 +454,7 @@ def merge_buffers(buffers: list[Buffer]) -> Buffer:
     action_space = buffers[0].action_space
     gae_lambda = buffers[0].gae_lambda
     gamma = buffers[0].gamma
+    stack_frames = buffers[0].stack_frames
     finalized = buffers[0].finalized
 
     for buffer in buffers[1:]:
@@ -349,6 +463,7 @@ def merge_buffers(buffers: list[Buffer]) -> Buffer:
         assert buffer.action_space == action_space
         assert buffer.gae_lambda == gae_lambda
         assert buffer.gamma == gamma
+        assert buffer.stack_frames == stack_frames
         assert buffer.finalized == finalized
 
     merged_buffer = Buffer(
@@ -358,6 +473,7 @@ def merge_buffers(buffers: list[Buffer]) -> Buffer:
         action_space=action_space,
         gae_lambda=gae_lambda,
         gamma=gamma,
+        stack_frames=stack_frames,
     )
 
     merged_buffer.finalized = finalized
@@ -390,7 +506,7 @@ def merge_buffers(buffers: list[Buffer]) -> Buffer:
     merged_buffer.returns = np.concatenate(
         [buffer.returns for buffer in buffers], axis=1
     )
-    merged_buffer.infos = np.concatenate([buffer.infos for buffer in buffers], axis=1)
+    merged_buffer.infos = InfoStore.concatenate([buffer.infos for buffer in buffers])
     merged_buffer.truncates = np.concatenate(
         [buffer.truncates for buffer in buffers], axis=1
     )
@@ -400,6 +516,12 @@ def merge_buffers(buffers: list[Buffer]) -> Buffer:
     merged_buffer.episode_lengths = sum(
         (buffer.episode_lengths for buffer in buffers), []
     )
+    merged_buffer.partial_episode_rewards = np.concatenate(
+        [buffer.partial_episode_rewards for buffer in buffers], axis=0
+    )
+    merged_buffer.partial_episode_lengths = np.concatenate(
+        [buffer.partial_episode_lengths for buffer in buffers], axis=0
+    )
     merged_buffer.last_step_obs = np.concatenate(
         [buffer.last_step_obs for buffer in buffers], axis=0
     )
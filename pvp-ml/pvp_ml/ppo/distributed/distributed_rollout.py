@@ -51,15 +51,17 @@ class _RolloutActor:
 
         print(f"Synced experiment {experiment_name} for {self._experiment_name}")
 
-    def collect_rollout(self) -> tuple[bytes, bytes]:
+    def collect_rollout(
+        self, single_frame_observations: bool = False
+    ) -> tuple[bytes, bytes]:
         try:
             self._clean_abandoned_experiments()
-            self._run_rollout()
+            self._run_rollout(single_frame_observations)
             return self._collect_artifacts()
         finally:
             self._cleanup()
 
-    def _run_rollout(self) -> None:
+    def _run_rollout(self, single_frame_observations: bool) -> None:
         print(f"Starting rollout {self._experiment_name}")
         early_stopping = {
             "type": "expression",
@@ -83,6 +85,9 @@ class _RolloutActor:
             "false",
             "--train-league-exploiter",
             "false",
+            # Overrides the preset, so the buffers match the layout the driver asked for
+            "--single-frame-observations",
+            str(single_frame_observations).lower(),
         )
         print(f"Finished rollout {self._experiment_name}")
 
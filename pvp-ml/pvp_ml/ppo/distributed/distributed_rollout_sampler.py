@@ -45,6 +45,7 @@ class DistributedRolloutSampler(RolloutSampler):
         eps_greedy: float = 0.0,
         gae_lambda: float = 0.95,
         gamma: float = 0.99,
+        single_frame_observations: bool = False,
     ) -> Buffer:
         logger.info(f"Running distributed rollout {self._rollout_id}")
 
@@ -95,7 +96,14 @@ class DistributedRolloutSampler(RolloutSampler):
         )
 
         logger.info(f"Collecting {len(actors)} rollouts")
-        jobs = [actor.collect_rollout.remote() for actor in actors.keys()]
+        # The other sampling settings come from the preset, but this one changes the buffer layout,
+        # so each remote job stores single frames exactly when the driver does
+        jobs = [
+            actor.collect_rollout.remote(
+                single_frame_observations=single_frame_observations
+            )
+            for actor in actors.keys()
+        ]
 
         buffers: list[Buffer] = []
         metas: list[Meta] = []
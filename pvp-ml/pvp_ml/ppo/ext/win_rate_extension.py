@@ -90,9 +90,9 @@ class WinRateExtension(ModelExtension):
             "batch_size": self._batch_size,
             "test_size": self._test_size,
             "classifier_state": self._classifier.state_dict(),
-            "optimizer_state": self._optimizer.state_dict()
-            if self._optimizer is not None
-            else None,
+            "optimizer_state": (
+                self._optimizer.state_dict() if self._optimizer is not None else None
+            ),
         }
 
     def run_extension(self, obs: th.Tensor) -> dict[str, list[float]]:
@@ -207,13 +207,14 @@ class WinRateExtension(ModelExtension):
     ) -> tuple[th.Tensor, th.Tensor]:
         # Extract observations and pair them with the eventual outcome of the fight
         # Collect outcomes
-        episode_outcomes: dict[str, str] = {}
-        for steps in buffer.infos:
-            for env_step in steps:
-                if "terminal_state" in env_step:
-                    episode_outcomes[env_step["episode_id"]] = env_step[
-                        "terminal_state"
-                    ]
+        episode_ids, has_episode_id = buffer.infos.get(("episode_id",))
+        terminal_states, has_terminal_state = buffer.infos.get(("terminal_state",))
+        episode_outcomes: dict[str, str] = dict(
+            zip(
+                episode_ids[has_terminal_state].tolist(),
+                terminal_states[has_terminal_state].tolist(),
+            )
+        )
         # Balance outcomes so that every # of outcomes is equal
         if self._balance_outcomes:
             episode_id_by_outcomes: dict[str, list[str]] = {}
@@ -229,22 +230,30 @@ class WinRateExtension(ModelExtension):
                 ):
                     episode_outcomes[episode_id] = outcome
         # Map episode IDs to list of corresponding observation indices
-        episode_indices_map: dict[str, list[int]] = {}
-        for i, steps in enumerate(buffer.infos):
-            for j, env_step in enumerate(steps):
-                episode_id = env_step["episode_id"]
-                if episode_id not in episode_indices_map:
-                    episode_indices_map[episode_id] = []
-                episode_indices_map[episode_id].append(i * buffer.n_envs + j)
+        # (flat indices are step * n_envs + env, matching the reshaped observations below)
+        flat_indices = np.flatnonzero(has_episode_id)
+        unique_episode_ids, episode_inverse = np.unique(
+            episode_ids.reshape(-1)[flat_indices], return_inverse=True
+        )
+        order = np.argsort(episode_inverse, kind="stable")
+        split_points = np.cumsum(np.bincount(episode_inverse))[:-1]
+        episode_indices_map: dict[str, list[int]] = dict(
+            zip(
+                unique_episode_ids.tolist(),
+                [
+                    episode_obs_indices.tolist()
+                    for episode_obs_indices in np.split(
+                        flat_indices[order], split_points
+                    )
+                ],
+            )
+        )
         # Randomize outcome order
         tmp_list = list(episode_outcomes.items())
         random.shuffle(tmp_list)
         episode_outcomes = dict(tmp_list)
         # Sample data, limiting by max inputs per episode
-        observations = buffer.observations.reshape(
-            buffer.buffer_size * buffer.n_envs, *buffer.observation_space.shape
-        )
-        sampled_observations = []
+        sampled_indices_list: list[int] = []
         sampled_labels = []
         for episode_id, outcome in episode_outcomes.items():
             label = TERMINAL_STATE_LABELS[outcome]
@@ -257,12 +266,11 @@ class WinRateExtension(ModelExtension):
             sampled_indices = np.random.choice(
                 episode_obs_indices, size=sample_size, replace=False
             )
-            for idx in sampled_indices:
-                sampled_observations.append(observations[idx])
-                sampled_labels.append(label)
+            sampled_indices_list.extend(sampled_indices.tolist())
+            sampled_labels.extend([label] * sample_size)
         # Convert data into tensors
         observation_tensor = th.as_tensor(
-            np.array(sampled_observations),
+            buffer.get_observations(np.array(sampled_indices_list, dtype=np.int64)),
             dtype=th.float32,
             device=meta.running_observation_stats.mean.device,
         )
@@ -0,0 +1,177 @@
+import functools
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Path of keys to a (possibly nested) info value, e.g. ("meta", "damageDealt")
+InfoPath = tuple[str, ...]
+
+_BOOL = np.dtype(bool)
+_INT = np.dtype(np.int64)
+_FLOAT = np.dtype(np.float64)
+_OBJECT = np.dtype(object)
+# Numeric column types, in the order columns are promoted when values of different types are recorded
+_NUMERIC_DTYPES = [_BOOL, _INT, _FLOAT]
+_INT_RANGE = range(np.iinfo(np.int64).min, np.iinfo(np.int64).max + 1)
+
+
+class InfoStore:
+    # Step infos of a rollout, with a typed (steps, envs) column for each nested info key instead of a dict per step.
+    # Bool, int and float values are stored in typed columns, anything else (strings, arrays, ...) in object columns.
+    # Missing (or None) values are marked as not present.
+
+    def __init__(self, buffer_size: int, n_envs: int):
+        self.shape = (buffer_size, n_envs)
+        self._values: dict[InfoPath, NDArray[Any]] = {}
+        self._present: dict[InfoPath, NDArray[np.bool_]] = {}
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    def keys(self) -> list[InfoPath]:
+        return list(self._values.keys())
+
+    def record(
+        self,
+        positions: NDArray[np.int32],
+        env_indices: NDArray[np.int32],
+        infos: NDArray[np.object_],
+    ) -> None:
+        for position, env_index, info in zip(positions, env_indices, infos):
+            for path, value in _flatten(info):
+                column = self._get_column(path, _get_dtype(value))
+                column[position, env_index] = value
+                self._present[path][position, env_index] = True
+
+    def set_values(
+        self,
+        path: InfoPath,
+        positions: NDArray[np.int64],
+        env_indices: NDArray[np.int64],
+        values: NDArray[Any],
+    ) -> None:
+        column = self._get_column(path, _get_array_dtype(values))
+        column[positions, env_indices] = values
+        self._present[path][positions, env_indices] = True
+
+    def get(self, path: InfoPath) -> tuple[NDArray[Any], NDArray[np.bool_]]:
+        # The (steps, envs) column of values, and where they're present
+        if path not in self._values:
+            return np.zeros(self.shape, dtype=_OBJECT), np.zeros(self.shape, dtype=bool)
+        return self._values[path], self._present[path]
+
+    def get_values(self, path: InfoPath) -> NDArray[Any]:
+        # Values that are present, ordered by step then env
+        values, present = self.get(path)
+        return values[present]
+
+    def has(self, path: InfoPath) -> NDArray[np.bool_]:
+        # Where the path has a value, or is a dict with any values
+        present = np.zeros(self.shape, dtype=bool)
+        for column_path, column_present in self._present.items():
+            if column_path[: len(path)] == path:
+                present |= column_present
+        return present
+
+    def __getitem__(self, index: tuple[int, int]) -> dict[str, Any]:
+        # Rebuild the info dict of a step, for consumers that need the whole dict
+        info: dict[str, Any] = {}
+        for path, values in self._values.items():
+            if self._present[path][index]:
+                parent = info
+                for key in path[:-1]:
+                    parent = parent.setdefault(key, {})
+                parent[path[-1]] = (
+                    values[index].item() if values.dtype != _OBJECT else values[index]
+                )
+        return info
+
+    @staticmethod
+    def concatenate(stores: list["InfoStore"]) -> "InfoStore":
+        # Joins stores of rollouts with the same number of steps along the env axis
+        buffer_size = stores[0].shape[0]
+        assert all(store.shape[0] == buffer_size for store in stores)
+        merged_store = InfoStore(buffer_size, sum(store.shape[1] for store in stores))
+        paths = dict.fromkeys(path for store in stores for path in store.keys())
+        for path in paths:
+            dtype = functools.reduce(
+                _promote,
+                [
+                    store._values[path].dtype
+                    for store in stores
+                    if path in store._values
+                ],
+            )
+            merged_store._values[path] = np.concatenate(
+                [
+                    (
+                        store._values[path].astype(dtype)
+                        if path in store._values
+                        else np.zeros(store.shape, dtype=dtype)
+                    )
+                    for store in stores
+                ],
+                axis=1,
+            )
+            merged_store._present[path] = np.concatenate(
+                [
+                    store._present.get(path, np.zeros(store.shape, dtype=bool))
+                    for store in stores
+                ],
+                axis=1,
+            )
+        return merged_store
+
+    def _get_column(self, path: InfoPath, dtype: np.dtype[Any]) -> NDArray[Any]:
+        # Gets the column for a path, adding it or promoting its type to fit values of the given type
+        column = self._values.get(path)
+        if column is None:
+            column = self._values[path] = np.zeros(self.shape, dtype=dtype)
+            self._present[path] = np.zeros(self.shape, dtype=bool)
+        elif _promote(column.dtype, dtype) != column.dtype:
+            column = self._values[path] = column.astype(_promote(column.dtype, dtype))
+        return column
+
+
+def _flatten(
+    info: dict[str, Any], prefix: InfoPath = ()
+) -> Iterator[tuple[InfoPath, Any]]:
+    for key, value in info.items():
+        path = (*prefix, key)
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        elif value is not None:
+            yield path, value
+
+
+def _get_dtype(value: Any) -> np.dtype[Any]:
+    if isinstance(value, (bool, np.bool_)):
+        return _BOOL
+    if isinstance(value, np.integer) or (
+        isinstance(value, int) and value in _INT_RANGE
+    ):
+        return _INT
+    if isinstance(value, (float, np.floating)):
+        return _FLOAT
+    return _OBJECT
+
+
+def _get_array_dtype(values: NDArray[Any]) -> np.dtype[Any]:
+    if values.dtype == _BOOL:
+        return _BOOL
+    if np.issubdtype(values.dtype, np.integer):
+        return _INT
+    if np.issubdtype(values.dtype, np.floating):
+        return _FLOAT
+    return _OBJECT
+
+
+def _promote(dtype: np.dtype[Any], other_dtype: np.dtype[Any]) -> np.dtype[Any]:
+    if dtype == other_dtype:
+        return dtype
+    if dtype in _NUMERIC_DTYPES and other_dtype in _NUMERIC_DTYPES:
+        return max(dtype, other_dtype, key=_NUMERIC_DTYPES.index)
+    return _OBJECT
@@ -1,7 +1,11 @@
 import abc
 import dataclasses
+import hashlib
+import inspect
+import io
 import logging
 import os
+import sys
 import threading
 import time
 from dataclasses import dataclass, field
@@ -12,6 +16,7 @@ import torch as th
 import torch.optim as optim
 from torch.utils.tensorboard import SummaryWriter
 
+from pvp_ml import package_root
 from pvp_ml.ppo.buffer import Buffer
 from pvp_ml.ppo.policy import Policy
 from pvp_ml.util.contract_loader import ActionDependencies, EnvironmentMeta
@@ -75,10 +80,27 @@ class ModelExtension(abc.ABC):
 
 
 logger = logging.getLogger(__name__)
+
+FLOAT32_PRECISION = "float32"
+# Dynamic quantization: linear layer weights are stored as int8, and activations are quantized on the fly (CPU only)
+INT8_PRECISION = "int8"
+BFLOAT16_PRECISION = "bfloat16"
+
+PRECISION_TYPES = [
+    FLOAT32_PRECISION,
+    INT8_PRECISION,
+    BFLOAT16_PRECISION,
+]
+
 # th.jit.compile seems to not be threadsafe
 # ex. 'RuntimeError: Can't redefine method: forward on class:' ...
 _jit_lock = threading.Lock()
 _JIT_EVAL_POLICY = os.getenv("TORCH_SCRIPT_INFERENCE", "true").lower() == "true"
+# Compiled policies are cached on disk, keyed by content, so loading the same checkpoint again skips compilation
+_JIT_CACHE = os.getenv("TORCH_SCRIPT_CACHE", "true").lower() == "true"
+_JIT_CACHE_DIR = os.getenv(
+    "TORCH_SCRIPT_CACHE_DIR", os.path.join(package_root, ".torchscript_cache")
+)
 
 
 class PPO:
@@ -91,6 +113,8 @@ class PPO:
         policy_state: dict[str, Any] | None = None,
         optimizer_state: dict[str, Any] | None = None,
         extensions: dict[str, ModelExtension] = {},
+        eval_policy: th.jit.ScriptModule | None = None,
+        precision: str = FLOAT32_PRECISION,
     ):
         # Note: don't call constructor directly, use one of the static factory methods to load or create a new instance
         self._policy_params = policy_params
@@ -102,11 +126,25 @@ class PPO:
         self._extensions = extensions
         if policy_state is not None:
             self._policy.load_state_dict(policy_state)
+        self._precision = _get_supported_precision(precision, device)
+        if self._precision != FLOAT32_PRECISION:
+            assert not trainable, "Reduced precision models can't be trained"
+            self._policy = _convert_precision(self._policy, self._precision)
+        # Approximate memory used by the model, so loaded models can be cached within a memory budget
+        self._memory_bytes = _state_bytes(self._policy.state_dict()) + sum(
+            _state_bytes(extension.state_dict())
+            for extension in self._extensions.values()
+        )
         for extension in self._extensions.values():
             extension.to(device)
+        self._eval_policy: th.nn.Module
         if _JIT_EVAL_POLICY:
-            with _jit_lock:
-                self._eval_policy = th.jit.freeze(th.jit.script(self._policy))
+            if eval_policy is not None:
+                # Already compiled (loaded from the compiled policy cache)
+                self._eval_policy = eval_policy
+            else:
+                with _jit_lock:
+                    self._eval_policy = th.jit.freeze(th.jit.script(self._policy))
         else:
             self._eval_policy = self._policy
         self._optimizer: optim.Adam | None
@@ -120,6 +158,12 @@ class PPO:
             for extension in self._extensions.values():
                 extension.eval()
 
+    def get_precision(self) -> str:
+        return self._precision
+
+    def get_memory_bytes(self) -> int:
+        return self._memory_bytes
+
     def predict(
         self,
         obs: th.Tensor,
@@ -161,7 +205,7 @@ class PPO:
                 obs = self.meta.running_observation_stats.normalize(obs, clip=True)
 
             actions, log_probs, entropy, values, probs = self._eval_policy(
-                obs,
+                obs.to(th.bfloat16) if self._precision == BFLOAT16_PRECISION else obs,
                 action_masks,
                 sample_deterministic=deterministic,
                 return_actions=return_actions,
@@ -171,6 +215,13 @@ class PPO:
                 return_probs=return_probs,
             )
 
+            if self._precision == BFLOAT16_PRECISION:
+                # Callers always get float32 outputs
+                log_probs = _to_float32(log_probs)
+                entropy = _to_float32(entropy)
+                values = _to_float32(values)
+                probs = _to_float32(probs)
+
             extension_results = [
                 self._extensions[extension].run_extension(obs)
                 for extension in extensions
@@ -303,10 +354,25 @@ class PPO:
 
         self._optimizer.zero_grad()
 
-        flattened_obs = buffer.observations.reshape(-1, buffer.observations.shape[-1])
-        self.meta.running_observation_stats.update(
-            th.as_tensor(flattened_obs, device=self.device)
+        # Observations are stacked a batch at a time, so only latest frames are held in memory if that's all the buffer stores
+        obs_size = buffer.observations.shape[-1]
+        rollout_observation_stats = TensorRunningMeanStd(
+            shape=(obs_size,), count_eps=0, dtype=th.float64
         )
+        rollout_observation_min = th.full((obs_size,), th.inf, dtype=th.float64)
+        rollout_observation_max = th.full((obs_size,), -th.inf, dtype=th.float64)
+        for observations_chunk in buffer.iter_observations(batch_size):
+            flattened_obs = th.as_tensor(observations_chunk.reshape(-1, obs_size))
+            self.meta.running_observation_stats.update(
+                flattened_obs.to(device=self.device)
+            )
+            rollout_observation_stats.update(flattened_obs.double())
+            rollout_observation_min = th.minimum(
+                rollout_observation_min, flattened_obs.min(dim=0).values.double()
+            )
+            rollout_observation_max = th.maximum(
+                rollout_observation_max, flattened_obs.max(dim=0).values.double()
+            )
         flattened_actions = buffer.actions.reshape(-1, buffer.actions.shape[-1])
         self._policy.actor.update_action_normalization(
             th.as_tensor(flattened_actions, dtype=th.float32, device=self.device)
@@ -401,7 +467,7 @@ class PPO:
                 self.meta.trained_steps,
             )
 
-            for i in range(buffer.observations.shape[-1]):
+            for i in range(obs_size):
                 if env_meta is not None:
                     if i >= len(env_meta.observations):
                         # Handle 'critic' obs
@@ -412,25 +478,24 @@ class PPO:
                         obs_key = env_meta.observations[i].id
                 else:
                     obs_key = f"{i}"
-                key_obs = buffer.observations[..., i]
                 summary_writer.add_scalar(
                     f"observations/{obs_key}_rollout_mean",
-                    np.mean(key_obs),
+                    rollout_observation_stats.mean[i].item(),
                     self.meta.trained_steps,
                 )
                 summary_writer.add_scalar(
                     f"observations/{obs_key}_rollout_std",
-                    np.std(key_obs),
+                    rollout_observation_stats.var[i].sqrt().item(),
                     self.meta.trained_steps,
                 )
                 summary_writer.add_scalar(
                     f"observations/{obs_key}_rollout_min",
-                    np.min(key_obs),
+                    rollout_observation_min[i].item(),
                     self.meta.trained_steps,
                 )
                 summary_writer.add_scalar(
                     f"observations/{obs_key}_rollout_max",
-                    np.max(key_obs),
+                    rollout_observation_max[i].item(),
                     self.meta.trained_steps,
                 )
                 summary_writer.add_scalar(
@@ -512,18 +577,39 @@ class PPO:
 
     @staticmethod
     def load(
-        load_path: str, device: str = "cpu", trainable: bool | None = None
+        load_path: str | bytes,
+        device: str = "cpu",
+        trainable: bool | None = None,
+        precision: str = FLOAT32_PRECISION,
     ) -> "PPO":
-        if not os.path.exists(load_path):
+        # The checkpoint may also be given as its file contents, to load from memory without a file
+        if isinstance(load_path, bytes):
+            checkpoint = th.load(
+                io.BytesIO(load_path), map_location=device, weights_only=False
+            )
+        elif not os.path.exists(load_path):
             raise ValueError(f"{load_path} not found")
-        checkpoint = th.load(load_path, map_location=device, weights_only=False)
+        else:
+            checkpoint = th.load(load_path, map_location=device, weights_only=False)
         # Ensure the loaded model is actually trainable, if requested
         if trainable is None:
-            trainable = "optimizer" in checkpoint
+            trainable = "optimizer" in checkpoint and precision == FLOAT32_PRECISION
         assert (
             not trainable or "optimizer" in checkpoint
-        ), f"Cannot load non-trainable model as trainable: {load_path}"
-        return PPO(
+        ), f"Cannot load non-trainable model as trainable: {load_path if isinstance(load_path, str) else 'checkpoint bytes'}"
+        # Only inference models use the compiled policy cache, trainable models recompile after every update anyway
+        precision = _get_supported_precision(precision, device)
+        compiled_policy_path = (
+            _get_compiled_policy_path(load_path, device, precision)
+            if not trainable and _JIT_EVAL_POLICY and _JIT_CACHE
+            else None
+        )
+        eval_policy = (
+            _load_compiled_policy(compiled_policy_path, device)
+            if compiled_policy_path is not None
+            else None
+        )
+        model = PPO(
             policy_params=checkpoint["policy_params"],
             meta=checkpoint["meta"],
             device=device,
@@ -538,7 +624,12 @@ class PPO:
                     "extensions", []
                 )  # Backwards compatibility
             },
+            eval_policy=eval_policy,
+            precision=precision,
         )
+        if compiled_policy_path is not None and eval_policy is None:
+            _save_compiled_policy(model._eval_policy, compiled_policy_path)
+        return model
 
     @staticmethod
     def load_meta(load_path: str) -> Meta:
@@ -590,3 +681,113 @@ class PPO:
 
     def __str__(self) -> str:
         return str(self._policy)
+
+
+def _state_bytes(state: dict[str, Any]) -> int:
+    return sum(_value_bytes(value) for value in state.values())
+
+
+def _value_bytes(value: Any) -> int:
+    if isinstance(value, th.Tensor):
+        return value.numel() * value.element_size()
+    # Quantized layers store their packed weights as tuples of tensors
+    if isinstance(value, (tuple, list)):
+        return sum(_value_bytes(item) for item in value)
+    return 0
+
+
+def _get_compiled_policy_path(
+    load_path: str | bytes, device: str, precision: str
+) -> str:
+    # Keyed by everything the compiled policy depends on: checkpoint contents, policy source, torch version, device and precision
+    if isinstance(load_path, bytes):
+        digest = hashlib.sha256(load_path)
+    else:
+        digest = hashlib.sha256()
+        with open(load_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    digest.update(_get_policy_source_hash())
+    digest.update(th.__version__.encode())
+    digest.update(th.device(device).type.encode())
+    digest.update(precision.encode())
+    return os.path.join(_JIT_CACHE_DIR, f"{digest.hexdigest()}.pt")
+
+
+_policy_source_hash: bytes | None = None
+
+
+def _get_policy_source_hash() -> bytes:
+    global _policy_source_hash
+    if _policy_source_hash is None:
+        _policy_source_hash = hashlib.sha256(
+            (
+                inspect.getsource(sys.modules[Policy.__module__])
+                + inspect.getsource(sys.modules[default_mlp_config.__module__])
+            ).encode()
+        ).digest()
+    return _policy_source_hash
+
+
+def _load_compiled_policy(path: str, device: str) -> th.jit.ScriptModule | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        with _jit_lock:
+            return cast(th.jit.ScriptModule, th.jit.load(path, map_location=device))
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable compiled policy {path}: {e}")
+        return None
+
+
+def _save_compiled_policy(eval_policy: th.nn.Module, path: str) -> None:
+    # Write to a temporary file first, so concurrent loaders never see a partially written file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        th.jit.save(eval_policy, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        # Caching is best effort, the compiled policy in memory is used either way
+        logger.warning(f"Failed to cache compiled policy at {path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _get_supported_precision(precision: str, device: str) -> str:
+    if precision not in PRECISION_TYPES:
+        raise ValueError(
+            f"Unknown precision: {precision}, expected one of {PRECISION_TYPES}"
+        )
+    device_type = th.device(device).type
+    if precision == INT8_PRECISION and device_type != "cpu":
+        raise ValueError(
+            f"{INT8_PRECISION} precision is only supported on cpu, not {device}"
+        )
+    if (
+        precision == BFLOAT16_PRECISION
+        and device_type == "cpu"
+        and not th.ops.mkldnn._is_mkldnn_bf16_supported()
+    ):
+        logger.warning(
+            f"{BFLOAT16_PRECISION} isn't supported by this CPU, falling back to {FLOAT32_PRECISION}"
+        )
+        return FLOAT32_PRECISION
+    return precision
+
+
+def _convert_precision(policy: Policy, precision: str) -> Policy:
+    if precision == INT8_PRECISION:
+        return cast(
+            Policy,
+            th.ao.quantization.quantize_dynamic(policy, {th.nn.Linear}, dtype=th.qint8),
+        )
+    if precision == BFLOAT16_PRECISION:
+        return policy.to(th.bfloat16)
+    return policy
+
+
+def _to_float32(tensor: th.Tensor | None) -> th.Tensor | None:
+    return tensor.float() if tensor is not None else None
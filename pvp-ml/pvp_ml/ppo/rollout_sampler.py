@@ -26,6 +26,7 @@ class RolloutSampler:
         gamma: float = 0.99,
         normalize_rewards: bool = False,
         novelty_reward_scale: float = 0.0,
+        single_frame_observations: bool = False,
         summary_writer: SummaryWriter | None = None,
     ) -> Buffer:
         start = time.time()
@@ -38,6 +39,7 @@ class RolloutSampler:
             eps_greedy=eps_greedy,
             gae_lambda=gae_lambda,
             gamma=gamma,
+            single_frame_observations=single_frame_observations,
         )
 
         callback.on_rollout_sampling_end(raw_buffer=buffer)
@@ -147,6 +149,12 @@ class RolloutSampler:
             summary_writer.add_scalar(
                 "rollout/num_episodes", len(episode_lengths), ppo.meta.trained_steps
             )
+            # Episodes cut off by the end of the rollout aren't in the episode stats above
+            summary_writer.add_scalar(
+                "rollout/num_partial_episodes",
+                np.count_nonzero(buffer.partial_episode_lengths),
+                ppo.meta.trained_steps,
+            )
 
             # Extract meta for better metric names
             first_env = env.envs[0]
@@ -173,6 +181,12 @@ class RolloutSampler:
                 mask_offset += n
 
             partial_indices = env_meta.get_partially_observable_indices()
+            oldest_frames = np.concatenate(
+                [
+                    observations_chunk[:, -1]
+                    for observations_chunk in buffer.iter_observations(4096)
+                ]
+            )
             for obs_idx in range(buffer.observation_space.shape[-1]):
                 if obs_idx >= len(env_meta.observations):
                     # Handle 'critic' obs
@@ -180,7 +194,7 @@ class RolloutSampler:
                     obs_key = f"opponent_{env_meta.observations[real_obs_idx].id}"
                 else:
                     obs_key = env_meta.observations[obs_idx].id
-                data = buffer.observations[:, :, -1, obs_idx]
+                data = oldest_frames[:, obs_idx]
                 summary_writer.add_histogram(
                     f"observations/{obs_key}", data, ppo.meta.trained_steps
                 )
@@ -259,12 +273,18 @@ class RolloutSampler:
         eps_greedy: float = 0.0,
         gae_lambda: float = 0.95,
         gamma: float = 0.99,
+        single_frame_observations: bool = False,
     ) -> Buffer:
         env_action_space = env.action_space
         env_observation_space = env.observation_space
         # We only support these space types (which is what PvpEnv uses)
         assert isinstance(env_action_space, gymnasium.spaces.MultiDiscrete)
         assert isinstance(env_observation_space, gymnasium.spaces.Box)
+        stack_frames: list[int] | None = None
+        if single_frame_observations:
+            first_env = env.envs[0]
+            assert isinstance(first_env, PvpEnv)
+            stack_frames = first_env.stack_frames
         buffer = Buffer(
             buffer_size=steps,
             n_envs=env.num_envs,
@@ -272,6 +292,7 @@ class RolloutSampler:
             observation_space=env_observation_space,
             gamma=gamma,
             gae_lambda=gae_lambda,
+            stack_frames=stack_frames,
         )
 
         env.reset_async()
@@ -30,6 +30,7 @@ class Trainer:
         novelty_reward_scale: Schedule[float] = ConstantSchedule(0.0),
         normalize_advantages: bool = True,
         normalize_rewards: bool = False,
+        single_frame_observations: bool = False,
         callbacks: list[Callback] = [],
         summary_writer: SummaryWriter | None = None,
     ) -> None:
@@ -49,6 +50,7 @@ class Trainer:
                 gae_lambda=gae_lambda.value(ppo.meta.trained_rollouts),
                 gamma=gamma.value(ppo.meta.trained_rollouts),
                 normalize_rewards=normalize_rewards,
+                single_frame_observations=single_frame_observations,
                 summary_writer=summary_writer,
                 novelty_reward_scale=novelty_reward_scale.value(
                     ppo.meta.trained_rollouts
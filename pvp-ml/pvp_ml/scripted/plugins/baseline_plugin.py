@@ -1,10 +1,12 @@
 import random
 from typing import Any
 
-from pvp_ml.scripted.script_plugin import ScriptPlugin
+import torch as th
 
+from pvp_ml.scripted.script_plugin import BatchScriptPlugin, ScriptPluginBatch
 
-class BaselinePlugin(ScriptPlugin):
+
+class BaselinePlugin(BatchScriptPlugin):
     def predict(
         self,
         eat_primary_food: bool = False,
@@ -29,6 +31,9 @@ class BaselinePlugin(ScriptPlugin):
         mage_attack: bool = False,
         ranged_attack: bool = False,
         melee_attack: bool = False,
+        use_ice_spell: bool = False,
+        basic_ranged_attack: bool = False,
+        basic_melee_attack: bool = False,
         **kwargs: Any,
     ) -> dict[str, str]:
         # Note: this plugin is not complete at the moment.
@@ -57,6 +62,10 @@ class BaselinePlugin(ScriptPlugin):
         elif target_using_melee and melee_prayer:
             actions["prayer"] = "melee_prayer"
 
+        # Only the basic attack of each style is used
+        mage_attack = mage_attack and use_ice_spell
+        ranged_attack = ranged_attack and basic_ranged_attack
+        melee_attack = melee_attack and basic_melee_attack
         possible_attacks = {
             key: value
             for key, value in {
@@ -82,3 +91,94 @@ class BaselinePlugin(ScriptPlugin):
                 actions["mage_attack_type"] = "use_ice_spell"
 
         return actions
+
+    def predict_batch(self, batch: ScriptPluginBatch) -> dict[str, th.Tensor]:
+        # Same logic as predict, for every row at once
+        player_health_percent = batch["player_health_percent"]
+        eat_primary_food = batch["eat_primary_food"]
+        eat_karambwan = batch["eat_karambwan"]
+        actions = {
+            "food": batch.select_action(
+                ((player_health_percent < 0.6) & eat_primary_food, "eat_primary_food")
+            ),
+            "karambwan": batch.select_action(
+                (
+                    eat_karambwan
+                    & (
+                        (player_health_percent < 0.4)
+                        | ((player_health_percent < 0.6) & ~eat_primary_food)
+                    ),
+                    "eat_karambwan",
+                )
+            ),
+            "potion": batch.select_action(
+                (
+                    (batch["prayer_points"] < 0.6) & batch["use_restore_potion"],
+                    "use_restore_potion",
+                ),
+                (
+                    (batch["ranged_level"] < 0.95) & batch["use_ranged_potion"],
+                    "use_ranged_potion",
+                ),
+                (
+                    (batch["strength_level"] < 0.95) & batch["use_combat_potion"],
+                    "use_combat_potion",
+                ),
+            ),
+            "prayer": batch.select_action(
+                (
+                    batch["target_using_mage"].to(th.bool) & batch["mage_prayer"],
+                    "mage_prayer",
+                ),
+                (
+                    batch["target_using_ranged"].to(th.bool) & batch["ranged_prayer"],
+                    "ranged_prayer",
+                ),
+                (
+                    batch["target_using_melee"].to(th.bool) & batch["melee_prayer"],
+                    "melee_prayer",
+                ),
+            ),
+        }
+
+        # Only the basic attack of each style is used
+        mage_attack = batch["mage_attack"] & batch["use_ice_spell"]
+        ranged_attack = batch["ranged_attack"] & batch["basic_ranged_attack"]
+        melee_attack = batch["melee_attack"] & batch["basic_melee_attack"]
+        # Columns are mage, ranged, melee attacks
+        possible_attacks = th.stack(
+            [
+                mage_attack & ~batch["target_magic_prayer"].to(th.bool),
+                ranged_attack & ~batch["target_ranged_prayer"].to(th.bool),
+                melee_attack & ~batch["target_melee_prayer"].to(th.bool),
+            ],
+            dim=1,
+        )
+        # Default to range, if no attacks available, even if target is praying range
+        possible_attacks[:, 1] |= ~possible_attacks.any(dim=1) & ranged_attack
+        # Uniformly random choice of the possible attacks
+        selected_attack = (
+            th.rand(possible_attacks.shape, device=possible_attacks.device)
+            .masked_fill(~possible_attacks, -1)
+            .argmax(dim=1)
+        )
+        has_attack = possible_attacks.any(dim=1)
+        mage_attack, ranged_attack, melee_attack = (
+            has_attack & (selected_attack == i) for i in range(3)
+        )
+        actions["attack"] = batch.select_action(
+            (mage_attack, "mage_attack"),
+            (ranged_attack, "ranged_attack"),
+            (melee_attack, "melee_attack"),
+        )
+        actions["melee_attack_type"] = batch.select_action(
+            (melee_attack, "basic_melee_attack")
+        )
+        actions["ranged_attack_type"] = batch.select_action(
+            (ranged_attack, "basic_ranged_attack")
+        )
+        actions["mage_attack_type"] = batch.select_action(
+            (mage_attack, "use_ice_spell")
+        )
+
+        return actions
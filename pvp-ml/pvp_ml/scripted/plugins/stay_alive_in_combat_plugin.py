@@ -1,20 +1,38 @@
 from typing import Any
 
-from pvp_ml.scripted.script_plugin import ScriptPlugin
+import torch as th
 
+from pvp_ml.scripted.script_plugin import BatchScriptPlugin, ScriptPluginBatch
 
-class StayAliveInCombatPlugin(ScriptPlugin):
+
+class StayAliveInCombatPlugin(BatchScriptPlugin):
     def predict(
         self,
         ranged_attack: bool = False,
+        basic_ranged_attack: bool = False,
         eat_primary_food: bool = False,
         player_health_percent: float = 0.0,
         **kwargs: Any,
     ) -> dict[str, str]:
         action = {}
-        if ranged_attack:
+        if ranged_attack and basic_ranged_attack:
             action["attack"] = "ranged_attack"
             action["ranged_attack_type"] = "basic_ranged_attack"
         if player_health_percent < 0.6 and eat_primary_food:
             action["food"] = "eat_primary_food"
         return action
+
+    def predict_batch(self, batch: ScriptPluginBatch) -> dict[str, th.Tensor]:
+        ranged_attack = batch["ranged_attack"] & batch["basic_ranged_attack"]
+        return {
+            "attack": batch.select_action((ranged_attack, "ranged_attack")),
+            "ranged_attack_type": batch.select_action(
+                (ranged_attack, "basic_ranged_attack")
+            ),
+            "food": batch.select_action(
+                (
+                    (batch["player_health_percent"] < 0.6) & batch["eat_primary_food"],
+                    "eat_primary_food",
+                )
+            ),
+        }
@@ -1,6 +1,9 @@
 import abc
+from collections.abc import Iterator, Mapping
 from typing import Any
 
+import torch as th
+
 
 class ScriptPlugin(abc.ABC):
     @abc.abstractmethod
@@ -14,3 +17,96 @@ class ScriptPlugin(abc.ABC):
         and the value is the action ID for that action head.
         """
         pass
+
+
+class ScriptPluginBatch(Mapping[str, th.Tensor]):
+    """
+    Columns of a batch of observations/action masks, named the same as the kwargs passed to ScriptPlugin.predict.
+    Observation columns are float tensors, and action mask columns are bool tensors, each with one value per row.
+    Columns are sliced out of the batch when accessed, so only the columns a plugin uses are created.
+    """
+
+    _FRAME_PREFIX = "frame_"
+
+    def __init__(
+        self,
+        observations: th.Tensor,
+        action_masks: th.Tensor,
+        observation_indices: dict[str, int],
+        action_indices: dict[str, tuple[int, int]],
+        action_head_offsets: list[int],
+    ):
+        self._observations = observations  # batch, frame_stack, obs
+        self._action_masks = action_masks  # batch, masks
+        self._observation_indices = observation_indices
+        self._action_indices = action_indices  # action ID -> (action head, action)
+        self._action_head_offsets = action_head_offsets
+
+    @property
+    def size(self) -> int:
+        return self._observations.size(0)
+
+    def action_index(self, action_id: str) -> int:
+        # Index of the action in its action head, which is what predict_batch results contain
+        return self._action_indices[action_id][1]
+
+    def select_action(self, *choices: tuple[th.Tensor, str]) -> th.Tensor:
+        """
+        Builds an action head result from (condition, action ID) choices, where each row gets the action of the first
+        choice whose condition is true for it, or the no-op action if none are.
+        """
+        assert (
+            len({self._action_indices[action_id][0] for _, action_id in choices}) <= 1
+        ), f"Actions must belong to the same action head: {choices}"
+        result = th.zeros(self.size, dtype=th.long, device=self._observations.device)
+        # Applied in reverse, so earlier choices take priority
+        for condition, action_id in reversed(choices):
+            result = th.where(
+                condition, th.tensor(self.action_index(action_id)), result
+            )
+        return result
+
+    def __getitem__(self, key: str) -> th.Tensor:
+        action = self._action_indices.get(key)
+        if action is not None:
+            action_head, action_index = action
+            return self._action_masks[
+                :, self._action_head_offsets[action_head] + action_index
+            ].to(th.bool)
+        if key in self._observation_indices:
+            return self._observations[:, 0, self._observation_indices[key]]
+        if key.startswith(self._FRAME_PREFIX):
+            frame, _, observation_id = key[len(self._FRAME_PREFIX) :].partition("_")
+            if (
+                frame.isdigit()
+                and 0 < int(frame) < self._observations.size(1)
+                and observation_id in self._observation_indices
+            ):
+                return self._observations[
+                    :, int(frame), self._observation_indices[observation_id]
+                ]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for frame in range(self._observations.size(1)):
+            prefix = f"{self._FRAME_PREFIX}{frame}_" if frame > 0 else ""
+            for observation_id in self._observation_indices:
+                yield f"{prefix}{observation_id}"
+        yield from self._action_indices
+
+    def __len__(self) -> int:
+        return self._observations.size(1) * len(self._observation_indices) + len(
+            self._action_indices
+        )
+
+
+class BatchScriptPlugin(ScriptPlugin):
+    @abc.abstractmethod
+    def predict_batch(self, batch: ScriptPluginBatch) -> dict[str, th.Tensor]:
+        """
+        Columnar version of predict, which is used instead of it to predict a whole batch at once.
+
+        The result must be a dictionary of actions, where the key is the action head ID, and the value is a tensor of
+        the selected action index (in the action head) for each row. Missing action heads use the no-op action.
+        """
+        pass
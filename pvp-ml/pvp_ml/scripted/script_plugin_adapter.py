@@ -2,7 +2,11 @@ from typing import Any
 
 import torch as th
 
-from pvp_ml.scripted.script_plugin import ScriptPlugin
+from pvp_ml.scripted.script_plugin import (
+    BatchScriptPlugin,
+    ScriptPlugin,
+    ScriptPluginBatch,
+)
 from pvp_ml.util.contract_loader import EnvironmentMeta
 
 
@@ -13,6 +17,24 @@ class ScriptPluginAdapter:
         self._environment = environment
         self._environment_name = environment_name
         self._plugin = plugin
+        # Lookups by ID, so conversions don't need to search the contract
+        self._observation_indices = {
+            observation.id: i for i, observation in enumerate(environment.observations)
+        }
+        self._action_head_indices = {
+            action_head.id: i for i, action_head in enumerate(environment.actions)
+        }
+        self._action_indices = {
+            action.id: (i, j)
+            for i, action_head in enumerate(environment.actions)
+            for j, action in enumerate(action_head.actions)
+        }
+        self._action_head_sizes = [
+            len(action_head.actions) for action_head in environment.actions
+        ]
+        self._action_head_offsets = [
+            sum(self._action_head_sizes[:i]) for i in range(len(environment.actions))
+        ]
 
     def get_env_name(self) -> str:
         return self._environment_name
@@ -28,6 +50,18 @@ class ScriptPluginAdapter:
             0
         ), f"Observations size {observations.size(0)} != action masks size {action_masks.size(0)}"
 
+        if isinstance(self._plugin, BatchScriptPlugin):
+            batch = ScriptPluginBatch(
+                observations,
+                action_masks,
+                self._observation_indices,
+                self._action_indices,
+                self._action_head_offsets,
+            )
+            return self._convert_batch_result(
+                self._plugin.predict_batch(batch), action_masks
+            )
+
         results = []
         for obs, mask in zip(observations, action_masks):
             kwargs = self._convert_params(obs, mask)
@@ -50,13 +84,10 @@ class ScriptPluginAdapter:
                 kwargs[key] = o
 
         # Add action masks based on action ID
-        action_head_sizes = [
-            len(action_head.actions) for action_head in self._environment.actions
-        ]
-        flattened_masks = th.split(action_masks, action_head_sizes)
+        flattened_masks = th.split(action_masks, self._action_head_sizes)
         for i, a in enumerate(flattened_masks):
             for j, m in enumerate(a):
-                kwargs[self._environment.actions[i].actions[j].id] = j
+                kwargs[self._environment.actions[i].actions[j].id] = m
 
         return kwargs
 
@@ -76,18 +107,50 @@ class ScriptPluginAdapter:
             ), f"Selected action for {action.id}: {selected_action_id} is not available"
             # Remove the key, so we can keep track of known actions
             del result[action.id]
-            action_index = next(
-                (
-                    i
-                    for i, action in enumerate(action.actions)
-                    if action.id == selected_action_id
-                ),
-                None,
+            action_head_index, action_index = self._action_indices.get(
+                selected_action_id, (None, None)
             )
             assert (
-                action_index is not None
+                action_head_index == self._action_head_indices[action.id]
+                and action_index is not None
             ), f"Unknown action for {action.id}: {selected_action_id}"
             actions.append(action_index)
         # There should be no keys left, otherwise they are invalid
         assert not result, f"Unknown action keys: {result}"
         return th.tensor(actions)
+
+    def _convert_batch_result(
+        self, result: dict[str, th.Tensor], action_masks: th.Tensor
+    ) -> th.Tensor:
+        unknown_action_heads = result.keys() - self._action_head_indices.keys()
+        assert not unknown_action_heads, f"Unknown action keys: {unknown_action_heads}"
+        # Action heads not in the result use the no-op action
+        actions = th.zeros(
+            (action_masks.size(0), len(self._action_head_sizes)),
+            dtype=th.long,
+            device=action_masks.device,
+        )
+        for action_head_id, selected_actions in result.items():
+            i = self._action_head_indices[action_head_id]
+            selected_actions = selected_actions.long()
+            assert selected_actions.shape == (
+                action_masks.size(0),
+            ), f"Selected actions for {action_head_id} have invalid shape: {selected_actions.shape}"
+            assert (
+                (selected_actions >= 0)
+                & (selected_actions < self._action_head_sizes[i])
+            ).all(), f"Unknown action for {action_head_id}: {selected_actions}"
+            # Ensure actions are available via action masks, or are the no-op action
+            available = (
+                action_masks.narrow(
+                    1, self._action_head_offsets[i], self._action_head_sizes[i]
+                )
+                .gather(1, selected_actions.unsqueeze(1))
+                .squeeze(1)
+                .to(th.bool)
+            )
+            assert (
+                (selected_actions == 0) | available
+            ).all(), f"Selected action for {action_head_id} is not available: {selected_actions}"
+            actions[:, i] = selected_actions
+        return actions
@@ -23,6 +23,77 @@ def optimize_for_deployment(model_file_path: str = "") -> None:
                 PPO.optimize_for_inference(file_path)
 
 
+def validate_precision(
+    model_file_path: str,
+    observations_file_path: str,
+    precision: list[str],
+    batch_size: int = 256,
+) -> None:
+    import time
+
+    import torch as th
+
+    from pvp_ml.ppo.ppo import FLOAT32_PRECISION, PPO
+
+    # Recorded observations are saved with th.save as {"obs": (n, frames, features), "action_masks": (n, mask size)}
+    recorded = th.load(observations_file_path, map_location="cpu")
+    obs, action_masks = recorded["obs"].float(), recorded["action_masks"].bool()
+
+    def run(model: PPO) -> tuple[th.Tensor, th.Tensor, float]:
+        actions, values = [], []
+        start_time = time.perf_counter()
+        for i in range(0, len(obs), batch_size):
+            batch_actions, _, _, batch_values, _, _ = model.predict(
+                obs[i : i + batch_size],
+                action_masks[i : i + batch_size],
+                deterministic=True,
+                return_log_probs=False,
+                return_entropy=False,
+            )
+            assert batch_actions is not None and batch_values is not None
+            actions.append(batch_actions)
+            values.append(batch_values)
+        elapsed = time.perf_counter() - start_time
+        return th.cat(actions), th.cat(values), elapsed
+
+    def single_request_latency(model: PPO, iterations: int = 200) -> float:
+        start_time = time.perf_counter()
+        for i in range(iterations):
+            model.predict(
+                obs[i % len(obs)].unsqueeze(0),
+                action_masks[i % len(obs)].unsqueeze(0),
+                deterministic=True,
+            )
+        return (time.perf_counter() - start_time) / iterations
+
+    reference = PPO.load(model_file_path, trainable=False)
+    reference_actions, reference_values, reference_time = run(reference)
+    logger.info(
+        f"{FLOAT32_PRECISION}: {reference.get_memory_bytes()} bytes,"
+        f" {single_request_latency(reference) * 1000:.3f}ms per request, {reference_time:.3f}s for {len(obs)} observations"
+    )
+    for model_precision in precision:
+        model = PPO.load(model_file_path, trainable=False, precision=model_precision)
+        if model.get_precision() != model_precision:
+            logger.warning(f"Skipping {model_precision}, not supported on this machine")
+            continue
+        actions, values, elapsed = run(model)
+        matching_actions = actions == reference_actions
+        value_drift = (values - reference_values).abs()
+        logger.info(
+            f"{model_precision}: {model.get_memory_bytes()} bytes,"
+            f" {single_request_latency(model) * 1000:.3f}ms per request, {elapsed:.3f}s for {len(obs)} observations"
+        )
+        logger.info(
+            f"{model_precision}: all actions agree for {matching_actions.all(dim=-1).float().mean().item():.2%} of observations,"
+            f" per action head: {[round(agreement, 4) for agreement in matching_actions.float().mean(dim=0).tolist()]}"
+        )
+        logger.info(
+            f"{model_precision}: value drift mean {value_drift.mean().item():.6f}, max {value_drift.max().item():.6f}"
+            f" (float32 values have std {reference_values.std().item():.6f})"
+        )
+
+
 def main(argv: list[str]) -> None:
     parser = argparse.ArgumentParser(description="Contains utility tools")
     subparsers = parser.add_subparsers(required=True)
@@ -36,6 +107,32 @@ def main(argv: list[str]) -> None:
         help="Model file to optimize. If none provided, will optimize all in /models and /references",
     )
 
+    validate_precision_parser = subparsers.add_parser(
+        "validate-precision",
+        help="Compare reduced precision inference against float32, on recorded observations",
+    )
+    validate_precision_parser.set_defaults(command_runner=validate_precision)
+    validate_precision_parser.add_argument(
+        "--model-file-path", type=str, required=True, help="Model file to validate"
+    )
+    validate_precision_parser.add_argument(
+        "--observations-file-path",
+        type=str,
+        required=True,
+        help="Recorded observations, saved with torch.save as {'obs': (n, frames, features), 'action_masks': (n, mask size)}",
+    )
+    validate_precision_parser.add_argument(
+        "--precision",
+        type=str,
+        nargs="+",
+        choices=["int8", "bfloat16"],
+        default=["int8", "bfloat16"],
+        help="Precisions to compare against float32",
+    )
+    validate_precision_parser.add_argument(
+        "--batch-size", type=int, default=256, help="Observations per prediction"
+    )
+
     args = parser.parse_args(argv)
     parameters = vars(args)
     parameters.pop("command_runner")(**parameters)
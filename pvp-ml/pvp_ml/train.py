@@ -133,6 +133,7 @@ def train(
     normalize_advantages: bool,
     normalize_rewards: bool,
     normalize_observations: bool,
+    single_frame_observations: bool,
     save_buffer: bool,
     save_meta: bool,
     distributed_rollouts: bool,
@@ -561,6 +562,7 @@ def train(
                         max_grad_norm=max_grad_norm,
                         normalize_advantages=normalize_advantages,
                         normalize_rewards=normalize_rewards,
+                        single_frame_observations=single_frame_observations,
                         novelty_reward_scale=novelty_reward_scale,
                     )
                     summary_writer.flush()
@@ -833,6 +835,14 @@ def main(argv: list[str]) -> None:
         help="Number of frames to stack, or frame indexes to stack (if a list). Index 0 is the current frame, 1 is the last frame, and so on.",
         default=1,
     )
+    parser.add_argument(
+        "--single-frame-observations",
+        type=lambda x: bool(strtobool(x)),
+        nargs="?",
+        const=True,
+        help="Store each frame once in rollout buffers, and stack frames when sampling batches",
+        default=False,
+    )
     parser.add_argument(
         "--batch-size",
         type=schedule,
@@ -1524,6 +1534,7 @@ def main(argv: list[str]) -> None:
         normalize_advantages=args.normalize_advantages,
         normalize_rewards=args.normalize_rewards,
         normalize_observations=args.normalize_observations,
+        single_frame_observations=args.single_frame_observations,
         save_buffer=args.save_latest_buffer,
         save_meta=args.save_latest_meta,
         distributed_rollouts=args.distributed_rollouts,
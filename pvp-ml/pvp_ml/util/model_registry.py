@@ -0,0 +1,202 @@
+import asyncio
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from pvp_ml.util.remote_processor.remote_processor import RemoteProcessor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelVersion:
+    name: str
+    # Private snapshot of the model file, so replacing the file in the models directory can't change a loaded version
+    path: str
+    # The modification time (ns) of the model file this version was loaded from
+    version: int
+    # Number of predictions currently using this version, it can't be freed while this is > 0
+    in_flight: int = 0
+    retired: bool = False
+
+
+class ModelRegistry:
+    # Serves the models in a directory, and hot reloads them when .zip files are added, replaced or removed.
+    # New versions are loaded in the background and swapped in once warm. Requests already using the old version
+    # finish on it, and it's unloaded from the remote processor once they have drained.
+
+    def __init__(
+        self,
+        models_dir: str,
+        remote_processor: RemoteProcessor,
+        poll_interval: float = 2.0,
+    ):
+        self._models_dir = models_dir
+        self._remote_processor = remote_processor
+        # Polling is disabled with a poll interval of 0
+        self._poll_interval = poll_interval
+        self._versions: dict[str, ModelVersion] = {}
+        # Changed files are only loaded once they've stopped changing for a poll, so partial writes aren't loaded
+        self._pending_changes: dict[str, tuple[int, int]] = {}
+        self._failed_versions: dict[str, int] = {}
+        self._snapshot_dir: str | None = None
+        # Versions are file modification times, which a restored file can repeat, so snapshots are numbered
+        self._snapshot_ids = itertools.count()
+        self._watch_task: asyncio.Task[None] | None = None
+        self._background_tasks: set[asyncio.Task[None]] = set()
+
+    async def start(self) -> None:
+        assert self._snapshot_dir is None
+        self._snapshot_dir = tempfile.mkdtemp(prefix="models-")
+        await self.refresh(wait_for_stable=False)
+        if self._poll_interval > 0:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        if self._snapshot_dir is not None:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+            self._snapshot_dir = None
+
+    def get_model_names(self) -> list[str]:
+        return list(self._versions.keys())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._versions
+
+    @contextmanager
+    def acquire(self, name: str) -> Iterator[ModelVersion]:
+        # Pins the current version of a model for the duration of a prediction
+        model_version = self._versions.get(name)
+        if model_version is None:
+            raise ValueError(f"Unknown model: {name}")
+        model_version.in_flight += 1
+        try:
+            yield model_version
+        finally:
+            model_version.in_flight -= 1
+            if model_version.retired and model_version.in_flight == 0:
+                self._free_in_background(model_version)
+
+    async def refresh(self, wait_for_stable: bool = True) -> None:
+        files = self._scan()
+        for name in list(self._versions.keys()):
+            if name not in files:
+                logger.info(f"Model {name} was removed")
+                self._retire(self._versions.pop(name))
+                self._pending_changes.pop(name, None)
+
+        changed = []
+        for name, (path, version, size) in files.items():
+            current = self._versions.get(name)
+            if (
+                current is not None and current.version == version
+            ) or self._failed_versions.get(name) == version:
+                self._pending_changes.pop(name, None)
+                continue
+            if wait_for_stable and self._pending_changes.get(name) != (version, size):
+                self._pending_changes[name] = (version, size)
+                continue
+            self._pending_changes.pop(name, None)
+            changed.append((name, path, version))
+
+        if changed:
+            await asyncio.gather(
+                *[self._load(name, path, version) for name, path, version in changed]
+            )
+
+    def _scan(self) -> dict[str, tuple[str, int, int]]:
+        if not os.path.isdir(self._models_dir):
+            return {}
+        files = {}
+        for entry in os.scandir(self._models_dir):
+            if entry.is_file() and entry.name.endswith(".zip"):
+                stat = entry.stat()
+                files[os.path.splitext(entry.name)[0]] = (
+                    entry.path,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                )
+        return files
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self._poll_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.exception(f"Failed to refresh models in {self._models_dir}: {e}")
+
+    async def _load(self, name: str, source_path: str, version: int) -> None:
+        assert self._snapshot_dir is not None
+        snapshot_path = os.path.join(
+            self._snapshot_dir, f"{name}-{version}-{next(self._snapshot_ids)}.zip"
+        )
+        model_version = ModelVersion(name=name, path=snapshot_path, version=version)
+        try:
+            await asyncio.to_thread(lambda: shutil.copyfile(source_path, snapshot_path))
+            # Warm up the new version on every worker it can be routed to before swapping it in
+            router = self._remote_processor.get_router()
+            await asyncio.gather(
+                *[
+                    self._remote_processor.predict(
+                        process_id=i, model_path=snapshot_path
+                    )
+                    for i in router.get_preload_workers(snapshot_path)
+                ]
+            )
+        except Exception as e:
+            logger.exception(f"Failed to load model {name} from {source_path}: {e}")
+            # Don't retry until the file changes again
+            self._failed_versions[name] = version
+            await self._free(model_version)
+            return
+
+        self._failed_versions.pop(name, None)
+        previous_version = self._versions.get(name)
+        self._versions[name] = model_version
+        if previous_version is None:
+            logger.info(f"Loaded model {name}")
+        else:
+            logger.info(f"Swapped in new version of model {name}")
+            self._retire(previous_version)
+
+    def _retire(self, model_version: ModelVersion) -> None:
+        model_version.retired = True
+        if model_version.in_flight == 0:
+            self._free_in_background(model_version)
+
+    def _free_in_background(self, model_version: ModelVersion) -> None:
+        task = asyncio.create_task(self._free(model_version))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _free(self, model_version: ModelVersion) -> None:
+        try:
+            await asyncio.gather(
+                *[
+                    self._remote_processor.unload_model(
+                        process_id=i, model_path=model_version.path
+                    )
+                    for i in range(self._remote_processor.get_pool_size())
+                ]
+            )
+        except Exception as e:
+            logger.warning(f"Failed to unload model {model_version.path}: {e}")
+        try:
+            os.remove(model_version.path)
+        except FileNotFoundError:
+            pass
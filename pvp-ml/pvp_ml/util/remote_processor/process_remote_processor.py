@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import multiprocessing as mp
+import os
 import pickle
 import socket
 import struct
@@ -12,6 +13,11 @@ import torch as th
 
 from pvp_ml.ppo.ppo import PPO
 from pvp_ml.util.remote_processor.remote_processor import RemoteProcessor
+from pvp_ml.util.remote_processor.worker_threads import (
+    configure_worker_threads,
+    get_worker_cpus,
+    set_intra_op_threads,
+)
 
 logger = logging.getLogger(__name__)
 SIZE_BUFFER_LENGTH = 4
@@ -31,15 +37,27 @@ def _recv_exactly(sock: socket.socket, size: int) -> bytes:
 
 def _worker(
     connection_id: int,
-    host: str,
-    port: int,
+    address: str | tuple[str, int],
     device: str,
     cache_size: int = 1000,
+    intra_op_threads: int | None = None,
+    inter_op_threads: int | None = None,
+    cpus: list[int] | None = None,
 ) -> None:
     try:
         logger.info(f"Running process worker {connection_id}")
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.connect((host, port))
+        configure_worker_threads(
+            intra_op_threads=intra_op_threads,
+            inter_op_threads=inter_op_threads,
+            cpus=cpus,
+        )
+        # A path is a Unix domain socket, otherwise it's a TCP (host, port)
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            if family == socket.AF_INET:
+                # Responses are small, and are sent as soon as they're ready
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.connect(address)
             sock.sendall(struct.pack("!I", connection_id))
 
             @lru_cache(maxsize=cache_size)
@@ -73,7 +91,9 @@ def _worker(
                     return_values,
                     return_probs,
                     extensions,
+                    intra_op_threads,
                 ) = pickle.loads(request_bytes)
+                set_intra_op_threads(intra_op_threads)
                 model = load_model(model_path)
                 if obs is None:
                     # preload model, don't actually predict
@@ -107,8 +127,8 @@ def _worker(
                     (prediction, log_probs, entropy, values, probs, ext_results)
                 )
                 length_bytes = struct.pack("!I", len(response_bytes))
-                sock.sendall(length_bytes)
-                sock.sendall(response_bytes)
+                # One send, so the response isn't split across packets
+                sock.sendall(length_bytes + response_bytes)
     except (BrokenPipeError, ConnectionResetError):
         logger.info(f"Remote socket closed: {connection_id}")
     except KeyboardInterrupt:
@@ -135,12 +155,28 @@ class Worker:
 
 
 class ExternalProcessor(RemoteProcessor):
-    def __init__(self, pool_size: int, host: str = "127.0.0.1", device: str = "cpu"):
+    def __init__(
+        self,
+        pool_size: int,
+        host: str = "127.0.0.1",
+        device: str = "cpu",
+        unix_socket_path: str | None = None,
+        intra_op_threads: int | None = None,
+        inter_op_threads: int | None = None,
+        pin_cpus: bool = False,
+    ):
         self._host = host
+        # Workers connect over this Unix domain socket instead of TCP, if given
+        self._unix_socket_path = unix_socket_path
         self._pool_size = pool_size
         self._workers: list[Worker] = []
         self._server: Server | None = None
         self._device = device
+        # Thread counts default to torch's, which oversubscribes the CPUs with more than one worker
+        self._intra_op_threads = intra_op_threads
+        self._inter_op_threads = inter_op_threads
+        # Each worker process is pinned to its own range of CPUs, if enabled
+        self._pin_cpus = pin_cpus
 
     async def _run_server(self, reader: StreamReader, writer: StreamWriter) -> None:
         logger.debug("Remote processor received connection")
@@ -155,19 +191,39 @@ class ExternalProcessor(RemoteProcessor):
     def get_device(self) -> str:
         return self._device
 
+    def set_intra_op_threads(self, intra_op_threads: int) -> None:
+        # Sent with each request, so workers pick it up without restarting
+        self._intra_op_threads = intra_op_threads
+
     async def initialize(self) -> None:
         assert self._server is None
         logger.info(f"Initializing remote processor on {self._host}")
         ctx = mp.get_context("spawn")  # Can't fork with GPU support
-        self._server = await asyncio.start_server(self._run_server, self._host)
+        address: str | tuple[str, int]
+        if self._unix_socket_path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._run_server, self._unix_socket_path
+            )
+            address = self._unix_socket_path
+        else:
+            self._server = await asyncio.start_server(self._run_server, self._host)
+            address = (self._host, self._server.sockets[0].getsockname()[1])
         await self._server.start_serving()
-        server_port = self._server.sockets[0].getsockname()[1]
-        logger.info(f"Initialized remote processor on {self._host}:{server_port}")
+        logger.info(f"Initialized remote processor on {address}")
         self._workers = [
             Worker(
                 ctx.Process(
                     target=_worker,
-                    args=(connection_id, self._host, server_port, self._device),
+                    args=(connection_id, address, self._device),
+                    kwargs={
+                        "intra_op_threads": self._intra_op_threads,
+                        "inter_op_threads": self._inter_op_threads,
+                        "cpus": (
+                            get_worker_cpus(connection_id, self._pool_size)
+                            if self._pin_cpus
+                            else None
+                        ),
+                    },
                     daemon=True,
                     name=f"Remote Processor {connection_id}",
                 )
@@ -180,7 +236,7 @@ class ExternalProcessor(RemoteProcessor):
             f"Started {self._pool_size} workers, waiting to receive connections..."
         )
         await asyncio.gather(*[worker.initialized.wait() for worker in self._workers])
-        logger.info(f"Remote processor initialized on {self._host}:{server_port}")
+        logger.info(f"Remote processor initialized on {address}")
 
     async def predict(
         self,
@@ -227,6 +283,7 @@ class ExternalProcessor(RemoteProcessor):
                     return_values,
                     return_probs,
                     extensions,
+                    self._intra_op_threads,
                 )
             )
             length_bytes = struct.pack("!I", len(body))
@@ -266,6 +323,11 @@ class ExternalProcessor(RemoteProcessor):
         logger.debug("Waiting for server to close")
         self._server.close()
         await self._server.wait_closed()
+        if self._unix_socket_path is not None and os.path.exists(
+            self._unix_socket_path
+        ):
+            # The socket file isn't removed when the server closes
+            os.unlink(self._unix_socket_path)
         for worker in self._workers:
             logger.debug(f"Joining processes: {worker}")
             # These will block the event loop
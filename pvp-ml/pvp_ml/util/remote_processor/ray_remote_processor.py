@@ -1,16 +1,17 @@
 import hashlib
 import logging
-import os
 import time
 from functools import cache
 from typing import Any, cast
 
+import ray
 import torch as th
 from ray.actor import ActorClass
 
 from pvp_ml.ppo.ppo import PPO
 from pvp_ml.util import ray_helper
 from pvp_ml.util.remote_processor.remote_processor import RemoteProcessor
+from pvp_ml.util.remote_processor.worker_threads import set_intra_op_threads
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +33,12 @@ class RayProcessor(RemoteProcessor):
         model_actor = self._get_model_actor_class()
         self._pool_size = pool_size
         self._device = device
+        # Checkpoints published to the object store by model hash, so each is only read and sent once.
+        # A checkpoint stays published while the model is in use (actors may expire and reload it),
+        # and is released when the model is unloaded.
+        self._model_refs: dict[str, ray.ObjectRef] = {}
+        # Sent with each request, so actors pick it up without restarting (torch's default if not set)
+        self._intra_op_threads: int | None = None
         self._actor_pool = [
             model_actor.options(
                 name=f"{'shared-' if shared else ''}ray-processor-{i}-{device}",
@@ -50,8 +57,21 @@ class RayProcessor(RemoteProcessor):
     def get_device(self) -> str:
         return self._device
 
+    def set_intra_op_threads(self, intra_op_threads: int) -> None:
+        self._intra_op_threads = intra_op_threads
+
     async def close(self) -> None:
         del self._actor_pool
+        self._model_refs.clear()
+
+    async def unload_model(self, process_id: int, model_path: str) -> None:
+        try:
+            model_hash = self._get_model_hash(model_path)
+        except FileNotFoundError:
+            return
+        # Tasks still holding the reference keep the checkpoint alive until they complete
+        self._model_refs.pop(model_hash, None)
+        await self._actor_pool[process_id].unload.remote(model_hash)
 
     async def predict(
         self,
@@ -97,26 +117,26 @@ class RayProcessor(RemoteProcessor):
                 return_values=return_values,
                 return_probs=return_probs,
                 extensions=extensions,
+                intra_op_threads=self._intra_op_threads,
             )
         except _ModelNotFoundException:
             logger.info(
                 f"Model {model_path} not found on remote, sending model with hash {model_hash}"
             )
-            # Model not on remote, send model, and retry
-            with open(model_path, "rb") as f:
-                model_file = f.read()
+            # Model not on remote, send a reference to the published model, and retry
             prediction = await actor.predict.remote(
                 model_hash,
                 observation,
                 deterministic,
                 action_masks,
-                model_file=model_file,
+                model_file=self._get_model_ref(model_path, model_hash),
                 return_actions=return_actions,
                 return_log_probs=return_log_probs,
                 return_entropy=return_entropy,
                 return_values=return_values,
                 return_probs=return_probs,
                 extensions=extensions,
+                intra_op_threads=self._intra_op_threads,
             )
 
         actions, log_probs, entropy, values, probs, ext_results = prediction
@@ -143,11 +163,15 @@ class RayProcessor(RemoteProcessor):
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
 
-    def _get_model_actor_class(self) -> ActorClass:
-        import tempfile
-
-        import ray
+    def _get_model_ref(self, model_path: str, model_hash: str) -> ray.ObjectRef:
+        # Ray resolves the reference to the checkpoint bytes before calling the actor, fetching them from the
+        # object store at most once per node
+        if model_hash not in self._model_refs:
+            with open(model_path, "rb") as f:
+                self._model_refs[model_hash] = ray.put(f.read())
+        return self._model_refs[model_hash]
 
+    def _get_model_actor_class(self) -> ActorClass:
         @ray.remote
         class ModelActor:
             def __init__(
@@ -166,14 +190,14 @@ class RayProcessor(RemoteProcessor):
                 )
 
             def _load_model(
-                self, model_hash: str, model_path: str | None = None
+                self, model_hash: str, model_file: bytes | None = None
             ) -> PPO:
                 self._model_access_times[model_hash] = time.time()
                 if model_hash not in self._model_cache:
-                    if model_path is None:
+                    if model_file is None:
                         raise _ModelNotFoundException
                     self._model_cache[model_hash] = PPO.load(
-                        model_path, device=self._device, trainable=False
+                        model_file, device=self._device, trainable=False
                     )
                 self._expire_items()
                 return self._model_cache[model_hash]
@@ -199,6 +223,10 @@ class RayProcessor(RemoteProcessor):
                         del self._model_cache[key]
                     del self._model_access_times[key]
 
+            def unload(self, model_hash: str) -> None:
+                self._model_cache.pop(model_hash, None)
+                self._model_access_times.pop(model_hash, None)
+
             def predict(
                 self,
                 model_hash: str,
@@ -212,6 +240,7 @@ class RayProcessor(RemoteProcessor):
                 return_values: bool = False,
                 return_probs: bool = False,
                 extensions: list[str] = [],
+                intra_op_threads: int | None = None,
             ) -> tuple[
                 th.Tensor | None,
                 th.Tensor | None,
@@ -220,15 +249,8 @@ class RayProcessor(RemoteProcessor):
                 th.Tensor | None,
                 list[Any],
             ]:
-                if model_file is not None:
-                    try:
-                        with tempfile.NamedTemporaryFile(mode="wb", delete=False) as f:
-                            f.write(model_file)
-                        model = self._load_model(model_hash, model_path=f.name)
-                    finally:
-                        os.unlink(f.name)
-                else:
-                    model = self._load_model(model_hash)
+                set_intra_op_threads(intra_op_threads)
+                model = self._load_model(model_hash, model_file=model_file)
 
                 if observation is None:
                     return None, None, None, None, None, []
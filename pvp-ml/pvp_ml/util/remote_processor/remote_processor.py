@@ -4,6 +4,12 @@ from typing import Any
 
 import torch as th
 
+from pvp_ml.util.remote_processor.router import (
+    RANDOM_ROUTER,
+    WorkerRouter,
+    create_router,
+)
+
 PROCESS_REMOTE_PROCESSOR = "process"
 THREAD_REMOTE_PROCESSOR = "thread"
 RAY_REMOTE_PROCESSOR = "ray"
@@ -16,6 +22,8 @@ REMOTE_PROCESSOR_TYPES = [
 
 
 class RemoteProcessor(ABC):
+    _router: WorkerRouter | None = None
+
     @abc.abstractmethod
     async def predict(
         self,
@@ -53,6 +61,65 @@ class RemoteProcessor(ABC):
     def get_device(self) -> str:
         pass
 
+    async def unload_model(self, process_id: int, model_path: str) -> None:
+        # Frees a model that won't be used anymore, once its in-flight predictions complete.
+        # Processors that can't unload individual models rely on their own cache expiry instead.
+        pass
+
+    def set_intra_op_threads(self, intra_op_threads: int) -> None:
+        # Changes the intra-op threads each worker uses, applied from each worker's next prediction
+        raise NotImplementedError(
+            f"{type(self).__name__} doesn't support setting intra-op threads"
+        )
+
+    def get_router(self) -> WorkerRouter:
+        if self._router is None:
+            self._router = create_router(RANDOM_ROUTER, self.get_pool_size())
+        return self._router
+
+    def set_router(self, router: WorkerRouter) -> None:
+        self._router = router
+
+    async def routed_predict(
+        self,
+        model_path: str,
+        observation: th.Tensor | None = None,
+        action_masks: th.Tensor | None = None,
+        deterministic: bool | th.Tensor = False,
+        return_device: str | None = None,
+        return_actions: bool = True,
+        return_log_probs: bool = False,
+        return_entropy: bool = False,
+        return_values: bool = False,
+        return_probs: bool = False,
+        extensions: list[str] = [],
+    ) -> tuple[
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        list[Any],
+    ]:
+        # Same as predict, but the router picks the worker (and tracks its queue depth)
+        router = self.get_router()
+        process_id = router.select_worker(model_path)
+        with router.track(process_id):
+            return await self.predict(
+                process_id=process_id,
+                model_path=model_path,
+                observation=observation,
+                action_masks=action_masks,
+                deterministic=deterministic,
+                return_device=return_device,
+                return_actions=return_actions,
+                return_log_probs=return_log_probs,
+                return_entropy=return_entropy,
+                return_values=return_values,
+                return_probs=return_probs,
+                extensions=extensions,
+            )
+
     async def __aenter__(self) -> "RemoteProcessor":
         return self
 
@@ -1,30 +1,51 @@
 import asyncio
+import itertools
 import logging
-import time
 import uuid
 from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
 from typing import Any
 
 import torch as th
 
-from pvp_ml.ppo.ppo import PPO
+from pvp_ml.ppo.ppo import FLOAT32_PRECISION, PPO
+from pvp_ml.util.remote_processor.model_cache import ModelCache, ModelCacheStats
 from pvp_ml.util.remote_processor.remote_processor import RemoteProcessor
+from pvp_ml.util.remote_processor.worker_threads import (
+    configure_worker_threads,
+    get_worker_cpus,
+    set_intra_op_threads,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class ThreadedProcessor(RemoteProcessor):
-    def __init__(self, pool_size: int, device: str = "cpu"):
+    def __init__(
+        self,
+        pool_size: int,
+        device: str = "cpu",
+        model_cache_bytes: int | None = None,
+        precision: str = FLOAT32_PRECISION,
+        intra_op_threads: int | None = None,
+        inter_op_threads: int | None = None,
+        pin_cpus: bool = False,
+    ):
         self._pool_size = pool_size
         self._device = device
+        self._precision = precision
+        # Thread counts default to torch's, which oversubscribes the CPUs with more than one worker
+        self._intra_op_threads = intra_op_threads
+        self._pin_cpus = pin_cpus
+        # Inter-op threads are shared by the whole process
+        configure_worker_threads(inter_op_threads=inter_op_threads)
+        self._worker_ids = itertools.count()
         self._executor = ThreadPoolExecutor(
             max_workers=pool_size,
             thread_name_prefix=f"remote-processor-{str(uuid.uuid4())}",
+            initializer=self._initialize_worker_thread,
         )
-        self._model_locks: dict[str, Lock] = {}
-        self._models: dict[str, PPO] = {}
-        self._lock_lock = Lock()
+        # Loaded models are kept within the memory budget (if given) by evicting least recently used models
+        self._model_cache = ModelCache(self._load_model, max_bytes=model_cache_bytes)
 
     def get_pool_size(self) -> int:
         return self._pool_size
@@ -32,9 +53,29 @@ class ThreadedProcessor(RemoteProcessor):
     def get_device(self) -> str:
         return self._device
 
+    def get_model_cache_stats(self) -> ModelCacheStats:
+        return self._model_cache.get_stats()
+
+    async def unload_model(self, process_id: int, model_path: str) -> None:
+        # Models are shared by all threads
+        self._model_cache.discard(model_path)
+
+    def set_intra_op_threads(self, intra_op_threads: int) -> None:
+        self._intra_op_threads = intra_op_threads
+
     async def close(self) -> None:
         self._executor.shutdown(wait=True)
 
+    def _initialize_worker_thread(self) -> None:
+        # Each thread is pinned to its own range of CPUs, if enabled
+        worker_id = next(self._worker_ids)
+        configure_worker_threads(
+            intra_op_threads=self._intra_op_threads,
+            cpus=(
+                get_worker_cpus(worker_id, self._pool_size) if self._pin_cpus else None
+            ),
+        )
+
     async def predict(
         self,
         process_id: int,
@@ -95,50 +136,30 @@ class ThreadedProcessor(RemoteProcessor):
         th.Tensor | None,
         list[Any],
     ]:
-        model = self._load_model(model_path)
-        if observation is None:
-            # Preload model, don't actually predict
-            return None, None, None, None, None, []
-        else:
-            if return_device is None:
-                return_device = str(observation.device)
-            assert action_masks is not None
-            action_masks = action_masks.to(self._device)
-            return model.predict(
-                observation.to(self._device),
-                action_masks,
-                deterministic=deterministic,
-                return_actions=return_actions,
-                return_values=return_values,
-                return_log_probs=return_log_probs,
-                return_entropy=return_entropy,
-                return_probs=return_probs,
-                return_device=return_device,
-                extensions=extensions,
-            )
+        set_intra_op_threads(self._intra_op_threads)
+        with self._model_cache.acquire(model_path) as model:
+            if observation is None:
+                # Preload model, don't actually predict
+                return None, None, None, None, None, []
+            else:
+                if return_device is None:
+                    return_device = str(observation.device)
+                assert action_masks is not None
+                action_masks = action_masks.to(self._device)
+                return model.predict(
+                    observation.to(self._device),
+                    action_masks,
+                    deterministic=deterministic,
+                    return_actions=return_actions,
+                    return_values=return_values,
+                    return_log_probs=return_log_probs,
+                    return_entropy=return_entropy,
+                    return_probs=return_probs,
+                    return_device=return_device,
+                    extensions=extensions,
+                )
 
     def _load_model(self, model_path: str) -> PPO:
-        # This requires special handling to allow concurrently loading different models,
-        # but not concurrently loading the same model
-        if model_path not in self._models:
-            # Find/create model lock
-            with self._lock_lock:
-                if model_path not in self._model_locks:
-                    self._model_locks[model_path] = Lock()
-                model_lock = self._model_locks[model_path]
-            with model_lock:
-                # Double check model hasn't already loaded
-                if model_path not in self._models:
-                    load_start_time = time.time()
-                    logger.info(f"Loading model {model_path} into memory")
-                    self._models[model_path] = PPO.load(
-                        model_path, device=self._device, trainable=False
-                    )
-                    logger.info(
-                        f"Loaded model {model_path} into memory in {time.time() - load_start_time} seconds"
-                    )
-            with self._lock_lock:
-                # Clean up - once model has been loaded, we don't need it again
-                if model_path in self._model_locks:
-                    del self._model_locks[model_path]
-        return self._models[model_path]
+        return PPO.load(
+            model_path, device=self._device, trainable=False, precision=self._precision
+        )
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+import torch as th
+
+from pvp_ml.util.contract_loader import EnvironmentMeta
+from pvp_ml.util.remote_processor.remote_processor import RemoteProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def get_available_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def get_worker_cpus(
+    worker_id: int, pool_size: int, cpus: list[int] | None = None
+) -> list[int]:
+    # A contiguous range of the CPUs for each worker, workers share CPUs if there are more workers than CPUs
+    if cpus is None:
+        cpus = get_available_cpus()
+    if pool_size >= len(cpus):
+        return [cpus[worker_id % len(cpus)]]
+    return cpus[
+        worker_id * len(cpus) // pool_size : (worker_id + 1) * len(cpus) // pool_size
+    ]
+
+
+def set_intra_op_threads(intra_op_threads: int | None) -> None:
+    # Set from each worker thread, since the OpenMP thread count is per calling thread
+    if intra_op_threads is not None and th.get_num_threads() != intra_op_threads:
+        th.set_num_threads(intra_op_threads)
+
+
+def configure_worker_threads(
+    intra_op_threads: int | None = None,
+    inter_op_threads: int | None = None,
+    cpus: list[int] | None = None,
+) -> None:
+    # Pins the calling thread (and the threads it starts) to the CPUs, and sets its thread counts
+    if cpus is not None:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        else:
+            logger.warning("CPU pinning isn't supported on this platform")
+    set_intra_op_threads(intra_op_threads)
+    if (
+        inter_op_threads is not None
+        and th.get_num_interop_threads() != inter_op_threads
+    ):
+        try:
+            th.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Inter-op threads are per process, and can only be set before any inter-op work has started
+            logger.warning(f"Failed to set {inter_op_threads} inter-op threads: {e}")
+
+
+def get_thread_candidates(pool_size: int) -> list[int]:
+    # Powers of two up to an even share of the CPUs for each worker, and the even share itself
+    cpus_per_worker = max(1, len(get_available_cpus()) // pool_size)
+    candidates = {cpus_per_worker}
+    threads = 1
+    while threads < cpus_per_worker:
+        candidates.add(threads)
+        threads *= 2
+    return sorted(candidates)
+
+
+def synthesize_batch(
+    environment: EnvironmentMeta, batch_size: int, frames: int
+) -> tuple[th.Tensor, th.Tensor]:
+    # Random observations and flattened action masks shaped by the contract, with an action available in each head
+    observation = th.randn(batch_size, frames, len(environment.observations))
+    action_masks = []
+    for action_head in environment.actions:
+        head_mask = th.rand(batch_size, len(action_head.actions)) < 0.7
+        head_mask[:, 0] = True
+        action_masks.append(head_mask)
+    return observation, th.cat(action_masks, dim=1)
+
+
+async def tune_intra_op_threads(
+    remote_processor: RemoteProcessor,
+    model_path: str,
+    observation: th.Tensor,
+    action_masks: th.Tensor,
+    candidates: list[int] | None = None,
+    rounds: int = 20,
+) -> int:
+    # Times each intra-op thread count with every worker predicting at once (like under load), and keeps the fastest
+    pool_size = remote_processor.get_pool_size()
+    if candidates is None:
+        candidates = get_thread_candidates(pool_size)
+
+    async def _run_round() -> float:
+        start_time = time.perf_counter()
+        await asyncio.gather(
+            *[
+                remote_processor.predict(
+                    process_id=i,
+                    model_path=model_path,
+                    observation=observation,
+                    action_masks=action_masks,
+                )
+                for i in range(pool_size)
+            ]
+        )
+        return time.perf_counter() - start_time
+
+    round_seconds: dict[int, float] = {}
+    for intra_op_threads in candidates:
+        remote_processor.set_intra_op_threads(intra_op_threads)
+        # Warm up, so model loading and starting threads aren't timed
+        await _run_round()
+        round_seconds[intra_op_threads] = statistics.median(
+            [await _run_round() for _ in range(rounds)]
+        )
+        logger.info(
+            f"{intra_op_threads} intra-op threads per worker: "
+            f"{round_seconds[intra_op_threads] * 1000:.2f}ms per round of {pool_size} predictions"
+        )
+    best_intra_op_threads = min(round_seconds, key=round_seconds.__getitem__)
+    remote_processor.set_intra_op_threads(best_intra_op_threads)
+    logger.info(f"Using {best_intra_op_threads} intra-op threads per worker")
+    return best_intra_op_threads
@@ -10,6 +10,7 @@ setup(
             "train = pvp_ml.run_train_job:main_entry_point",
             "serve-api = pvp_ml.api:main_entry_point",
             "eval = pvp_ml.evaluate:main_entry_point",
+            "benchmark = pvp_ml.benchmark:main_entry_point",
         ],
     },
 )
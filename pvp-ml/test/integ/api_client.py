@@ -4,13 +4,31 @@ import json
 from asyncio import StreamReader, StreamWriter
 from typing import Any
 
+import numpy as np
+
 from pvp_ml.api import Request, Response
+from pvp_ml.util.binary_protocol import (
+    BINARY_PROTOCOL_MAGIC,
+    decode_response,
+    encode_request,
+    read_frame,
+    write_frame,
+)
 
 
 class ApiClient:
-    def __init__(self, host: str = "localhost", port: int = 9999):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 9999,
+        binary_protocol: bool = False,
+        unix_socket_path: str | None = None,
+    ):
         self._host = host
         self._port = port
+        # Connects over this Unix domain socket instead of host/port, if given
+        self._unix_socket_path = unix_socket_path
+        self._binary_protocol = binary_protocol
         self._reader: StreamReader | None = None
         self._writer: StreamWriter | None = None
 
@@ -18,24 +36,67 @@ class ApiClient:
         if self._writer is None:
             await self._connect()
 
-        assert self._writer is not None
-        assert self._reader is not None
+        try:
+            await self._write_request(request)
+            return await self._read_response()
+        except Exception as e:
+            await self.close()
+            raise e
+
+    async def send_pipelined_requests(self, requests: list[Request]) -> list[Response]:
+        # Sends all requests before reading any responses, returning responses in request order
+        assert all(request.requestId is not None for request in requests)
+        if self._writer is None:
+            await self._connect()
 
         try:
+            for request in requests:
+                await self._write_request(request)
+            responses = {}
+            for _ in requests:
+                response = await self._read_response()
+                responses[response.requestId] = response
+            return [responses[request.requestId] for request in requests]
+        except Exception as e:
+            await self.close()
+            raise e
+
+    async def _write_request(self, request: Request) -> None:
+        assert self._writer is not None
+        if self._binary_protocol:
+            write_frame(
+                self._writer,
+                encode_request(
+                    model=request.model,
+                    obs=np.asarray(request.obs, dtype=np.float32),
+                    action_masks=request.actionMasks,
+                    deterministic=request.deterministic,
+                    return_log_prob=request.returnLogProb,
+                    return_entropy=request.returnEntropy,
+                    return_value=request.returnValue,
+                    return_probs=request.returnProbs,
+                    extensions=request.extensions,
+                    request_id=request.requestId,
+                ),
+            )
+        else:
             request_json = json.dumps(dataclasses.asdict(request))
             self._writer.write((request_json + "\n").encode())
-            await self._writer.drain()
+        await self._writer.drain()
 
+    async def _read_response(self) -> Response:
+        assert self._reader is not None
+        if self._binary_protocol:
+            response_frame = await read_frame(self._reader)
+            if response_frame is None:
+                raise IOError
+            response_dict = decode_response(response_frame)
+        else:
             response_json = await self._reader.readline()
             if not response_json:
                 raise IOError
-
             response_dict = json.loads(response_json.decode())
-            return Response(**response_dict)
-
-        except Exception as e:
-            await self.close()
-            raise e
+        return Response(**response_dict)
 
     async def close(self) -> None:
         if self._writer is not None:
@@ -48,9 +109,16 @@ class ApiClient:
             self._writer = None
 
     async def _connect(self) -> None:
-        self._reader, self._writer = await asyncio.open_connection(
-            self._host, self._port
-        )
+        if self._unix_socket_path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                self._unix_socket_path
+            )
+        else:
+            self._reader, self._writer = await asyncio.open_connection(
+                self._host, self._port
+            )
+        if self._binary_protocol:
+            self._writer.write(BINARY_PROTOCOL_MAGIC)
 
     async def __aenter__(self) -> "ApiClient":
         if self._writer is None:
@@ -1,6 +1,8 @@
 import asyncio
+import os
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
+from pathlib import Path
 from test.integ.api_client import ApiClient
 from typing import Any
 
@@ -22,6 +24,8 @@ async def api(
     port: int = 9999,
     remote_processor_type: str = THREAD_REMOTE_PROCESSOR,
     remote_processor_kwargs: dict[str, Any] = {},
+    binary_protocol: bool = False,
+    unix_socket_path: str | None = None,
 ) -> AsyncIterator[ApiClient]:
     # Start API
     api_runner = run_api(
@@ -31,29 +35,40 @@ async def api(
         remote_processor_type=remote_processor_type,
         remote_processor_kwargs=remote_processor_kwargs,
         device="cpu",
+        unix_socket_path=unix_socket_path,
     )
     api_runner_task = asyncio.create_task(api_runner)
     # Wait to initialize
     attempts = 0
-    while not await is_port_taken_async(port):
+    while not await is_port_taken_async(port) or (
+        unix_socket_path is not None and not os.path.exists(unix_socket_path)
+    ):
         await asyncio.sleep(1)
         attempts += 1
         assert attempts < 50, f"Server failed to start {host}:{port}"
     try:
-        async with ApiClient(host=host, port=port) as pvp_client:
+        async with ApiClient(
+            host=host,
+            port=port,
+            binary_protocol=binary_protocol,
+            unix_socket_path=unix_socket_path,
+        ) as pvp_client:
             # Give control back to caller
             yield pvp_client
     finally:
-        # Clean up
+        # Clean up, waiting for the server to shut down
         api_runner_task.cancel()
         try:
-            await api_runner
-        except Exception:
+            await api_runner_task
+        except (asyncio.CancelledError, Exception):
             pass
 
 
+@pytest.mark.parametrize("binary_protocol", [False, True])
 @pytest.mark.parametrize("remote_processor_type", REMOTE_PROCESSOR_TYPES)
-async def test_api_model_prediction(remote_processor_type: str) -> None:
+async def test_api_model_prediction(
+    remote_processor_type: str, binary_protocol: bool
+) -> None:
     nh_env = load_environment_contract("NhEnv")
     remote_processor_kwargs = {}
     if remote_processor_type == RAY_REMOTE_PROCESSOR:
@@ -62,6 +77,7 @@ async def test_api_model_prediction(remote_processor_type: str) -> None:
     async with api(
         remote_processor_type=remote_processor_type,
         remote_processor_kwargs=remote_processor_kwargs,
+        binary_protocol=binary_protocol,
     ) as client:
         action_masks = [
             [True] * len(action_head.actions) for action_head in nh_env.actions
@@ -94,9 +110,10 @@ async def test_api_model_prediction(remote_processor_type: str) -> None:
     assert response.entropy is not None
 
 
-async def test_api_plugin_prediction() -> None:
+@pytest.mark.parametrize("binary_protocol", [False, True])
+async def test_api_plugin_prediction(binary_protocol: bool) -> None:
     nh_env = load_environment_contract("NhEnv")
-    async with api() as client:
+    async with api(binary_protocol=binary_protocol) as client:
         action_masks = [
             [True] * len(action_head.actions) for action_head in nh_env.actions
         ]
@@ -119,3 +136,59 @@ async def test_api_plugin_prediction() -> None:
     assert response.logProb is None
     assert response.probs is None
     assert response.entropy is None
+
+
+@pytest.mark.parametrize("binary_protocol", [False, True])
+async def test_api_unix_socket_prediction(
+    tmp_path: Path, binary_protocol: bool
+) -> None:
+    nh_env = load_environment_contract("NhEnv")
+    unix_socket_path = str(tmp_path / "api.sock")
+    async with api(
+        binary_protocol=binary_protocol, unix_socket_path=unix_socket_path
+    ) as client:
+        action_masks = [
+            [True] * len(action_head.actions) for action_head in nh_env.actions
+        ]
+        obs_space = nh_env.get_observation_space()
+        obs_space.seed(1)
+        observations = [obs_space.sample().tolist()]
+
+        response = await client.send_request(
+            Request(
+                model="noop",
+                actionMasks=action_masks,
+                obs=observations,
+            )
+        )
+
+    assert response is not None
+    assert len(response.action) == len(nh_env.actions)
+    # The socket file is removed on shutdown
+    assert not os.path.exists(unix_socket_path)
+
+
+@pytest.mark.parametrize("binary_protocol", [False, True])
+async def test_api_pipelined_prediction(binary_protocol: bool) -> None:
+    nh_env = load_environment_contract("NhEnv")
+    async with api(binary_protocol=binary_protocol) as client:
+        action_masks = [
+            [True] * len(action_head.actions) for action_head in nh_env.actions
+        ]
+        obs_space = nh_env.get_observation_space()
+        obs_space.seed(1)
+        requests = [
+            Request(
+                model="GeneralizedNh" if i % 2 == 0 else "noop",
+                actionMasks=action_masks,
+                obs=[obs_space.sample().tolist()],
+                requestId=i,
+            )
+            for i in range(8)
+        ]
+
+        responses = await client.send_pipelined_requests(requests)
+
+    assert [response.requestId for response in responses] == list(range(8))
+    for response in responses:
+        assert len(response.action) == len(nh_env.actions)
@@ -0,0 +1,76 @@
+import itertools
+
+import pytest
+import torch as th
+
+from pvp_ml.ppo.policy import Actor
+
+ACTION_HEAD_SIZES = [3, 3, 4]
+ACTION_DEPENDENCIES = {
+    1: {
+        1: {"require_all": [(0, 1)]},
+        2: {"require_none": [(0, 1)]},
+    },
+    2: {
+        1: {"require_any": [(0, 1), (1, 2)]},
+        2: {"require_all": [(0, 2)], "require_none": [(1, 0)]},
+    },
+}
+
+
+def _is_allowed(head: int, action: int, previous_actions: list[int]) -> bool:
+    config = ACTION_DEPENDENCIES.get(head, {}).get(action, {})
+    chosen = {
+        (i, previous_action) for i, previous_action in enumerate(previous_actions)
+    }
+    return (
+        all(dependency in chosen for dependency in config.get("require_all", []))
+        and not any(
+            dependency in chosen for dependency in config.get("require_none", [])
+        )
+        and (
+            "require_any" not in config
+            or any(dependency in chosen for dependency in config["require_any"])
+        )
+    )
+
+
+@pytest.mark.parametrize("scripted", [False, True])
+def test_dependencies_mask_actions(scripted: bool) -> None:
+    th.manual_seed(0)
+    actor: th.nn.Module = Actor(
+        8, ACTION_HEAD_SIZES, action_dependencies=ACTION_DEPENDENCIES
+    )
+    if scripted:
+        actor = th.jit.script(actor)
+    # Every combination of actions, so each dependency is both met and unmet
+    input_actions = th.tensor(
+        list(itertools.product(*[range(size) for size in ACTION_HEAD_SIZES]))
+    )
+    action_masks = th.ones(len(input_actions), sum(ACTION_HEAD_SIZES), dtype=th.bool)
+
+    with th.no_grad():
+        _, _, _, probs = actor(
+            th.rand(len(input_actions), 8),
+            action_masks,
+            input_actions=input_actions,
+            return_probs=True,
+        )
+
+    assert probs is not None
+    head_probs = th.split(probs, ACTION_HEAD_SIZES, dim=1)
+    for row, actions in enumerate(input_actions.tolist()):
+        for head, size in enumerate(ACTION_HEAD_SIZES):
+            for action in range(size):
+                allowed = head_probs[head][row, action].item() > 0
+                assert allowed == _is_allowed(head, action, actions[:head])
+
+
+@pytest.mark.parametrize("dependency", [(1, 0), (0, 3), (-1, 0)])
+def test_invalid_dependencies_rejected(dependency: tuple[int, int]) -> None:
+    with pytest.raises(ValueError):
+        Actor(
+            8,
+            ACTION_HEAD_SIZES,
+            action_dependencies={1: {0: {"require_all": [dependency]}}},
+        )
@@ -0,0 +1,191 @@
+from typing import Any
+
+import numpy as np
+import pytest
+import torch as th
+from gymnasium import spaces
+from numpy.typing import NDArray
+
+from pvp_ml.ppo.buffer import Buffer
+
+_OBS_SIZE = 3
+
+
+class _FakePPO:
+    # Value estimates are the sum of each observation's latest frame
+    device = "cpu"
+
+    def __init__(self) -> None:
+        self.predict_calls = 0
+
+    def predict(
+        self, obs: th.Tensor, action_masks: th.Tensor, **kwargs: Any
+    ) -> tuple[Any, ...]:
+        self.predict_calls += 1
+        return None, None, None, obs[:, 0].sum(dim=-1, keepdim=True), None, []
+
+
+def _create_buffer(buffer_size: int = 32, n_envs: int = 4, seed: int = 0) -> Buffer:
+    rng = np.random.default_rng(seed)
+    buffer = Buffer(
+        buffer_size=buffer_size,
+        n_envs=n_envs,
+        observation_space=spaces.Box(
+            low=-np.inf, high=np.inf, shape=(1, _OBS_SIZE), dtype=np.float32
+        ),
+        action_space=spaces.MultiDiscrete([3, 2]),
+    )
+    buffer.observations[:] = rng.standard_normal(buffer.observations.shape)
+    buffer.rewards[:] = rng.standard_normal(buffer.rewards.shape)
+    buffer.values[:] = rng.standard_normal(buffer.values.shape)
+    buffer.episode_starts[:] = rng.random(buffer.episode_starts.shape) < 0.1
+    buffer.episode_starts[0] = True
+    buffer.last_step_obs[:] = rng.standard_normal(buffer.last_step_obs.shape)
+    buffer.last_step_dones[:] = rng.random(n_envs) < 0.5
+    buffer.positions[:] = buffer_size
+    return buffer
+
+
+def _reference_advantages(
+    buffer: Buffer, last_values: NDArray[np.float32]
+) -> NDArray[np.float32]:
+    # The original per-step loop
+    advantages = np.zeros_like(buffer.advantages)
+    last_gae_lam = 0
+    for step in reversed(range(buffer.buffer_size)):
+        if step == buffer.buffer_size - 1:
+            next_non_terminal = 1.0 - buffer.last_step_dones
+            next_values = last_values
+        else:
+            next_non_terminal = 1.0 - buffer.episode_starts[step + 1]
+            next_values = buffer.values[step + 1]
+        delta = (
+            buffer.rewards[step]
+            + buffer.gamma * next_values * next_non_terminal
+            - buffer.values[step]
+        )
+        last_gae_lam = (
+            delta + buffer.gamma * buffer.gae_lambda * next_non_terminal * last_gae_lam
+        )
+        advantages[step] = last_gae_lam
+    return advantages
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_advantages_match_per_step_loop(seed: int) -> None:
+    buffer = _create_buffer(seed=seed)
+    last_values = buffer.last_step_obs[:, 0].sum(axis=-1)
+    expected_advantages = _reference_advantages(buffer, last_values)
+    buffer._compute_returns_and_advantage(_FakePPO(), reward_normalizer=None)  # type: ignore[arg-type]
+    np.testing.assert_array_equal(buffer.advantages, expected_advantages)
+    np.testing.assert_array_equal(buffer.returns, expected_advantages + buffer.values)
+
+
+def test_truncates_are_bootstrapped_in_one_batch() -> None:
+    buffer = _create_buffer(seed=1)
+    rng = np.random.default_rng(1)
+    buffer.truncates[:] = rng.random(buffer.truncates.shape) < 0.2
+    for step, env in zip(*np.nonzero(buffer.truncates)):
+        info = {
+            "terminal_observation": rng.standard_normal((1, _OBS_SIZE)).astype(
+                np.float32
+            )
+        }
+        buffer.infos.record(np.array([step]), np.array([env]), np.array([info]))
+    # The original per-step bootstrapping
+    expected_rewards = buffer.rewards.copy()
+    for step in range(buffer.buffer_size):
+        for env in np.nonzero(buffer.truncates[step])[0]:
+            terminal_value = buffer.infos[step, env]["terminal_observation"][0].sum()
+            expected_rewards[step, env] += buffer.gamma * np.float32(terminal_value)
+
+    ppo = _FakePPO()
+    buffer._bootstrap_truncates(ppo)  # type: ignore[arg-type]
+    assert ppo.predict_calls == 1
+    np.testing.assert_allclose(buffer.rewards, expected_rewards, rtol=1e-6)
+
+    buffer = _create_buffer()
+    rewards = buffer.rewards.copy()
+    buffer._bootstrap_truncates(ppo)  # type: ignore[arg-type]
+    assert ppo.predict_calls == 1
+    np.testing.assert_array_equal(buffer.rewards, rewards)
+
+
+def test_episode_rewards_and_lengths() -> None:
+    buffer = _create_buffer(buffer_size=6, n_envs=3)
+    buffer.rewards[:] = np.arange(6, dtype=np.float32)[:, np.newaxis]
+    buffer.episode_starts[:] = False
+    buffer.episode_starts[[0, 2], 0] = True
+    buffer.episode_starts[[0, 1, 5], 1] = True
+    # The third env never started an episode in this rollout, steps are counted from the start anyway
+    buffer.last_step_dones[:] = [True, False, False]
+    buffer._calculate_episode_reward_and_length()
+    assert buffer.episode_lengths == [[2, 4], [1, 4], []]
+    assert buffer.episode_rewards == [[1.0, 14.0], [0.0, 10.0], []]
+    # Episodes still running when the rollout ended are kept separately
+    np.testing.assert_array_equal(buffer.partial_episode_lengths, [0, 1, 6])
+    np.testing.assert_array_equal(buffer.partial_episode_rewards, [0.0, 5.0, 15.0])
+
+
+@pytest.mark.parametrize("stack_frames", [[0, 1, 2], [0, 2, 5]])
+def test_single_frame_observations_are_restacked(stack_frames: list[int]) -> None:
+    buffer_size, n_envs = 16, 3
+    rng = np.random.default_rng(0)
+    stacked_space = spaces.Box(
+        low=-np.inf,
+        high=np.inf,
+        shape=(len(stack_frames), _OBS_SIZE),
+        dtype=np.float32,
+    )
+    buffers = [
+        Buffer(
+            buffer_size=buffer_size,
+            n_envs=n_envs,
+            observation_space=stacked_space,
+            action_space=spaces.MultiDiscrete([3, 2]),
+            stack_frames=frames,
+        )
+        for frames in [None, stack_frames]
+    ]
+    # Stack frames like the env does, the most recent first with zeros before the episode started
+    history = np.zeros((n_envs, stack_frames[-1] + 1, _OBS_SIZE), dtype=np.float32)
+    episode_starts = np.ones(n_envs, dtype=bool)
+    env_indices = np.arange(n_envs)
+    for _ in range(buffer_size):
+        history[episode_starts] = 0
+        history = np.roll(history, 1, axis=1)
+        history[:, 0] = rng.standard_normal((n_envs, _OBS_SIZE))
+        for buffer in buffers:
+            buffer.add_step_response(
+                env_indices,
+                history[:, stack_frames].copy(),
+                np.zeros(n_envs, dtype=np.float32),
+                episode_starts,
+                np.zeros(n_envs, dtype=bool),
+                np.zeros((n_envs, *stacked_space.shape), dtype=np.float32),
+                np.zeros(n_envs, dtype=bool),
+                np.array([{} for _ in range(n_envs)]),
+            )
+        episode_starts = rng.random(n_envs) < 0.2
+
+    stacked_buffer, single_frame_buffer = buffers
+    assert single_frame_buffer.observations.shape == (buffer_size, n_envs, _OBS_SIZE)
+    np.testing.assert_array_equal(
+        single_frame_buffer.get_observations(), stacked_buffer.get_observations()
+    )
+    np.testing.assert_array_equal(
+        single_frame_buffer.get_latest_frames(), stacked_buffer.get_latest_frames()
+    )
+    np.testing.assert_array_equal(
+        np.concatenate(list(single_frame_buffer.iter_observations(chunk_size=7))),
+        stacked_buffer.get_observations(),
+    )
+    indices = np.array([5, 0, 47])
+    np.testing.assert_array_equal(
+        single_frame_buffer.get_observations(indices),
+        stacked_buffer.get_observations(indices),
+    )
+    (batch,) = single_frame_buffer.generate_batches(
+        batch_size=buffer_size * n_envs, device="cpu"
+    )
+    assert batch.observations.shape == (buffer_size * n_envs, *stacked_space.shape)
@@ -0,0 +1,122 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+import torch as th
+
+from pvp_ml.ppo import ppo
+from pvp_ml.ppo.ppo import PPO, PolicyParams
+
+
+@pytest.fixture
+def cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(ppo, "_JIT_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+def _save_model(path: Path) -> None:
+    model = PPO.new_instance(
+        PolicyParams(
+            max_sequence_length=1,
+            actor_input_size=8,
+            critic_input_size=8,
+            action_head_sizes=[3, 2],
+        )
+    )
+    model.save(str(path))
+
+
+def _predict(model: PPO) -> th.Tensor:
+    th.manual_seed(0)
+    obs = th.rand(4, 1, 8)
+    action_masks = th.ones(4, 5, dtype=th.bool)
+    _, _, _, _, probs, _ = model.predict(
+        obs, action_masks, deterministic=True, return_probs=True
+    )
+    assert probs is not None
+    return probs
+
+
+def test_compiled_policy_is_cached_and_reused(
+    tmp_path: Path, cache_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    model_path = tmp_path / "model.zip"
+    _save_model(model_path)
+
+    compiled_model = PPO.load(str(model_path), trainable=False)
+    assert len(os.listdir(cache_dir)) == 1
+
+    def fail_script(*args: object, **kwargs: object) -> None:
+        raise AssertionError("Policy should be loaded from the cache")
+
+    monkeypatch.setattr(th.jit, "script", fail_script)
+    cached_model = PPO.load(str(model_path), trainable=False)
+    assert th.equal(_predict(compiled_model), _predict(cached_model))
+
+
+def test_compiled_policy_cache_is_keyed_by_checkpoint_contents(
+    tmp_path: Path, cache_dir: Path
+) -> None:
+    model_path = tmp_path / "model.zip"
+    _save_model(model_path)
+    PPO.load(str(model_path), trainable=False)
+    # Same path, different weights
+    _save_model(model_path)
+    PPO.load(str(model_path), trainable=False)
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_unreadable_compiled_policy_is_recompiled(
+    tmp_path: Path, cache_dir: Path
+) -> None:
+    model_path = tmp_path / "model.zip"
+    _save_model(model_path)
+    compiled_model = PPO.load(str(model_path), trainable=False)
+    (cached_file,) = os.listdir(cache_dir)
+    (cache_dir / cached_file).write_bytes(b"corrupt")
+    recompiled_model = PPO.load(str(model_path), trainable=False)
+    assert th.equal(_predict(compiled_model), _predict(recompiled_model))
+    assert (cache_dir / cached_file).read_bytes() != b"corrupt"
+
+
+def test_checkpoint_bytes_share_compiled_policy_with_file(
+    tmp_path: Path, cache_dir: Path
+) -> None:
+    model_path = tmp_path / "model.zip"
+    _save_model(model_path)
+    file_model = PPO.load(str(model_path), trainable=False)
+    bytes_model = PPO.load(model_path.read_bytes(), trainable=False)
+    assert len(os.listdir(cache_dir)) == 1
+    assert th.equal(_predict(file_model), _predict(bytes_model))
+
+
+def test_failing_to_cache_compiled_policy_still_loads(
+    tmp_path: Path, cache_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    model_path = tmp_path / "model.zip"
+    _save_model(model_path)
+
+    def fail_save(*args: object, **kwargs: object) -> None:
+        raise RuntimeError("Could not export Python function call")
+
+    monkeypatch.setattr(th.jit, "save", fail_save)
+    model = PPO.load(str(model_path), trainable=False)
+    _predict(model)
+    # Nothing is left behind, so the next load compiles again
+    assert os.listdir(cache_dir) == []
+
+
+def test_checkpoint_file_is_hashed_without_file_digest(
+    tmp_path: Path, cache_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # hashlib.file_digest only exists on Python 3.11+, and the supported environment is 3.10
+    monkeypatch.delattr(hashlib, "file_digest", raising=False)
+    model_path = tmp_path / "model.zip"
+    _save_model(model_path)
+    assert ppo._get_compiled_policy_path(
+        str(model_path), "cpu", "float32"
+    ) == ppo._get_compiled_policy_path(model_path.read_bytes(), "cpu", "float32")
+    PPO.load(str(model_path), trainable=False)
+    assert len(os.listdir(cache_dir)) == 1
@@ -0,0 +1,74 @@
+from typing import Any
+
+import numpy as np
+
+from pvp_ml.ppo.info_store import InfoStore
+
+
+def _record(store: InfoStore, step: int, env: int, info: dict[str, Any]) -> None:
+    store.record(np.array([step]), np.array([env]), np.array([info]))
+
+
+def test_values_are_stored_in_typed_columns() -> None:
+    store = InfoStore(buffer_size=3, n_envs=2)
+    _record(store, 0, 1, {"meta": {"damageDealt": 3, "hitWithSmite": True}})
+    _record(store, 2, 0, {"meta": {"damageDealt": 1.5}, "terminal_state": "WON"})
+    _record(store, 1, 1, {"episode_id": None})
+
+    assert set(store.keys()) == {
+        ("meta", "damageDealt"),
+        ("meta", "hitWithSmite"),
+        ("terminal_state",),
+    }
+    # Ints are promoted to floats once a float is recorded for the same key
+    values, present = store.get(("meta", "damageDealt"))
+    assert values.dtype == np.float64
+    np.testing.assert_array_equal(
+        present, [[False, True], [False, False], [True, False]]
+    )
+    assert store.get_values(("meta", "damageDealt")).tolist() == [3.0, 1.5]
+    assert store.get(("meta", "hitWithSmite"))[0].dtype == bool
+    assert store.get(("terminal_state",))[0].dtype == object
+    # Numbers and other values recorded for the same key fall back to an object column
+    _record(store, 0, 0, {"terminal_state": 1})
+    assert store.get_values(("terminal_state",)).tolist() == [1, "WON"]
+
+    assert store.get_values(("missing",)).size == 0
+    np.testing.assert_array_equal(
+        store.has(("meta",)), [[False, True], [False, False], [True, False]]
+    )
+
+
+def test_info_dicts_are_rebuilt() -> None:
+    store = InfoStore(buffer_size=2, n_envs=1)
+    info = {"meta": {"damageDealt": 3, "distance": 2.5}, "terminal_state": "LOST"}
+    _record(store, 1, 0, info)
+    assert store[1, 0] == info
+    assert store[0, 0] == {}
+
+
+def test_set_values() -> None:
+    store = InfoStore(buffer_size=2, n_envs=2)
+    store.set_values(
+        ("episode", "sum", "reward"),
+        np.array([0, 1]),
+        np.array([1, 0]),
+        np.array([2.0, 4.0]),
+    )
+    assert store[0, 1] == {"episode": {"sum": {"reward": 2.0}}}
+    assert store[1, 0] == {"episode": {"sum": {"reward": 4.0}}}
+    assert store.has(("episode",)).sum() == 2
+
+
+def test_concatenate_along_envs() -> None:
+    first = InfoStore(buffer_size=2, n_envs=1)
+    _record(first, 0, 0, {"damage": 1})
+    second = InfoStore(buffer_size=2, n_envs=2)
+    _record(second, 1, 1, {"damage": 0.5, "terminal_state": "TIED"})
+
+    merged = InfoStore.concatenate([first, second])
+    assert merged.shape == (2, 3)
+    assert merged.get(("damage",))[0].dtype == np.float64
+    assert merged[0, 0] == {"damage": 1.0}
+    assert merged[1, 2] == {"damage": 0.5, "terminal_state": "TIED"}
+    assert merged.has(()).sum() == 2
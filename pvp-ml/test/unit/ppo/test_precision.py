@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+import torch as th
+
+from pvp_ml.ppo import ppo
+from pvp_ml.ppo.ppo import (
+    BFLOAT16_PRECISION,
+    FLOAT32_PRECISION,
+    INT8_PRECISION,
+    PPO,
+    PolicyParams,
+)
+
+
+@pytest.fixture
+def model_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> str:
+    monkeypatch.setattr(ppo, "_JIT_CACHE_DIR", str(tmp_path / "cache"))
+    th.manual_seed(0)
+    model = PPO.new_instance(
+        PolicyParams(
+            max_sequence_length=1,
+            actor_input_size=16,
+            critic_input_size=16,
+            action_head_sizes=[4, 3],
+        )
+    )
+    model.save(str(tmp_path / "model.zip"))
+    return str(tmp_path / "model.zip")
+
+
+@pytest.mark.parametrize("precision", [INT8_PRECISION, BFLOAT16_PRECISION])
+def test_reduced_precision_matches_float32(model_path: str, precision: str) -> None:
+    reference = PPO.load(model_path, trainable=False)
+    model = PPO.load(model_path, trainable=False, precision=precision)
+    if model.get_precision() == FLOAT32_PRECISION:
+        pytest.skip(f"{precision} not supported on this machine")
+    assert model.get_memory_bytes() < reference.get_memory_bytes()
+
+    obs = th.rand(64, 1, 16)
+    action_masks = th.ones(64, 7, dtype=th.bool)
+    reference_actions, _, _, reference_values, reference_probs, _ = reference.predict(
+        obs, action_masks, deterministic=True, return_probs=True
+    )
+    actions, log_probs, entropy, values, probs, _ = model.predict(
+        obs, action_masks, deterministic=True, return_probs=True
+    )
+    assert actions is not None and values is not None and probs is not None
+    assert reference_actions is not None
+    assert reference_values is not None and reference_probs is not None
+    for output in [log_probs, entropy, values, probs]:
+        assert output is not None and output.dtype == th.float32
+    assert th.eq(actions, reference_actions).float().mean() > 0.9
+    assert th.allclose(values, reference_values, atol=0.05)
+    assert th.allclose(probs, reference_probs, atol=0.05)
+
+
+def test_reduced_precision_models_are_not_trainable(model_path: str) -> None:
+    assert not PPO.load(model_path, precision=INT8_PRECISION).is_trainable()
+    with pytest.raises(AssertionError):
+        PPO.load(model_path, trainable=True, precision=INT8_PRECISION)
+
+
+def test_unknown_precision(model_path: str) -> None:
+    with pytest.raises(ValueError, match="Unknown precision"):
+        PPO.load(model_path, trainable=False, precision="float8")
@@ -0,0 +1,103 @@
+from typing import Any
+
+import pytest
+import torch as th
+
+from pvp_ml.scripted.plugins.baseline_plugin import BaselinePlugin
+from pvp_ml.scripted.plugins.stay_alive_in_combat_plugin import StayAliveInCombatPlugin
+from pvp_ml.scripted.script_plugin import (
+    BatchScriptPlugin,
+    ScriptPlugin,
+    ScriptPluginBatch,
+)
+from pvp_ml.scripted.script_plugin_adapter import ScriptPluginAdapter
+from pvp_ml.util.contract_loader import load_environment_contract
+
+ENV_NAME = "NhEnv"
+
+
+class _DictPlugin(ScriptPlugin):
+    # Hides predict_batch, so the adapter falls back to predict
+    def __init__(self, plugin: ScriptPlugin):
+        self._plugin = plugin
+
+    def predict(self, **kwargs: Any) -> dict[str, str]:
+        return self._plugin.predict(**kwargs)
+
+
+class _UnavailableActionPlugin(BatchScriptPlugin):
+    def predict(self, **kwargs: Any) -> dict[str, str]:
+        return {"food": "eat_primary_food"}
+
+    def predict_batch(self, batch: ScriptPluginBatch) -> dict[str, th.Tensor]:
+        return {"food": th.full((batch.size,), batch.action_index("eat_primary_food"))}
+
+
+def _create_adapter(plugin: ScriptPlugin) -> ScriptPluginAdapter:
+    return ScriptPluginAdapter(plugin, ENV_NAME, load_environment_contract(ENV_NAME))
+
+
+def _create_batch(size: int) -> tuple[th.Tensor, th.Tensor]:
+    environment = load_environment_contract(ENV_NAME)
+    values = th.tensor([0.0, 0.3, 0.5, 0.7, 1.0])
+    observations = values[
+        th.randint(len(values), (size, 2, len(environment.observations)))
+    ]
+    action_head_sizes = [
+        len(action_head.actions) for action_head in environment.actions
+    ]
+    action_masks = th.rand(size, sum(action_head_sizes)) > 0.5
+    # At most one attack available per row, so the baseline's random choice of attack is deterministic
+    attack_head = [action_head.id for action_head in environment.actions].index(
+        "attack"
+    )
+    attack_masks = action_masks[:, sum(action_head_sizes[:attack_head]) :][:, 1:4]
+    attack_masks &= th.nn.functional.one_hot(th.randint(3, (size,)), 3).to(th.bool)
+    return observations, action_masks
+
+
+@pytest.mark.parametrize("plugin_type", [BaselinePlugin, StayAliveInCombatPlugin])
+def test_batch_predict_matches_dict_predict(plugin_type: type[ScriptPlugin]) -> None:
+    th.manual_seed(0)
+    observations, action_masks = _create_batch(256)
+
+    batch_actions = _create_adapter(plugin_type()).predict(observations, action_masks)
+    dict_actions = _create_adapter(_DictPlugin(plugin_type())).predict(
+        observations, action_masks
+    )
+
+    assert batch_actions.dtype == dict_actions.dtype
+    assert th.equal(batch_actions, dict_actions)
+    # Only available actions are selected
+    assert batch_actions.any()
+
+
+def test_batch_columns() -> None:
+    environment = load_environment_contract(ENV_NAME)
+    adapter = _create_adapter(BaselinePlugin())
+    observations, action_masks = _create_batch(4)
+    batch = ScriptPluginBatch(
+        observations,
+        action_masks,
+        adapter._observation_indices,
+        adapter._action_indices,
+        adapter._action_head_offsets,
+    )
+    observation_id = environment.observations[10].id
+
+    assert th.equal(batch[observation_id], observations[:, 0, 10])
+    assert th.equal(batch[f"frame_1_{observation_id}"], observations[:, 1, 10])
+    assert th.equal(batch[environment.actions[0].actions[1].id], action_masks[:, 1])
+    assert len(list(batch)) == len(batch)
+    with pytest.raises(KeyError):
+        batch[f"frame_2_{observation_id}"]
+
+
+@pytest.mark.parametrize(
+    "plugin", [_UnavailableActionPlugin(), _DictPlugin(_UnavailableActionPlugin())]
+)
+def test_unavailable_action_rejected(plugin: ScriptPlugin) -> None:
+    observations, action_masks = _create_batch(1)
+    action_masks[:] = False
+    with pytest.raises(AssertionError, match="not available"):
+        _create_adapter(plugin).predict(observations, action_masks)
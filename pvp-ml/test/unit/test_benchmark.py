@@ -0,0 +1,144 @@
+import asyncio
+import dataclasses
+import json
+from asyncio import StreamReader, StreamWriter
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import numpy as np
+import pytest
+
+from pvp_ml.benchmark import (
+    BenchmarkConfig,
+    BenchmarkResult,
+    compare_results,
+    run_benchmark,
+    synthesize_requests,
+)
+from pvp_ml.util.binary_protocol import (
+    BINARY_PROTOCOL_MAGIC,
+    decode_request,
+    encode_response,
+    frame,
+    read_frame,
+)
+from pvp_ml.util.contract_loader import load_environment_contract
+
+
+@asynccontextmanager
+async def _fake_server(error_every: int = 0) -> AsyncIterator[int]:
+    # Responds to each request with no-op actions, or an error for every nth request
+    requests = 0
+
+    async def _handle_client(reader: StreamReader, writer: StreamWriter) -> None:
+        nonlocal requests
+        first_byte = await reader.read(1)
+        binary_protocol = first_byte == BINARY_PROTOCOL_MAGIC
+        prefix = b"" if binary_protocol else first_byte
+        while True:
+            if binary_protocol:
+                request_frame = await read_frame(reader)
+                if request_frame is None:
+                    break
+                request = decode_request(request_frame)
+            else:
+                line = prefix + await reader.readline()
+                prefix = b""
+                if not line:
+                    break
+                request = json.loads(line)
+            requests += 1
+            error = error_every > 0 and requests % error_every == 0
+            if binary_protocol:
+                assert not error, "Fake server only returns binary actions"
+                writer.write(
+                    frame(
+                        encode_response(
+                            action=[0] * len(request["actionMasks"]),
+                            request_id=request["requestId"],
+                        )
+                    )
+                )
+            else:
+                response: dict[str, Any] = (
+                    {"error": "Fake error"}
+                    if error
+                    else {"action": [0] * len(request["actionMasks"])}
+                )
+                writer.write(
+                    (
+                        json.dumps({**response, "requestId": request["requestId"]})
+                        + "\n"
+                    ).encode()
+                )
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(_handle_client, "127.0.0.1", 0)
+    async with server:
+        yield server.sockets[0].getsockname()[1]
+
+
+@pytest.mark.parametrize("binary_protocol", [False, True])
+@pytest.mark.parametrize("rate", [0.0, 200.0])
+async def test_benchmark(binary_protocol: bool, rate: float) -> None:
+    async with _fake_server() as port:
+        result = await run_benchmark(
+            BenchmarkConfig(
+                model="test",
+                clients=4,
+                rate=rate,
+                duration=0.5,
+                warmup=0.1,
+                binary_protocol=binary_protocol,
+                port=port,
+            ),
+            label="test",
+        )
+    assert result.errors == 0
+    assert result.requests > 0
+    assert 0 < result.latency_ms["p50"] <= result.latency_ms["max"]
+    if rate > 0:
+        assert result.throughput == pytest.approx(rate, rel=0.2)
+
+
+async def test_benchmark_counts_errors() -> None:
+    async with _fake_server(error_every=4) as port:
+        result = await run_benchmark(
+            BenchmarkConfig(model="test", clients=1, duration=0.5, warmup=0, port=port)
+        )
+    assert result.error_rate == pytest.approx(0.25, abs=0.01)
+
+
+def test_synthesized_requests_are_valid() -> None:
+    environment = load_environment_contract("NhEnv")
+    requests = synthesize_requests(environment, 16, 2, np.random.default_rng(0))
+    for obs, action_masks in requests:
+        assert np.asarray(obs).shape == (2, len(environment.observations))
+        assert [len(head) for head in action_masks] == [
+            len(head.actions) for head in environment.actions
+        ]
+        assert all(any(head) for head in action_masks)
+
+
+def test_compare_results() -> None:
+    baseline = BenchmarkResult(
+        label="test",
+        clients=1,
+        rate=0.0,
+        duration=1.0,
+        requests=100,
+        errors=0,
+        error_rate=0.0,
+        throughput=100.0,
+        latency_ms={"p50": 1.0, "p95": 2.0, "p99": 3.0, "max": 4.0},
+    )
+    slower = dataclasses.replace(
+        baseline,
+        throughput=95.0,
+        latency_ms={"p50": 1.5, "p95": 2.0, "p99": 3.1, "max": 4.0},
+    )
+    assert compare_results([baseline], [baseline]) == []
+    assert len(compare_results([slower], [baseline], max_regression=0.1)) == 1
+    assert compare_results([slower], [baseline], max_regression=0.5) == []
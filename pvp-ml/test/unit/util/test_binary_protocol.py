@@ -0,0 +1,117 @@
+import asyncio
+import struct
+
+import numpy as np
+import pytest
+
+from pvp_ml.util.binary_protocol import (
+    FrameTooLargeError,
+    decode_request,
+    decode_response,
+    encode_error,
+    encode_request,
+    encode_response,
+    read_frame,
+)
+
+
+@pytest.mark.parametrize("deterministic", [False, True, [True, False, True]])
+def test_request_round_trip(deterministic: bool | list[bool]) -> None:
+    obs = np.random.default_rng(1).random((2, 7), dtype=np.float32)
+    action_masks = [[True, False], [False, True, True, False, True], [True]]
+    request = decode_request(
+        encode_request(
+            model="GeneralizedNh",
+            obs=obs,
+            action_masks=action_masks,
+            deterministic=deterministic,
+            return_log_prob=True,
+            return_probs=True,
+            extensions=["winrate"],
+        )
+    )
+    assert request["model"] == "GeneralizedNh"
+    np.testing.assert_array_equal(request["obs"], obs)
+    assert [mask.tolist() for mask in request["actionMasks"]] == action_masks
+    assert request["deterministic"] == deterministic
+    assert request["returnLogProb"]
+    assert not request["returnEntropy"]
+    assert not request["returnValue"]
+    assert request["returnProbs"]
+    assert request["extensions"] == ["winrate"]
+    assert request["requestId"] is None
+
+
+def test_request_id_round_trip() -> None:
+    request = decode_request(
+        encode_request(
+            model="GeneralizedNh",
+            obs=np.zeros((1, 3), dtype=np.float32),
+            action_masks=[[True, True]],
+            request_id=123456,
+        )
+    )
+    assert request["model"] == "GeneralizedNh"
+    assert request["requestId"] == 123456
+    assert decode_response(encode_response(action=[1], request_id=7)) == {
+        "action": [1],
+        "logProb": None,
+        "entropy": None,
+        "values": None,
+        "probs": None,
+        "extensionResults": [],
+        "requestId": 7,
+    }
+    assert decode_response(encode_error("Unknown model: x", request_id=7)) == {
+        "error": "Unknown model: x",
+        "requestId": 7,
+    }
+
+
+def test_response_round_trip() -> None:
+    response = decode_response(
+        encode_response(
+            action=[1, 0, 4],
+            log_prob=-0.5,
+            entropy=[0.25, 0.5, 0.75],
+            values=1.5,
+            probs=[[0.5, 0.5], [1.0], [0.25, 0.25, 0.5]],
+            extension_results=[{"win": 0.5}],
+        )
+    )
+    assert response == {
+        "action": [1, 0, 4],
+        "logProb": -0.5,
+        "entropy": [0.25, 0.5, 0.75],
+        "values": 1.5,
+        "probs": [[0.5, 0.5], [1.0], [0.25, 0.25, 0.5]],
+        "extensionResults": [{"win": 0.5}],
+        "requestId": None,
+    }
+
+
+def test_minimal_response_round_trip() -> None:
+    assert decode_response(encode_response(action=[2, 3])) == {
+        "action": [2, 3],
+        "logProb": None,
+        "entropy": None,
+        "values": None,
+        "probs": None,
+        "extensionResults": [],
+        "requestId": None,
+    }
+
+
+def test_error_response() -> None:
+    assert decode_response(encode_error("Unknown model: x")) == {
+        "error": "Unknown model: x",
+        "requestId": None,
+    }
+
+
+async def test_oversized_frame_is_rejected_before_its_body_is_read() -> None:
+    reader = asyncio.StreamReader()
+    # Only the length prefix is sent, so reading the body would wait forever
+    reader.feed_data(struct.pack("!I", 0xFFFFFFFF))
+    with pytest.raises(FrameTooLargeError):
+        await asyncio.wait_for(read_frame(reader, max_frame_bytes=1024), timeout=1)
@@ -0,0 +1,86 @@
+from typing import cast
+
+from pvp_ml.ppo.ppo import PPO
+from pvp_ml.util.remote_processor.model_cache import ModelCache
+
+
+class _FakeModel:
+    def __init__(self, model_path: str, memory_bytes: int):
+        self.model_path = model_path
+        self._memory_bytes = memory_bytes
+
+    def get_memory_bytes(self) -> int:
+        return self._memory_bytes
+
+
+def _create_cache(max_bytes: int | None) -> tuple[ModelCache, list[str]]:
+    loads: list[str] = []
+
+    def load_model(model_path: str) -> PPO:
+        loads.append(model_path)
+        return cast(PPO, _FakeModel(model_path, 100))
+
+    return ModelCache(load_model, max_bytes=max_bytes), loads
+
+
+def test_cache_hits_and_misses() -> None:
+    cache, loads = _create_cache(max_bytes=None)
+    for model_path in ["a", "b", "a", "a"]:
+        with cache.acquire(model_path) as model:
+            assert cast(_FakeModel, model).model_path == model_path
+    assert loads == ["a", "b"]
+    stats = cache.get_stats()
+    assert (stats.hits, stats.misses, stats.evictions) == (2, 2, 0)
+    assert (stats.loaded_models, stats.loaded_bytes) == (2, 200)
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cache, loads = _create_cache(max_bytes=250)
+    for model_path in ["a", "b", "a", "c", "b"]:
+        with cache.acquire(model_path):
+            pass
+    # 'b' was least recently used when 'c' was loaded, so had to be loaded again
+    assert loads == ["a", "b", "c", "b"]
+    stats = cache.get_stats()
+    assert stats.evictions == 2
+    assert (stats.loaded_models, stats.loaded_bytes) == (2, 200)
+
+
+def test_cache_never_evicts_in_flight_models() -> None:
+    cache, loads = _create_cache(max_bytes=150)
+    with cache.acquire("a"):
+        with cache.acquire("b"):
+            # Over budget, but both models are in use
+            assert cache.get_stats().loaded_models == 2
+        # 'b' finished, and is the only model that can be evicted
+        assert cache.get_stats().loaded_models == 1
+        with cache.acquire("a"):
+            pass
+    assert loads == ["a", "b"]
+    assert cache.get_stats().evictions == 1
+
+
+def test_discard_waits_for_in_flight_predictions() -> None:
+    cache, loads = _create_cache(max_bytes=None)
+    with cache.acquire("a"):
+        cache.discard("a")
+        assert cache.get_stats().loaded_models == 1
+    assert cache.get_stats().loaded_models == 0
+    with cache.acquire("a"):
+        pass
+    assert loads == ["a", "a"]
+
+    with cache.acquire("a") as discarded_model:
+        cache.discard("a")
+        # The discarded model is only kept for the prediction in flight, so it's loaded again
+        with cache.acquire("a") as model:
+            assert model is not discarded_model
+        assert loads == ["a", "a", "a"]
+        stats = cache.get_stats()
+        assert (stats.loaded_models, stats.loaded_bytes) == (1, 100)
+    # Finishing the discarded model's prediction doesn't remove the model that replaced it
+    with cache.acquire("a") as reacquired_model:
+        assert reacquired_model is model
+    assert loads == ["a", "a", "a"]
+    stats = cache.get_stats()
+    assert (stats.loaded_models, stats.loaded_bytes) == (1, 100)
@@ -0,0 +1,185 @@
+import asyncio
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+import torch as th
+
+from pvp_ml.util.model_registry import ModelRegistry
+from pvp_ml.util.remote_processor.remote_processor import RemoteProcessor
+
+
+class _FakeProcessor(RemoteProcessor):
+    def __init__(self, pool_size: int = 2):
+        self._pool_size = pool_size
+        self.loaded: list[tuple[int, str]] = []
+        self.unloaded: list[tuple[int, str]] = []
+        self.fail_loads = False
+
+    async def predict(
+        self,
+        process_id: int,
+        model_path: str,
+        observation: th.Tensor | None = None,
+        action_masks: th.Tensor | None = None,
+        deterministic: bool | th.Tensor = False,
+        return_device: str | None = None,
+        return_actions: bool = True,
+        return_log_probs: bool = False,
+        return_entropy: bool = False,
+        return_values: bool = False,
+        return_probs: bool = False,
+        extensions: list[str] = [],
+    ) -> tuple[
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        list[Any],
+    ]:
+        if self.fail_loads:
+            raise ValueError("Corrupt model")
+        self.loaded.append((process_id, model_path))
+        return None, None, None, None, None, []
+
+    async def unload_model(self, process_id: int, model_path: str) -> None:
+        self.unloaded.append((process_id, model_path))
+
+    async def close(self) -> None:
+        pass
+
+    def get_pool_size(self) -> int:
+        return self._pool_size
+
+    def get_device(self) -> str:
+        return "cpu"
+
+
+def _write_model(path: Path, content: bytes, version: int) -> None:
+    path.write_bytes(content)
+    # Set the modification time explicitly, since writes in quick succession can share a timestamp
+    os.utime(path, ns=(version, version))
+
+
+async def _drain_background_tasks() -> None:
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def test_registry_loads_models_on_start(tmp_path: Path) -> None:
+    _write_model(tmp_path / "a.zip", b"a", 1)
+    _write_model(tmp_path / "b.zip", b"b", 1)
+    (tmp_path / "notes.txt").write_text("not a model")
+    processor = _FakeProcessor(pool_size=2)
+    registry = ModelRegistry(str(tmp_path), processor, poll_interval=0)
+    await registry.start()
+    try:
+        assert sorted(registry.get_model_names()) == ["a", "b"]
+        assert "a" in registry and "notes" not in registry
+        # Every model is warmed on every worker it can be routed to
+        assert len(processor.loaded) == 4
+        with registry.acquire("a") as model_version:
+            assert open(model_version.path, "rb").read() == b"a"
+        with pytest.raises(ValueError, match="Unknown model: c"):
+            with registry.acquire("c"):
+                pass
+    finally:
+        await registry.close()
+
+
+async def test_registry_swaps_in_replaced_model_once_stable(tmp_path: Path) -> None:
+    model_path = tmp_path / "a.zip"
+    _write_model(model_path, b"v1", 1)
+    processor = _FakeProcessor(pool_size=1)
+    registry = ModelRegistry(str(tmp_path), processor, poll_interval=0)
+    await registry.start()
+    try:
+        with registry.acquire("a") as old_version:
+            _write_model(model_path, b"v2", 2)
+            # The change is only loaded once the file has stopped changing for a poll
+            await registry.refresh()
+            with registry.acquire("a") as model_version:
+                assert model_version is old_version
+            await registry.refresh()
+            with registry.acquire("a") as new_version:
+                assert open(new_version.path, "rb").read() == b"v2"
+            # The old version is still in use, so can't be unloaded yet
+            await _drain_background_tasks()
+            assert processor.unloaded == []
+            assert open(old_version.path, "rb").read() == b"v1"
+        await _drain_background_tasks()
+        assert processor.unloaded == [(0, old_version.path)]
+        assert not os.path.exists(old_version.path)
+    finally:
+        await registry.close()
+
+
+async def test_registry_keeps_serving_when_new_version_fails(tmp_path: Path) -> None:
+    model_path = tmp_path / "a.zip"
+    _write_model(model_path, b"v1", 1)
+    processor = _FakeProcessor(pool_size=1)
+    registry = ModelRegistry(str(tmp_path), processor, poll_interval=0)
+    await registry.start()
+    try:
+        _write_model(model_path, b"corrupt", 2)
+        processor.fail_loads = True
+        await registry.refresh(wait_for_stable=False)
+        with registry.acquire("a") as model_version:
+            assert open(model_version.path, "rb").read() == b"v1"
+        # The failed version isn't retried until the file changes again
+        processor.fail_loads = False
+        await registry.refresh(wait_for_stable=False)
+        with registry.acquire("a") as model_version:
+            assert model_version.version == 1
+        _write_model(model_path, b"v3", 3)
+        await registry.refresh(wait_for_stable=False)
+        with registry.acquire("a") as model_version:
+            assert model_version.version == 3
+    finally:
+        await registry.close()
+
+
+async def test_registry_removes_deleted_models(tmp_path: Path) -> None:
+    _write_model(tmp_path / "a.zip", b"a", 1)
+    processor = _FakeProcessor(pool_size=2)
+    registry = ModelRegistry(str(tmp_path), processor, poll_interval=0)
+    await registry.start()
+    try:
+        with registry.acquire("a") as model_version:
+            pass
+        os.remove(tmp_path / "a.zip")
+        await registry.refresh()
+        assert "a" not in registry
+        await _drain_background_tasks()
+        assert sorted(processor.unloaded) == [
+            (0, model_version.path),
+            (1, model_version.path),
+        ]
+    finally:
+        await registry.close()
+
+
+async def test_registry_restored_model_gets_its_own_snapshot(tmp_path: Path) -> None:
+    model_path = tmp_path / "a.zip"
+    _write_model(model_path, b"a", 1)
+    processor = _FakeProcessor(pool_size=1)
+    registry = ModelRegistry(str(tmp_path), processor, poll_interval=0)
+    await registry.start()
+    try:
+        with registry.acquire("a") as removed_version:
+            os.remove(model_path)
+            await registry.refresh()
+            # Restored with the same modification time, so the same version
+            _write_model(model_path, b"a", 1)
+            await registry.refresh(wait_for_stable=False)
+            with registry.acquire("a") as restored_version:
+                assert restored_version.version == removed_version.version
+                assert restored_version.path != removed_version.path
+        await _drain_background_tasks()
+        # Freeing the removed version doesn't affect the restored version's snapshot
+        assert processor.unloaded == [(0, removed_version.path)]
+        assert open(restored_version.path, "rb").read() == b"a"
+    finally:
+        await registry.close()
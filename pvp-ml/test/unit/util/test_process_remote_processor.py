@@ -0,0 +1,47 @@
+import os
+from pathlib import Path
+
+import pytest
+import torch as th
+
+from pvp_ml.ppo.ppo import PPO, PolicyParams
+from pvp_ml.util.remote_processor.process_remote_processor import ExternalProcessor
+
+
+def _save_model(path: str) -> None:
+    PPO.new_instance(
+        PolicyParams(
+            max_sequence_length=1,
+            actor_input_size=8,
+            critic_input_size=8,
+            action_head_sizes=[3, 2],
+        )
+    ).save(path)
+
+
+async def test_predict_over_unix_socket(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Inherited by the spawned workers
+    monkeypatch.setenv("TORCH_SCRIPT_CACHE_DIR", str(tmp_path / "cache"))
+    model_path = str(tmp_path / "model.zip")
+    _save_model(model_path)
+    unix_socket_path = str(tmp_path / "processor.sock")
+    processor = ExternalProcessor(pool_size=2, unix_socket_path=unix_socket_path)
+    await processor.initialize()
+    try:
+        assert os.path.exists(unix_socket_path)
+        for process_id in range(processor.get_pool_size()):
+            actions, *_ = await processor.predict(
+                process_id,
+                model_path,
+                th.rand(2, 1, 8),
+                th.ones(2, 5, dtype=th.bool),
+                deterministic=True,
+            )
+            assert actions is not None and actions.shape == (2, 2)
+    finally:
+        await processor.close()
+
+    # The socket file is removed on shutdown
+    assert not os.path.exists(unix_socket_path)
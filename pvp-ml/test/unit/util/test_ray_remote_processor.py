@@ -0,0 +1,102 @@
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+import ray
+import torch as th
+
+from pvp_ml.ppo.ppo import PPO, PolicyParams
+from pvp_ml.util.remote_processor.ray_remote_processor import RayProcessor
+from pvp_ml.util.remote_processor.worker_threads import tune_intra_op_threads
+
+
+@pytest.fixture(scope="module")
+def local_ray(tmp_path_factory: pytest.TempPathFactory) -> Iterator[None]:
+    cache_dir = tmp_path_factory.mktemp("cache")
+    ray.init(
+        num_cpus=2,
+        namespace="pvp-ml",
+        include_dashboard=False,
+        runtime_env={"env_vars": {"TORCH_SCRIPT_CACHE_DIR": str(cache_dir)}},
+    )
+    yield
+    ray.shutdown()
+
+
+@pytest.fixture
+def put_count(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    count = [0]
+    put = ray.put
+
+    def counting_put(value: Any) -> ray.ObjectRef:
+        count[0] += 1
+        return put(value)
+
+    monkeypatch.setattr(ray, "put", counting_put)
+    return count
+
+
+def _save_model(path: str) -> None:
+    PPO.new_instance(
+        PolicyParams(
+            max_sequence_length=1,
+            actor_input_size=8,
+            critic_input_size=8,
+            action_head_sizes=[3, 2],
+        )
+    ).save(path)
+
+
+async def _predict(processor: RayProcessor, process_id: int, model_path: str) -> None:
+    actions, *_ = await processor.predict(
+        process_id,
+        model_path,
+        th.rand(2, 1, 8),
+        th.ones(2, 5, dtype=th.bool),
+        deterministic=True,
+    )
+    assert actions is not None and actions.shape == (2, 2)
+
+
+async def test_checkpoint_is_published_once_while_in_use(
+    local_ray: None, put_count: list[int], tmp_path: Path
+) -> None:
+    model_path = str(tmp_path / "model.zip")
+    _save_model(model_path)
+    processor = RayProcessor(pool_size=2, max_concurrency=1, shared=False)
+
+    await _predict(processor, 0, model_path)
+    await _predict(processor, 1, model_path)
+    assert put_count[0] == 1
+
+    # An actor that dropped its copy (ex. expired) reloads the already published checkpoint
+    await processor._actor_pool[0].unload.remote(processor._get_model_hash(model_path))
+    await _predict(processor, 0, model_path)
+    assert put_count[0] == 1
+
+    # Unloading releases the checkpoint, so it's published again when next used
+    for process_id in range(processor.get_pool_size()):
+        await processor.unload_model(process_id, model_path)
+    await _predict(processor, 1, model_path)
+    assert put_count[0] == 2
+
+    await processor.close()
+
+
+async def test_intra_op_threads_can_be_tuned(local_ray: None, tmp_path: Path) -> None:
+    model_path = str(tmp_path / "model.zip")
+    _save_model(model_path)
+    processor = RayProcessor(pool_size=2, max_concurrency=1, shared=False)
+
+    intra_op_threads = await tune_intra_op_threads(
+        processor,
+        model_path,
+        th.rand(2, 1, 8),
+        th.ones(2, 5, dtype=th.bool),
+        candidates=[1, 2],
+        rounds=2,
+    )
+    assert intra_op_threads in (1, 2)
+    await _predict(processor, 0, model_path)
+
+    await processor.close()
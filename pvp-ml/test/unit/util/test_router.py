@@ -0,0 +1,44 @@
+import pytest
+
+from pvp_ml.util.remote_processor.router import (
+    CONSISTENT_HASH_ROUTER,
+    LEAST_OUTSTANDING_ROUTER,
+    ROUTER_TYPES,
+    create_router,
+)
+
+
+@pytest.mark.parametrize("router_type", ROUTER_TYPES)
+def test_router_selects_valid_worker(router_type: str) -> None:
+    router = create_router(router_type, pool_size=4)
+    for i in range(100):
+        assert 0 <= router.select_worker(f"model-{i}") < 4
+
+
+def test_queue_depth_tracking() -> None:
+    router = create_router(LEAST_OUTSTANDING_ROUTER, pool_size=3)
+    with router.track(1):
+        with router.track(1):
+            assert router.get_queue_depths() == [0, 2, 0]
+    assert router.get_queue_depths() == [0, 0, 0]
+
+
+def test_least_outstanding_picks_idle_worker() -> None:
+    router = create_router(LEAST_OUTSTANDING_ROUTER, pool_size=3)
+    with router.track(0), router.track(2):
+        assert all(router.select_worker("model") == 1 for _ in range(20))
+
+
+def test_consistent_hash_is_stable() -> None:
+    router = create_router(CONSISTENT_HASH_ROUTER, pool_size=4)
+    assignments = {f"model-{i}": router.select_worker(f"model-{i}") for i in range(100)}
+    assert len(set(assignments.values())) == 4
+    # Same assignments from a new router, and loaded only on the assigned worker
+    router = create_router(CONSISTENT_HASH_ROUTER, pool_size=4)
+    for model, worker_id in assignments.items():
+        assert router.select_worker(model) == worker_id
+        assert router.get_preload_workers(model) == [worker_id]
+    # Growing the pool only moves a fraction of the models
+    grown_router = create_router(CONSISTENT_HASH_ROUTER, pool_size=5)
+    moved = sum(grown_router.select_worker(m) != w for m, w in assignments.items())
+    assert moved < 40
@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any
+
+import torch as th
+
+from pvp_ml.util.contract_loader import load_environment_contract
+from pvp_ml.util.remote_processor.remote_processor import RemoteProcessor
+from pvp_ml.util.remote_processor.worker_threads import (
+    get_thread_candidates,
+    get_worker_cpus,
+    synthesize_batch,
+    tune_intra_op_threads,
+)
+
+
+class _FakeProcessor(RemoteProcessor):
+    # Predictions take a time that depends on the intra-op threads, fastest with 2
+    def __init__(self, pool_size: int = 2):
+        self._pool_size = pool_size
+        self.intra_op_threads: int | None = None
+        self.predictions: list[tuple[int, int | None]] = []
+
+    async def predict(
+        self,
+        process_id: int,
+        model_path: str,
+        observation: th.Tensor | None = None,
+        action_masks: th.Tensor | None = None,
+        deterministic: bool | th.Tensor = False,
+        return_device: str | None = None,
+        return_actions: bool = True,
+        return_log_probs: bool = False,
+        return_entropy: bool = False,
+        return_values: bool = False,
+        return_probs: bool = False,
+        extensions: list[str] = [],
+    ) -> tuple[
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        th.Tensor | None,
+        list[Any],
+    ]:
+        self.predictions.append((process_id, self.intra_op_threads))
+        await asyncio.sleep(0.01 if self.intra_op_threads == 2 else 0.03)
+        return None, None, None, None, None, []
+
+    def set_intra_op_threads(self, intra_op_threads: int) -> None:
+        self.intra_op_threads = intra_op_threads
+
+    async def close(self) -> None:
+        pass
+
+    def get_pool_size(self) -> int:
+        return self._pool_size
+
+    def get_device(self) -> str:
+        return "cpu"
+
+
+def test_worker_cpus_are_split_into_ranges() -> None:
+    cpus = list(range(8))
+    assert [get_worker_cpus(i, 3, cpus) for i in range(3)] == [
+        [0, 1],
+        [2, 3, 4],
+        [5, 6, 7],
+    ]
+    # Workers share CPUs when there are more workers than CPUs
+    assert [get_worker_cpus(i, 3, [4, 5]) for i in range(3)] == [[4], [5], [4]]
+
+
+def test_thread_candidates() -> None:
+    candidates = get_thread_candidates(pool_size=1)
+    assert candidates == sorted(set(candidates))
+    assert candidates[0] == 1
+    assert all(threads >= 1 for threads in get_thread_candidates(pool_size=1000))
+
+
+def test_synthesized_batch_matches_contract() -> None:
+    environment = load_environment_contract("NhEnv")
+    observation, action_masks = synthesize_batch(environment, batch_size=4, frames=2)
+    assert observation.shape == (4, 2, len(environment.observations))
+    head_sizes = [len(action_head.actions) for action_head in environment.actions]
+    assert action_masks.shape == (4, sum(head_sizes))
+    for head_mask in th.split(action_masks, head_sizes, dim=1):
+        assert head_mask.any(dim=1).all()
+
+
+async def test_tuner_picks_fastest_thread_count() -> None:
+    processor = _FakeProcessor(pool_size=2)
+    observation, action_masks = synthesize_batch(
+        load_environment_contract("NhEnv"), batch_size=1, frames=1
+    )
+    best = await tune_intra_op_threads(
+        processor,
+        "model",
+        observation,
+        action_masks,
+        candidates=[1, 2, 4],
+        rounds=3,
+    )
+    assert best == 2
+    assert processor.intra_op_threads == 2
+    # Every worker is benchmarked at once, for a warm up round and each timed round
+    assert len(processor.predictions) == 3 * 2 * 4
+    assert {process_id for process_id, _ in processor.predictions} == {0, 1}